@@ -0,0 +1,37 @@
+import argparse
+import itertools
+import time
+
+from okfasta.msa import mismatches, pairwise_mismatches
+
+from synthetic import synthetic_alignment
+
+def char_loop_mismatches(seqs):
+    for (id1, seq1), (id2, seq2) in itertools.combinations(seqs, 2):
+        mismatches(seq1, seq2)
+
+def bitset_mismatches(seqs):
+    for vals in pairwise_mismatches(seqs):
+        pass
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        description="Compare pairwise mismatch engines")
+    p.add_argument("--width", type=int, default=1500)
+    p.add_argument("--rows", type=int, nargs="+", default=[50, 100, 200])
+    args = p.parse_args(argv)
+
+    print("rows\twidth\tengine\tseconds\tpairs/s")
+    for n in args.rows:
+        seqs = list(synthetic_alignment(n, args.width))
+        npairs = n * (n - 1) // 2
+        for label, func in [
+                ("chars", char_loop_mismatches), ("bitsets", bitset_mismatches)]:
+            t0 = time.perf_counter()
+            func(seqs)
+            elapsed = time.perf_counter() - t0
+            print("{0}\t{1}\t{2}\t{3:.3f}\t{4:.3g}".format(
+                n, args.width, label, elapsed, npairs / elapsed))
+
+if __name__ == "__main__":
+    main()
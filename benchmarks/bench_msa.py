@@ -0,0 +1,35 @@
+import argparse
+import time
+
+from okfasta.msa import MSA, ByteMSA, ColumnCounter
+
+from synthetic import synthetic_alignment
+
+BACKENDS = [("columns", MSA), ("bytes", ByteMSA), ("stream", ColumnCounter)]
+
+def run_colstats(backend, seqs):
+    msa = backend.from_seqs(seqs)
+    for stats in msa.column_stats():
+        pass
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        description="Compare MSA backends for column statistics")
+    p.add_argument("--width", type=int, default=2000)
+    p.add_argument(
+        "--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    args = p.parse_args(argv)
+
+    print("rows\twidth\tbackend\tseconds\tcells/s")
+    for n in args.rows:
+        seqs = list(synthetic_alignment(n, args.width))
+        for label, backend in BACKENDS:
+            t0 = time.perf_counter()
+            run_colstats(backend, seqs)
+            elapsed = time.perf_counter() - t0
+            cells = n * args.width
+            print("{0}\t{1}\t{2}\t{3:.3f}\t{4:.3g}".format(
+                n, args.width, label, elapsed, cells / elapsed))
+
+if __name__ == "__main__":
+    main()
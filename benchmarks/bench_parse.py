@@ -0,0 +1,43 @@
+import argparse
+import io
+import time
+
+from okfasta.io import parse_fasta, parse_fasta_lines
+
+from synthetic import synthetic_fasta
+
+def consume(seqs):
+    n = 0
+    for desc, seq in seqs:
+        n += 1
+    return n
+
+def bench(label, func, data, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(data)
+        elapsed = time.perf_counter() - t0
+        if (best is None) or (elapsed < best):
+            best = elapsed
+    mb = len(data) / 1e6
+    print("{0}\t{1:.3f}s\t{2:.1f} MB/s".format(label, best, mb / best))
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        description="Compare throughput of the FASTA parsers")
+    p.add_argument("--records", type=int, default=2000)
+    p.add_argument("--length", type=int, default=5000)
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args(argv)
+
+    data = synthetic_fasta(args.records, args.length).encode()
+    bench(
+        "lines", lambda d: consume(parse_fasta_lines(io.StringIO(d.decode()))),
+        data, args.repeat)
+    bench(
+        "blocks", lambda d: consume(parse_fasta(io.BytesIO(d))),
+        data, args.repeat)
+
+if __name__ == "__main__":
+    main()
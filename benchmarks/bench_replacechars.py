@@ -0,0 +1,57 @@
+import argparse
+import random
+import string
+import time
+
+from okfasta.seqs import replace_chars
+
+from synthetic import synthetic_seqs
+
+def replace_chars_sequential(seqs, replacements):
+    # The previous implementation, one full copy per replacement
+    for desc, seq in seqs:
+        for x, y in replacements:
+            seq = seq.replace(x, y)
+        yield desc, seq
+
+IMPLEMENTATIONS = [
+    ("sequential", replace_chars_sequential),
+    ("compiled", replace_chars),
+]
+
+def random_replacements(n, pattern_len, seed=0):
+    rng = random.Random(seed)
+    symbols = string.ascii_uppercase
+    return [
+        ("".join(rng.choices(symbols, k=pattern_len)), rng.choice(symbols))
+        for _ in range(n)]
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        description="Compare character replacement implementations")
+    p.add_argument("--records", type=int, default=1000)
+    p.add_argument("--length", type=int, default=10000)
+    p.add_argument(
+        "--replacements", type=int, nargs="+", default=[1, 10, 50])
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args(argv)
+
+    seqs = list(synthetic_seqs(args.records, args.length))
+    print("replacements\tpattern_len\timplementation\tseconds")
+    for n in args.replacements:
+        for pattern_len in (1, 3):
+            replacements = random_replacements(n, pattern_len)
+            for label, func in IMPLEMENTATIONS:
+                best = None
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    for desc, seq in func(seqs, replacements):
+                        pass
+                    elapsed = time.perf_counter() - t0
+                    if (best is None) or (elapsed < best):
+                        best = elapsed
+                print("{0}\t{1}\t{2}\t{3:.3f}".format(
+                    n, pattern_len, label, best))
+
+if __name__ == "__main__":
+    main()
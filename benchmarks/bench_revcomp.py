@@ -0,0 +1,45 @@
+import argparse
+import time
+
+from okfasta.seqs import COMPLEMENT_BASES, reverse_complement
+
+from synthetic import synthetic_seqs
+
+def reverse_complement_lookup(seq):
+    # The previous implementation, one dict lookup per base
+    rc = [COMPLEMENT_BASES[x] for x in seq]
+    rc.reverse()
+    return ''.join(rc)
+
+IMPLEMENTATIONS = [
+    ("lookup", reverse_complement_lookup),
+    ("translate", reverse_complement),
+]
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        description="Compare reverse complement implementations")
+    p.add_argument("--records", type=int, default=100)
+    p.add_argument(
+        "--length", type=int, nargs="+", default=[150, 10000, 1000000])
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args(argv)
+
+    print("length\timplementation\tseconds\tMb/s")
+    for length in args.length:
+        seqs = [seq for desc, seq in synthetic_seqs(args.records, length)]
+        for label, func in IMPLEMENTATIONS:
+            best = None
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                for seq in seqs:
+                    func(seq)
+                elapsed = time.perf_counter() - t0
+                if (best is None) or (elapsed < best):
+                    best = elapsed
+            mb = args.records * length / 1e6
+            print("{0}\t{1}\t{2:.3f}\t{3:.1f}".format(
+                length, label, best, mb / best))
+
+if __name__ == "__main__":
+    main()
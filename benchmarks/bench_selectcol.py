@@ -0,0 +1,40 @@
+import argparse
+import random
+import time
+
+from okfasta.msa import MSA, ByteMSA
+
+from synthetic import synthetic_alignment
+
+BACKENDS = [("columns", MSA), ("bytes", ByteMSA)]
+
+def run_selectcol(backend, seqs, idxs, remove):
+    msa = backend.from_seqs(seqs)
+    msa.filter_by_index(idxs, remove=remove)
+    for desc, seq in msa.seqs:
+        pass
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        description="Compare MSA backends for selecting columns")
+    p.add_argument("--rows", type=int, default=1000)
+    p.add_argument(
+        "--width", type=int, nargs="+", default=[1000, 10000, 50000])
+    p.add_argument("--fraction", type=float, default=0.5)
+    args = p.parse_args(argv)
+
+    print("rows\twidth\tremove\tbackend\tseconds")
+    rng = random.Random(0)
+    for width in args.width:
+        seqs = list(synthetic_alignment(args.rows, width))
+        idxs = rng.sample(range(1, width + 1), int(width * args.fraction))
+        for remove in (False, True):
+            for label, backend in BACKENDS:
+                t0 = time.perf_counter()
+                run_selectcol(backend, seqs, idxs, remove)
+                elapsed = time.perf_counter() - t0
+                print("{0}\t{1}\t{2}\t{3}\t{4:.3f}".format(
+                    args.rows, width, remove, label, elapsed))
+
+if __name__ == "__main__":
+    main()
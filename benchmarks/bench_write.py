@@ -0,0 +1,60 @@
+import argparse
+import io
+import os
+import time
+
+from okfasta.io import write_fasta, write_tsv
+
+from synthetic import synthetic_seqs
+
+def write_fasta_per_record(f, seqs):
+    # The previous implementation, one format and write per record
+    for desc, seq in seqs:
+        f.write(">{0}\n{1}\n".format(desc, seq))
+
+def write_tsv_per_row(f, rows):
+    for row in rows:
+        f.write("\t".join(str(x) for x in row))
+        f.write("\n")
+
+def kmer_rows(n):
+    for i in range(n):
+        yield "seq{0}".format(i // 100), i % 100 + 1, "ACGTACGTACGTACGTACGTA"
+
+def text_output():
+    # As the output files were opened before: a text layer over a
+    # binary file
+    return io.TextIOWrapper(open(os.devnull, "wb"))
+
+def binary_output():
+    return open(os.devnull, "wb")
+
+def bench(label, func, make_output, rows, n):
+    f = make_output()
+    t0 = time.perf_counter()
+    func(f, rows)
+    f.flush()
+    elapsed = time.perf_counter() - t0
+    f.close()
+    print("{0}\t{1:.3f}\t{2:.0f}".format(label, elapsed, n / elapsed))
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        description="Compare output writers, in rows per second")
+    p.add_argument("--rows", type=int, default=2000000)
+    p.add_argument("--records", type=int, default=200000)
+    p.add_argument("--length", type=int, default=150)
+    args = p.parse_args(argv)
+
+    rows = list(kmer_rows(args.rows))
+    seqs = list(synthetic_seqs(args.records, args.length))
+    print("writer\tseconds\trows/s")
+    bench("tsv per row", write_tsv_per_row, text_output, rows, args.rows)
+    bench("tsv batched", write_tsv, binary_output, rows, args.rows)
+    bench(
+        "fasta per record", write_fasta_per_record, text_output,
+        seqs, args.records)
+    bench("fasta batched", write_fasta, binary_output, seqs, args.records)
+
+if __name__ == "__main__":
+    main()
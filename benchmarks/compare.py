@@ -0,0 +1,65 @@
+import argparse
+import json
+import sys
+
+def load_results(fp):
+    with open(fp) as f:
+        results = json.load(f)
+    return results["metadata"], {r["name"]: r for r in results["results"]}
+
+def compare_results(old, new, threshold):
+    # Yields a row for each case found in both sets of results, with
+    # the ratio of new to old time and peak RSS. Cases that are slower,
+    # or use more memory, by more than the threshold are flagged.
+    for name, new_result in new.items():
+        old_result = old.get(name)
+        if old_result is None:
+            continue
+        time_ratio = new_result["seconds"] / old_result["seconds"]
+        rss_ratio = new_result["max_rss_mb"] / old_result["max_rss_mb"]
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append("slower")
+        if rss_ratio > 1 + threshold:
+            flags.append("more memory")
+        yield (
+            name, old_result["seconds"], new_result["seconds"], time_ratio,
+            old_result["max_rss_mb"], new_result["max_rss_mb"], rss_ratio,
+            ", ".join(flags))
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        description=(
+            "Compare two sets of results from suite.py. Exits with status "
+            "1 if any case is slower or uses more memory than the "
+            "threshold allows."))
+    p.add_argument("old", help="Results for the baseline commit")
+    p.add_argument("new", help="Results for the commit to check")
+    p.add_argument(
+        "--threshold", type=float, default=0.1,
+        help=(
+            "Fractional increase in time or peak RSS that counts as a "
+            "regression (default: %(default)s)"))
+    args = p.parse_args(argv)
+
+    old_metadata, old = load_results(args.old)
+    new_metadata, new = load_results(args.new)
+    if old_metadata.get("scale") != new_metadata.get("scale"):
+        sys.stderr.write("Warning: results were run at different scales\n")
+    print(
+        "name\told_seconds\tnew_seconds\ttime_ratio\t"
+        "old_rss_MB\tnew_rss_MB\trss_ratio\tflags")
+    regressions = 0
+    rowfmt = "{0}\t{1:.3f}\t{2:.3f}\t{3:.2f}\t{4:.0f}\t{5:.0f}\t{6:.2f}\t{7}"
+    for row in compare_results(old, new, args.threshold):
+        print(rowfmt.format(*row))
+        if row[-1]:
+            regressions += 1
+    for name in sorted(set(old) ^ set(new)):
+        sys.stderr.write("Only in one set of results: {0}\n".format(name))
+    if regressions:
+        sys.stderr.write("{0} regressions\n".format(regressions))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
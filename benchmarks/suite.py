@@ -0,0 +1,367 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from okfasta.idmap import IdMap
+from okfasta.index import load_fasta_index
+from okfasta.io import parse_fasta
+from okfasta.msa import MSA, pairwise_mismatches
+from okfasta.pack import write_pack
+from okfasta.seqs import get_kmers, search_seqs
+
+from synthetic import (
+    synthetic_reads, synthetic_contigs, synthetic_alignment,
+    synthetic_primers, write_fasta_file,
+)
+
+# Number of records in each data set at --scale 1
+READS = 100000
+READ_LENGTH = 150
+CONTIGS = 10
+CONTIG_LENGTH = 1000000
+ALIGNMENT_ROWS = 200
+ALIGNMENT_WIDTH = 5000
+PRIMERS = 10
+
+COMMANDS = {
+    "okfasta": "import sys; from okfasta.command import okfasta_main; "
+        "okfasta_main(sys.argv[1:])",
+    "msa-ok": "import sys; from okfasta.command import msa_ok_main; "
+        "msa_ok_main(sys.argv[1:])",
+}
+
+def make_datasets(d, scale):
+    # Returns the path and number of records of each input file
+    n_reads = max(int(READS * scale), 10)
+    n_rows = max(int(ALIGNMENT_ROWS * scale), 10)
+    data = {}
+
+    def add(name, seqs):
+        seqs = list(seqs)
+        fp = os.path.join(d, name + ".fasta")
+        write_fasta_file(fp, seqs)
+        data[name] = (fp, len(seqs))
+        return seqs
+
+    reads = add("reads", synthetic_reads(n_reads, READ_LENGTH))
+    add("reads_small", reads[:(n_reads // 10)])
+    contigs = add("contigs", synthetic_contigs(
+        CONTIGS, max(int(CONTIG_LENGTH * scale), 1000)))
+    add("alignment", synthetic_alignment(n_rows, ALIGNMENT_WIDTH))
+    add("alignment_small", synthetic_alignment(
+        max(n_rows // 4, 10), ALIGNMENT_WIDTH))
+    primers = add("primers", synthetic_primers(PRIMERS))
+
+    def add_lines(name, lines):
+        fp = os.path.join(d, name + ".txt")
+        with open(fp, "w") as f:
+            f.writelines(lines)
+        data[name] = (fp, len(lines))
+
+    read_ids = [desc.split()[0] for desc, seq in reads]
+    add_lines("ids", [x + "\n" for x in read_ids[::10]])
+    add_lines("new_ids", [
+        "{0}\tnew{1}\n".format(x, i) for i, x in enumerate(read_ids)])
+    add_lines("descs", [x + " new description\n" for x in read_ids[::10]])
+    add_lines("queries", [seq + "\n" for desc, seq in primers])
+    add_lines("columns", [
+        "{0}\n".format(i) for i in range(1, ALIGNMENT_WIDTH + 1, 3)])
+    regions = []
+    for i, (desc, seq) in enumerate(contigs):
+        for j in range(0, len(seq) - 1000, len(seq) // 100):
+            strand = "+" if (j // 1000) % 2 else "-"
+            regions.append("{0}\t{1}\t{2}\tr\t0\t{3}\n".format(
+                desc.split()[0], j, j + 500, strand))
+    add_lines("regions", regions)
+
+    fp = os.path.join(d, "new_ids.idmap")
+    with open(data["new_ids"][0]) as f:
+        idmap = IdMap.from_pairs(line.split() for line in f)
+    with open(fp, "wb") as f:
+        idmap.save(f)
+    data["new_ids_map"] = (fp, len(idmap))
+    fp = os.path.join(d, "reads.okpack")
+    with open(fp, "wb") as f:
+        write_pack(f, reads)
+    data["reads_packed"] = (fp, len(reads))
+    for name in ["reads", "contigs"]:
+        load_fasta_index(data[name][0])
+    return data
+
+# Name, program, input data set, and the other arguments. Arguments in
+# braces are replaced by the path to a data set.
+SUBCOMMAND_CASES = [
+    ("normalize", "okfasta", "reads", ["normalize", "--line-width", "60"]),
+    ("replacechars", "okfasta", "reads", ["replacechars", "--remove", "N"]),
+    ("replaceids", "okfasta", "reads", ["replaceids", "{new_ids}"]),
+    ("replaceids idmap", "okfasta", "reads",
+        ["replaceids", "{new_ids_map}"]),
+    ("replacedesc", "okfasta", "reads", ["replacedesc", "{descs}"]),
+    ("idmap", "okfasta", "new_ids", ["idmap"]),
+    ("randomseqs", "okfasta", "reads", ["randomseqs", "--seed", "1"]),
+    ("randomseqs proportion", "okfasta", "reads",
+        ["randomseqs", "--proportion", "0.1", "--seed", "1"]),
+    ("randomseqs indexed", "okfasta", "reads",
+        ["randomseqs", "--indexed", "--seed", "1"]),
+    ("kmers", "okfasta", "reads_small", ["kmers"]),
+    ("kmercount", "okfasta", "reads", ["kmercount"]),
+    ("kmercount canonical", "okfasta", "reads",
+        ["kmercount", "--canonical"]),
+    ("extract", "okfasta", "contigs",
+        ["extract", "{regions}", "--region-format", "bed"]),
+    ("extract indexed", "okfasta", "contigs",
+        ["extract", "{regions}", "--region-format", "bed", "--indexed"]),
+    ("index", "okfasta", "contigs", ["index", "--output", "{output}"]),
+    ("fetch", "okfasta", "reads", ["fetch", "{ids}"]),
+    ("revcomp reads", "okfasta", "reads", ["revcomp"]),
+    ("revcomp contigs", "okfasta", "contigs", ["revcomp"]),
+    ("revcomp indexed", "okfasta", "contigs", ["revcomp", "--indexed"]),
+    ("revcomp jobs", "okfasta", "reads", ["revcomp", "--jobs", "4"]),
+    ("filterids", "okfasta", "reads", ["filterids", "{ids}"]),
+    ("searchdesc", "okfasta", "reads", ["searchdesc", "read1.*7 "]),
+    ("searchseq", "okfasta", "reads",
+        ["searchseq", "--queries-file", "{queries}"]),
+    ("searchseq mismatches", "okfasta", "reads_small",
+        ["searchseq", "--queries-file", "{queries}", "--max-mismatches", "1",
+         "--search-revcomp"]),
+    ("length", "okfasta", "reads", ["length"]),
+    ("length summary", "okfasta", "reads", ["length", "--summary"]),
+    ("length packed", "okfasta", "reads_packed", ["length"]),
+    ("pack", "okfasta", "reads", ["pack"]),
+    ("revcomp packed", "okfasta", "reads_packed", ["revcomp"]),
+    ("chain", "okfasta", "reads",
+        ["chain", "filterids", "{ids}", "::", "revcomp", "::", "length"]),
+    ("selectcol", "msa-ok", "alignment", ["selectcol", "{columns}"]),
+    ("selectcol stream", "msa-ok", "alignment",
+        ["selectcol", "{columns}", "--stream"]),
+    ("colstats", "msa-ok", "alignment", ["colstats"]),
+    ("colstats columns", "msa-ok", "alignment",
+        ["colstats", "--backend", "columns"]),
+    ("mismatches", "msa-ok", "alignment_small", ["mismatches"]),
+    ("mismatches matrix", "msa-ok", "alignment_small",
+        ["mismatches", "--format", "matrix"]),
+]
+
+def consume(items):
+    n = 0
+    for x in items:
+        n += 1
+    return n
+
+def read_seqs(fp):
+    with open(fp, "rb") as f:
+        return list(parse_fasta(f))
+
+def bench_parse_fasta(data):
+    fp = data["reads"][0]
+    def run():
+        with open(fp, "rb") as f:
+            consume(parse_fasta(f))
+    return run
+
+def bench_msa_from_seqs(data):
+    seqs = read_seqs(data["alignment"][0])
+    return lambda: MSA.from_seqs(seqs)
+
+def bench_column_stats(data):
+    msa = MSA.from_seqs(read_seqs(data["alignment"][0]))
+    return lambda: consume(msa.column_stats())
+
+def bench_pairwise_mismatches(data):
+    seqs = read_seqs(data["alignment_small"][0])
+    return lambda: consume(pairwise_mismatches(seqs))
+
+def bench_get_kmers(data):
+    seqs = read_seqs(data["reads_small"][0])
+    return lambda: consume(get_kmers(seqs))
+
+def bench_search_seqs(data):
+    seqs = read_seqs(data["reads"][0])
+    queries = [seq for desc, seq in read_seqs(data["primers"][0])]
+    return lambda: consume(search_seqs(seqs, queries))
+
+# Name, input data set, and a function that loads the input and
+# returns the function to time
+FUNCTION_CASES = [
+    ("parse_fasta", "reads", bench_parse_fasta),
+    ("MSA.from_seqs", "alignment", bench_msa_from_seqs),
+    ("column_stats", "alignment", bench_column_stats),
+    ("pairwise_mismatches", "alignment_small", bench_pairwise_mismatches),
+    ("get_kmers", "reads_small", bench_get_kmers),
+    ("search_seqs", "reads", bench_search_seqs),
+]
+
+def run_process(argv):
+    # Returns the elapsed time, peak RSS in MB, and standard output of
+    # a child process. The resource usage comes from wait4(), so it
+    # covers only that process.
+    t0 = time.perf_counter()
+    p = subprocess.Popen(argv, stdout=subprocess.PIPE)
+    output = p.stdout.read()
+    p.stdout.close()
+    _, status, rusage = os.wait4(p.pid, 0)
+    elapsed = time.perf_counter() - t0
+    p.returncode = os.waitstatus_to_exitcode(status)
+    if p.returncode != 0:
+        raise RuntimeError("Command failed: {0}".format(" ".join(argv)))
+    # ru_maxrss is in kilobytes on Linux, and in bytes on macOS
+    maxrss = rusage.ru_maxrss
+    if sys.platform == "darwin":
+        maxrss = maxrss / 1024
+    return elapsed, maxrss / 1024, output
+
+def run_subcommand_case(case, data, d, repeat):
+    name, program, input_name, args = case
+    input_fp, n_records = data[input_name]
+    output_fp = os.path.join(d, "output")
+    paths = {key: fp for key, (fp, n) in data.items()}
+    paths["output"] = output_fp
+    # Options go just after the subcommand, as the stages of a chain
+    # take the rest of the arguments
+    argv = [args[0], "--input", input_fp]
+    if "--output" not in args:
+        argv.extend(["--output", output_fp])
+    argv.extend(x.format(**paths) for x in args[1:])
+    cmd = [sys.executable, "-c", COMMANDS[program]] + argv
+    times = []
+    maxrss = 0
+    for _ in range(repeat):
+        elapsed, rss, output = run_process(cmd)
+        times.append(elapsed)
+        maxrss = max(maxrss, rss)
+    return result(
+        program + " " + name, "subcommand", min(times), maxrss,
+        os.path.getsize(input_fp), n_records)
+
+def run_function_case(case, d, repeat):
+    # Each function runs in its own process, for a separate peak RSS
+    name, input_name, setup = case
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--function", name,
+        "--workdir", d, "--repeat", str(repeat)]
+    elapsed, maxrss, output = run_process(cmd)
+    child = json.loads(output)
+    return result(
+        name, "function", child["seconds"], maxrss,
+        child["input_bytes"], child["records"])
+
+def function_child(args):
+    # Runs in the child process started by run_function_case()
+    data = dataset_paths(args.workdir)
+    cases = {case[0]: case for case in FUNCTION_CASES}
+    name, input_name, setup = cases[args.function]
+    func = setup(data)
+    best = None
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - t0
+        if (best is None) or (elapsed < best):
+            best = elapsed
+    input_fp, n_records = data[input_name]
+    json.dump({
+        "seconds": best, "input_bytes": os.path.getsize(input_fp),
+        "records": n_records}, sys.stdout)
+
+def dataset_paths(d):
+    with open(os.path.join(d, "datasets.json")) as f:
+        return {key: tuple(val) for key, val in json.load(f).items()}
+
+def result(name, kind, seconds, maxrss, input_bytes, records):
+    return {
+        "name": name,
+        "kind": kind,
+        "seconds": round(seconds, 4),
+        "mb_per_s": round(input_bytes / 1e6 / seconds, 2),
+        "records_per_s": round(records / seconds, 1),
+        "max_rss_mb": round(maxrss, 1),
+    }
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+            text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        description=(
+            "Time each okfasta and msa-ok subcommand, and the core "
+            "functions, on synthetic data"))
+    p.add_argument(
+        "--scale", type=float, default=1.0,
+        help="Multiply the size of each data set (default: %(default)s)")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument(
+        "--only", nargs="+",
+        help="Run only cases whose name contains one of these words")
+    p.add_argument(
+        "--output",
+        help="Write results as JSON, for use with compare.py")
+    p.add_argument("--function", help=argparse.SUPPRESS)
+    p.add_argument(
+        "--make-datasets", action="store_true", help=argparse.SUPPRESS)
+    p.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+
+    if args.function is not None:
+        function_child(args)
+        return
+    if args.make_datasets:
+        data = make_datasets(args.workdir, args.scale)
+        with open(os.path.join(args.workdir, "datasets.json"), "w") as f:
+            json.dump(data, f)
+        return
+
+    with tempfile.TemporaryDirectory() as d:
+        # On Linux, a child's peak RSS starts from that of its parent
+        # when it was forked. The data are made in another process, so
+        # that this one stays small.
+        run_process([
+            sys.executable, os.path.abspath(__file__), "--make-datasets",
+            "--workdir", d, "--scale", str(args.scale)])
+        data = dataset_paths(d)
+        results = []
+        print("name\tseconds\tMB/s\trecords/s\tmax_rss_MB")
+        cases = (
+            [("subcommand", c) for c in SUBCOMMAND_CASES] +
+            [("function", c) for c in FUNCTION_CASES])
+        for kind, case in cases:
+            if kind == "subcommand":
+                label = case[1] + " " + case[0]
+            else:
+                label = case[0]
+            if args.only and not any(x in label for x in args.only):
+                continue
+            if kind == "subcommand":
+                res = run_subcommand_case(case, data, d, args.repeat)
+            else:
+                res = run_function_case(case, d, args.repeat)
+            results.append(res)
+            print("{name}\t{seconds:.3f}\t{mb_per_s:.1f}\t"
+                  "{records_per_s:.0f}\t{max_rss_mb:.0f}".format(**res))
+            sys.stdout.flush()
+
+    if args.output is not None:
+        metadata = {
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "repeat": args.repeat,
+        }
+        with open(args.output, "w") as f:
+            json.dump({"metadata": metadata, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
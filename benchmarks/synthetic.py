@@ -0,0 +1,82 @@
+import random
+
+NUCLEOTIDES = "ACGT"
+
+def random_seq(rng, length, alphabet=NUCLEOTIDES):
+    return "".join(rng.choices(alphabet, k=length))
+
+def synthetic_seqs(n, length, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield "seq{0} synthetic record {0}".format(i), random_seq(rng, length)
+
+def synthetic_fasta(n, length, width=80, seed=0):
+    lines = []
+    for desc, seq in synthetic_seqs(n, length, seed):
+        lines.append(">" + desc)
+        for i in range(0, len(seq), width):
+            lines.append(seq[i:(i + width)])
+    lines.append("")
+    return "\n".join(lines)
+
+def synthetic_alignment(n, width, gap_rate=0.1, mutation_rate=0.2, seed=0):
+    # Rows are mutated copies of one reference, so that columns have
+    # a realistic mix of conserved and variable positions.
+    rng = random.Random(seed)
+    ref = random_seq(rng, width)
+    for i in range(n):
+        row = []
+        for x in ref:
+            r = rng.random()
+            if r < gap_rate:
+                row.append("-")
+            elif r < gap_rate + mutation_rate:
+                row.append(rng.choice(NUCLEOTIDES))
+            else:
+                row.append(x)
+        yield "aln{0}".format(i), "".join(row)
+
+# IUPAC codes for two or more bases, used in degenerate primers
+DEGENERATE_BASES = "RYSWKMBDHVN"
+
+def synthetic_reads(n, length=150, n_rate=0.001, seed=0):
+    # Short reads with occasional N calls, named like Illumina reads
+    rng = random.Random(seed)
+    for i in range(n):
+        seq = list(random_seq(rng, length))
+        for j in range(length):
+            if rng.random() < n_rate:
+                seq[j] = "N"
+        yield "read{0} 1:N:0:ACGTACGT".format(i), "".join(seq)
+
+def synthetic_contigs(n, length, gap_length=100, mask_rate=0.1, seed=0):
+    # Long sequences with a run of Ns in the middle and soft-masked
+    # (lowercase) stretches, as in assembled genomes
+    rng = random.Random(seed)
+    for i in range(n):
+        seq = random_seq(rng, length)
+        mid = length // 2
+        seq = seq[:mid] + "N" * gap_length + seq[(mid + gap_length):]
+        pieces = []
+        for j in range(0, len(seq), 1000):
+            piece = seq[j:(j + 1000)]
+            if rng.random() < mask_rate:
+                piece = piece.lower()
+            pieces.append(piece)
+        yield "contig{0} length={1}".format(i, len(seq)), "".join(pieces)
+
+def synthetic_primers(n, length=20, degenerate_rate=0.15, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        primer = [
+            rng.choice(DEGENERATE_BASES) if rng.random() < degenerate_rate
+            else rng.choice(NUCLEOTIDES)
+            for _ in range(length)]
+        yield "primer{0}".format(i), "".join(primer)
+
+def write_fasta_file(fp, seqs, width=80):
+    with open(fp, "w") as f:
+        for desc, seq in seqs:
+            f.write(">" + desc + "\n")
+            for i in range(0, len(seq), width):
+                f.write(seq[i:(i + width)] + "\n")
@@ -0,0 +1,23 @@
+import array
+import sys
+
+# Arrays of integers are stored in little-endian byte order, so that
+# files written on one machine can be read on another. On little-endian
+# machines, a stored array can be used in place through a memoryview.
+
+def write_array(f, a):
+    if sys.byteorder == "big":
+        a = array.array(a.typecode, a)
+        a.byteswap()
+    f.write(a.tobytes())
+
+def read_array(view, typecode, start, n):
+    # Returns the n items of an array stored at start in view, and the
+    # position just after the array
+    itemsize = array.array(typecode).itemsize
+    end = start + n * itemsize
+    if sys.byteorder == "big":
+        a = array.array(typecode, view[start:end].tobytes())
+        a.byteswap()
+        return a, end
+    return view[start:end].cast(typecode), end
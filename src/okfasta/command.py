@@ -1,25 +1,77 @@
 import argparse
+import collections
+import functools
+import io
+import itertools
 import signal
 import sys
 
 from .seqs import (
-    filter_seq_ids, get_seq_lengths, search_seqs, extract_regions,
-    search_desc, get_kmers, replace_seq_ids, replace_chars, reverse_complement,
-    randomize_seqs, replace_desc,
+    filter_seq_ids, seq_id_lengths, count_lengths, length_summary,
+    length_histogram, get_seq_lengths, search_seqs, search_seq_positions,
+    extract_regions,
+    search_desc, compile_desc_patterns,
+    get_kmers, replace_seq_ids, replace_chars,
+    reverse_complement_seqs, randomize_seqs, sample_seqs, replace_desc,
 )
 from .msa import (
-    MSA, pairwise_mismatches,
+    MSA, ByteMSA, ColumnCounter, pairwise_mismatches, mismatch_matrix,
+    select_columns, stream_select_columns,
+    )
+from .compression import (
+    decompressed_reader, compressed_writer, compression_from_filename,
+    gzi_path, zstd_module,
+    )
+from .index import (
+    open_indexed_fasta, build_fasta_index, write_fasta_index, fasta_index_path,
+    fetch_seqs, extract_indexed_regions, reverse_complement_blocks,
     )
 from .io import (
-    parse_fasta, write_fasta, parse_seq_ids, parse_regions, parse_column_idxs,
-    parse_new_ids, parse_new_descs,
+    parse_fasta, parse_fasta_raw, parse_fasta_lengths, decode_seqs,
+    write_lines, write_fasta, write_tsv, write_matrix, write_phylip,
+    parse_seq_ids, parse_regions, parse_bed, parse_gff,
+    parse_column_idxs, parse_patterns, parse_new_ids, parse_new_descs,
+    read_fasta_chunks,
     )
+from .idmap import IdMap, load_id_map
+from .kmers import count_kmers
+from .pack import is_packed_file, write_pack
+from .parallel import map_chunks, process_fasta_chunk
+from .stats import RunStats, SamplingProfiler
+
+def run_stage(args, stage, write_output, parser=parse_fasta):
+    # The stage is applied to each record independently, so we can
+    # split the work between processes if requested. Stages that work
+    # on undecoded records can use another parser, such as
+    # parse_fasta_raw. Packed files are unpacked in this process, as
+    # unpacking is much faster than parsing.
+    if (args.jobs > 1) and not is_packed_file(args.input_file):
+        func = functools.partial(
+            process_fasta_chunk, stage, write_output, parser=parser)
+        chunks = read_fasta_chunks(args.input_file)
+        for output in map_chunks(func, chunks, args.jobs):
+            args.output_file.write(output)
+    else:
+        apply_stage(args, stage, write_output, parser)
+
+def apply_stage(args, stage, write_output, parser=parse_fasta):
+    # With --stats, the records and time of each stage are counted
+    if args.run_stats is not None:
+        parser, stage, write_output = args.run_stats.timed_stages(
+            parser, stage, write_output)
+    write_output(args.output_file, stage(parser(args.input_file)))
+
+def normalize_stage(args):
+    return unchanged_seqs, functools.partial(
+        write_fasta, line_width=args.line_width)
+
+def unchanged_seqs(seqs):
+    return seqs
 
 def normalize_subcommand(args):
-    seqs = parse_fasta(args.input_file)
-    write_fasta(args.output_file, seqs)
+    apply_stage(args, *normalize_stage(args))
 
-def replacechars_subcommand(args):
+def replacechars_stage(args):
     if args.replace is None:
         replacements = []
     else:
@@ -27,125 +79,468 @@ def replacechars_subcommand(args):
     if args.remove is not None:
         for x in args.remove:
             replacements.append((x, ''))
-    seqs = parse_fasta(args.input_file)
-    replaced_seqs = replace_chars(seqs, replacements)
-    write_fasta(args.output_file, replaced_seqs)
+    stage = functools.partial(replace_chars, replacements=replacements)
+    return stage, write_fasta
+
+def replacechars_subcommand(args):
+    run_stage(args, *replacechars_stage(args))
+
+def replaceids_stage(args):
+    new_ids = load_id_map(args.newidsfile, parse_new_ids)
+    return functools.partial(replace_seq_ids, new_seqids=new_ids), write_fasta
 
 def replaceids_subcommand(args):
-    new_ids_file = open(args.newidsfile, "r")
-    new_ids = dict(parse_new_ids(new_ids_file))
-    seqs = parse_fasta(args.input_file)
-    relabeled_seqs = replace_seq_ids(seqs, new_ids)
-    write_fasta(args.output_file, relabeled_seqs)
+    apply_stage(args, *replaceids_stage(args))
+
+def replacedesc_stage(args):
+    new_descs = load_id_map(args.descfile, parse_new_descs)
+    stage = functools.partial(
+        replace_desc, new_descs=new_descs, remove_old=args.remove_old)
+    return stage, write_fasta
 
 def replacedesc_subcommand(args):
-    with open(args.descfile) as d:
-        new_descs = dict(parse_new_descs(d))
-    seqs = parse_fasta(args.input_file)
-    relabeled_seqs = replace_desc(seqs, new_descs, args.remove_old)
-    write_fasta(args.output_file, relabeled_seqs)
+    apply_stage(args, *replacedesc_stage(args))
+
+def idmap_subcommand(args):
+    if args.descriptions:
+        parse_pairs = parse_new_descs
+    else:
+        parse_pairs = parse_new_ids
+    f = io.TextIOWrapper(args.input_file)
+    idmap = IdMap.from_pairs(parse_pairs(f))
+    idmap.save(args.output_file)
+
+def randomseqs_stage(args):
+    if args.proportion is not None:
+        sample = functools.partial(
+            sample_seqs, proportion=args.proportion, seed=args.seed)
+    else:
+        sample = functools.partial(randomize_seqs, n=args.n, seed=args.seed)
+    return sample, write_fasta
 
 def randomseqs_subcommand(args):
-    seqs = parse_fasta(args.input_file)
-    rseqs = randomize_seqs(seqs, args.n)
-    write_fasta(args.output_file, rseqs)
+    sample, write_output = randomseqs_stage(args)
+    if args.indexed:
+        # Records are counted from the index, and only the selected
+        # records are read.
+        indexed_fasta = open_indexed_fasta(require_input_path(args))
+        entries = sample(indexed_fasta.entries)
+        rseqs = (
+            (indexed_fasta.get_desc(e), indexed_fasta.get_seq(e))
+            for e in entries)
+        write_output(args.output_file, rseqs)
+    else:
+        # Sequences are only decoded for the selected records
+        apply_stage(
+            args, lambda raw_seqs: decode_seqs(sample(raw_seqs)),
+            write_output, parser=parse_fasta_raw)
+
+def kmers_stage(args):
+    return functools.partial(get_kmers, k=args.k), write_tsv
 
 def kmers_subcommand(args):
-    seqs = parse_fasta(args.input_file)
-    for seq_id, pos, kmer in get_kmers(seqs, args.k):
-        args.output_file.write("{0}\t{1}\t{2}\n".format(seq_id, pos, kmer))
+    run_stage(args, *kmers_stage(args))
+
+def kmercount_subcommand(args):
+    stage = functools.partial(
+        count_kmers, k=args.k, canonical=args.canonical,
+        max_kmers=args.max_kmers)
+    apply_stage(args, stage, write_tsv)
+
+REGION_PARSERS = {
+    "regions": parse_regions,
+    "bed": parse_bed,
+    "gff": parse_gff,
+}
+
+def extract_stage(args):
+    # Regions that were not found are collected in args.unmatched, for
+    # extract_report()
+    seq_regions = parse_region_file(args)
+    stage = functools.partial(
+        extract_regions, seq_regions, unmatched=args.unmatched)
+    return stage, write_fasta
+
+def parse_region_file(args):
+    args.unmatched = [] if args.report_unmatched else None
+    region_file = open(args.regionfile, "r")
+    return REGION_PARSERS[args.region_format](region_file)
 
 def extract_subcommand(args):
-    region_file = open(args.regionfile, "r")
-    seq_regions = parse_regions(region_file)
-    seqs = parse_fasta(args.input_file)
-    extracted_seqs = extract_regions(seq_regions, seqs)
-    write_fasta(args.output_file, extracted_seqs)
+    if args.indexed:
+        seq_regions = parse_region_file(args)
+        indexed_fasta = open_indexed_fasta(require_input_path(args))
+        extracted_seqs = extract_indexed_regions(
+            seq_regions, indexed_fasta, args.unmatched)
+        write_fasta(args.output_file, extracted_seqs)
+    else:
+        stage, write_output = extract_stage(args)
+        apply_stage(args, stage, write_output, parser=parse_fasta_raw)
+    extract_report(args)
+
+def extract_report(args):
+    if args.unmatched:
+        unmatched_counts = collections.Counter(r[0] for r in args.unmatched)
+        for seq_id, n in unmatched_counts.items():
+            sys.stderr.write(
+                "Sequence ID not found: {0} ({1} regions)\n".format(seq_id, n))
+
+def index_subcommand(args):
+    if is_packed_file(args.input_file):
+        raise ValueError("Packed files are indexed already")
+    entries = build_fasta_index(args.input_file)
+    if args.output is None:
+        with open(fasta_index_path(require_input_path(args)), "w") as f:
+            write_fasta_index(f, entries)
+    else:
+        write_fasta_index(args.output_file, entries)
+
+def pack_subcommand(args):
+    apply_stage(args, unchanged_seqs, write_pack)
+
+def fetch_subcommand(args):
+    ids_file = open(args.idsfile, "r")
+    seq_ids = parse_seq_ids(ids_file)
+    indexed_fasta = open_indexed_fasta(require_input_path(args))
+    fetched_seqs = fetch_seqs(indexed_fasta, seq_ids)
+    write_fasta(args.output_file, fetched_seqs)
+
+def revcomp_stage(args):
+    stage = functools.partial(reverse_complement_seqs, strict=not args.lenient)
+    return stage, write_fasta
 
 def revcomp_subcommand(args):
-    seqs = parse_fasta(args.input_file)
-    rseqs = ((desc, reverse_complement(seq)) for desc, seq in seqs)
-    write_fasta(args.output_file, rseqs)
+    if args.indexed:
+        # Long sequences are written in pieces as they are read
+        indexed_fasta = open_indexed_fasta(require_input_path(args))
+        lines = indexed_revcomp_lines(indexed_fasta, not args.lenient)
+        write_lines(args.output_file, lines)
+    else:
+        run_stage(args, *revcomp_stage(args))
+
+def indexed_revcomp_lines(indexed_fasta, strict=True):
+    for entry in indexed_fasta.entries:
+        yield ">{0}\n".format(indexed_fasta.get_desc(entry))
+        yield from reverse_complement_blocks(indexed_fasta, entry, strict)
+        yield "\n"
 
 def selectcol_subcommand(args):
     column_file = open(args.columnfile, "r")
     column_idxs = parse_column_idxs(column_file)
-    seqs = parse_fasta(args.input_file)
-    msa = MSA.from_seqs(seqs)
-    msa.filter_by_index(column_idxs, remove=args.remove_columns)
-    write_fasta(args.output_file, msa.seqs)
+    if args.stream:
+        select = stream_select_columns
+    else:
+        select = select_columns
+    stage = functools.partial(
+        select, idxs=column_idxs, remove=args.remove_columns)
+    apply_stage(args, stage, write_fasta)
+
+MSA_BACKENDS = {
+    "stream": ColumnCounter,
+    "bytes": ByteMSA,
+    "columns": MSA,
+}
 
 def colstats_subcommand(args):
-    seqs = parse_fasta(args.input_file)
-    msa = MSA.from_seqs(seqs)
-    args.output_file.write("\t".join(msa.column_stats_header))
-    args.output_file.write("\n")
-    for stats_result in msa.column_stats():
-        stats_values = stats_result.values()
-        args.output_file.write(msa.column_stats_fmt.format(*stats_values))
-        args.output_file.write("\n")
+    stage = functools.partial(column_stats_lines, backend=args.backend)
+    apply_stage(args, stage, write_lines)
+
+def column_stats_lines(seqs, backend="stream"):
+    msa = MSA_BACKENDS[backend].from_seqs(seqs)
+    header = "\t".join(msa.column_stats_header) + "\n"
+    outfmt = msa.column_stats_fmt + "\n"
+    lines = (
+        outfmt.format(*stats_result.values())
+        for stats_result in msa.column_stats())
+    return itertools.chain([header], lines)
 
 def mismatches_subcommand(args):
     seqs = parse_fasta(args.input_file)
+    if args.format != "pairs":
+        seq_ids, rows = mismatch_matrix(
+            seqs, include_gaps=args.include_gaps, percent=args.percent)
+        valfmt = "{0:.2f}" if args.percent else "{0}"
+        if args.format == "phylip":
+            write_phylip(args.output_file, seq_ids, rows, valfmt)
+        else:
+            write_matrix(args.output_file, seq_ids, rows, valfmt)
+        return
     vals = pairwise_mismatches(seqs, include_gaps=args.include_gaps, percent=args.percent)
     if args.percent:
         outfmt = "{0}\t{1}\t{2:.2f}\n"
     else:
         outfmt = "{0}\t{1}\t{2}\n"
-    for id1, id2, val in vals:
-        args.output_file.write(outfmt.format(id1, id2, val))
+    lines = (outfmt.format(id1, id2, val) for id1, id2, val in vals)
+    write_lines(args.output_file, lines)
 
-def filterids_subcommand(args):
+def filterids_stage(args):
+    # The IDs that were found are collected in args.found, for
+    # filterids_report()
     ids_file = open(args.idsfile, "r")
-    seq_ids = set(parse_seq_ids(ids_file))
-    seqs = parse_fasta(args.input_file)
-    filtered_seqs = filter_seq_ids(seqs, seq_ids, remove=args.remove_ids)
-    write_fasta(args.output_file, filtered_seqs)
+    args.seq_ids = set(parse_seq_ids(ids_file))
+    args.found = set()
+    stage = functools.partial(
+        filter_seq_ids, seq_ids=args.seq_ids, remove=args.remove_ids,
+        stop_early=args.first_only, found=args.found)
+    return stage, write_fasta
+
+def filterids_subcommand(args):
+    stage, write_output = filterids_stage(args)
+    # Sequences are only decoded for the records we write
+    apply_stage(
+        args, lambda raw_seqs: decode_seqs(stage(raw_seqs)),
+        write_output, parser=parse_fasta_raw)
+    filterids_report(args)
+
+def filterids_report(args):
+    if args.report_counts:
+        sys.stderr.write("IDs found: {0}\nIDs missing: {1}\n".format(
+            len(args.found), len(args.seq_ids) - len(args.found)))
+
+def searchdesc_stage(args):
+    patterns = []
+    if args.regex is not None:
+        patterns.append(args.regex)
+    if args.patterns_file is not None:
+        with open(args.patterns_file) as f:
+            patterns.extend(parse_patterns(f))
+    if not patterns:
+        raise ValueError("A pattern or a patterns file is required")
+    regex = compile_desc_patterns(
+        patterns, fixed_strings=args.fixed_strings,
+        ignore_case=args.ignore_case)
+    return functools.partial(search_desc, regex_str=regex), write_fasta
 
 def searchdesc_subcommand(args):
-    seqs = parse_fasta(args.input_file)
-    filtered_seqs = search_desc(seqs, args.regex)
-    write_fasta(args.output_file, filtered_seqs)
+    stage, write_output = searchdesc_stage(args)
+    run_stage(args, stage, write_output, parser=parse_fasta_raw)
+
+def searchseq_stage(args):
+    queries = []
+    if args.query is not None:
+        queries.append(args.query)
+    if args.queries_file is not None:
+        with open(args.queries_file) as f:
+            queries.extend(parse_seq_ids(f))
+    if not queries:
+        raise ValueError("No query sequences given")
+    if args.positions:
+        stage = functools.partial(
+            search_seq_positions, queries=queries,
+            search_revcomp=args.search_revcomp,
+            max_mismatches=args.max_mismatches)
+        return stage, write_tsv
+    stage = functools.partial(
+        search_seqs, query=queries, search_revcomp=args.search_revcomp,
+        max_mismatches=args.max_mismatches)
+    return stage, write_fasta
 
 def searchseq_subcommand(args):
-    seqs = parse_fasta(args.input_file)
-    filtered_seqs = search_seqs(
-        seqs, args.query, search_revcomp=args.search_revcomp)
-    write_fasta(args.output_file, filtered_seqs)
+    run_stage(args, *searchseq_stage(args))
+
+def chain_subcommand(args):
+    # Stages are applied to the records in one process, so they are
+    # parsed and written only once.
+    stages = list(parse_chain(args.stage_parser, args.stages))
+    stage_funcs = [stage for stage_args, stage, write_output in stages]
+
+    def chained_stages(seqs):
+        for stage in stage_funcs[:-1]:
+            seqs = reparsed_seqs(stage(seqs))
+        return stage_funcs[-1](seqs)
+
+    stage_args, stage, write_output = stages[-1]
+    apply_stage(args, chained_stages, write_output)
+    for stage_args, stage, write_output in stages:
+        if hasattr(stage_args, "report"):
+            stage_args.report(stage_args)
+
+def parse_chain(parser, argv):
+    # Yields the arguments, stage, and output function for each
+    # subcommand in the chain. Subcommands are separated by "::".
+    segments = [
+        list(g) for is_sep, g in itertools.groupby(argv, lambda x: x == "::")
+        if not is_sep]
+    if not segments:
+        raise ValueError("No subcommands given for chain")
+    for n, segment in enumerate(segments, start=1):
+        stage_args = parser.parse_args(segment)
+        if not hasattr(stage_args, "stage"):
+            raise ValueError(
+                "{0} can't be used in a chain".format(segment[0]))
+        if (stage_args.input is not None) or (stage_args.output is not None):
+            raise ValueError(
+                "Give --input and --output to chain, not to {0}".format(
+                    segment[0]))
+        if getattr(stage_args, "indexed", False):
+            raise ValueError("Indexed access can't be used in a chain")
+        if getattr(stage_args, "jobs", 1) > 1:
+            raise ValueError("--jobs can't be used in a chain")
+        stage, write_output = stage_args.stage(stage_args)
+        write_func = getattr(write_output, "func", write_output)
+        if (n < len(segments)) and (write_func is not write_fasta):
+            raise ValueError(
+                "{0} doesn't write FASTA, so it must be last in a "
+                "chain".format(segment[0]))
+        yield stage_args, stage, write_output
+
+def reparsed_seqs(seqs):
+    # Records as they would be read back by parse_fasta(), so that the
+    # output is the same as for a shell pipeline
+    for desc, seq in seqs:
+        if " " in seq:
+            seq = seq.replace(" ", "")
+        yield desc.rstrip(), seq
+
+def length_stage(args):
+    if args.summary:
+        raise ValueError("length --summary can't be used in a chain")
+    return get_seq_lengths, write_tsv
 
 def length_subcommand(args):
-    seqs = parse_fasta(args.input_file)
-    for seq_id, seq_len in get_seq_lengths(seqs):
-        args.output_file.write("{0}\t{1}\n".format(seq_id, seq_len))
+    if args.summary:
+        length_counts = count_lengths(parse_fasta_lengths(args.input_file))
+        write_tsv(args.output_file, length_summary(length_counts))
+        histogram = length_histogram(length_counts, args.bin_size)
+        write_tsv(args.output_file, histogram)
+    else:
+        run_stage(
+            args, seq_id_lengths, write_tsv, parser=parse_fasta_lengths)
+
+def positive_int(value):
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(
+            "must be a positive integer: {0}".format(value))
+    return n
 
 fasta_io_parser = argparse.ArgumentParser(add_help=False)
 fasta_io_parser.add_argument(
     "--input",
-    help="Input FASTA file (default: stdin)",
+    help=(
+        "Input FASTA file, optionally compressed with gzip, BGZF, or "
+        "zstd (default: stdin)"),
 )
 fasta_io_parser.add_argument(
     "--output",
-    help="Output file (default: stdout)",
+    help=(
+        "Output file, compressed if the name ends with .gz, .bgz, or "
+        ".zst (default: stdout)"),
 )
 
-def open_input(fp):
-    if fp is not None:
-        return open(fp, "r")
-    else:
-        return sys.stdin
+stats_parser = argparse.ArgumentParser(add_help=False)
+stats_parser.add_argument(
+    "--stats", action="store_true",
+    help=(
+        "Report the number of records and bytes read and written, the "
+        "time spent parsing, transforming, and writing records, and "
+        "peak memory use, to stderr"),
+)
+stats_parser.add_argument(
+    "--stats-file",
+    help="Write the report from --stats to a JSON file",
+)
+stats_parser.add_argument(
+    "--profile",
+    help=(
+        "Sample the call stack while running, and write the stacks to "
+        "this file in the folded format used by flame graph tools"),
+)
+stats_parser.add_argument(
+    "--profile-interval", type=float, default=0.001,
+    help="CPU time in seconds between samples (default: %(default)s)",
+)
 
-def open_output(fp):
+jobs_parser = argparse.ArgumentParser(add_help=False)
+jobs_parser.add_argument(
+    "--jobs", "--threads", type=int, default=1,
+    help=(
+        "Number of worker processes. Records are processed in chunks "
+        "and written in their original order (default: %(default)s)"),
+)
+
+def require_input_path(args):
+    if args.input is None:
+        raise ValueError("An input file is required (--input) for indexed access")
+    return args.input
+
+def open_input(fp, run_stats=None):
     if fp is not None:
-        return open(fp, "w")
+        f = open(fp, "rb")
+    else:
+        f = sys.stdin.buffer
+    if run_stats is not None:
+        f = run_stats.count_input(f)
+    return decompressed_reader(f)
+
+def open_output(fp, run_stats=None):
+    # Output is written as bytes, see write_lines()
+    if fp is None:
+        f = sys.stdout.buffer
+        compression = None
     else:
-        return sys.stdin
+        compression = compression_from_filename(fp)
+        if compression == "zstd":
+            # Raises ImportError if no zstd module is available, before
+            # the output file is created
+            zstd_module()
+        f = open(fp, "wb")
+    if run_stats is not None:
+        f = run_stats.count_output(f)
+    if compression is None:
+        return f
+    if compression == "bgzf":
+        index_fp = gzi_path(fp)
+    else:
+        index_fp = None
+    return compressed_writer(f, compression, index_fp=index_fp)
+
+def check_output_name(args):
+    # Binary files are read through an mmap, and recognized by a magic
+    # number at the start of the file, so subcommands that write them
+    # set compressed_output to False. This is checked before the output
+    # file is opened, so that no file is created.
+    if getattr(args, "compressed_output", True) or (args.output is None):
+        return
+    if compression_from_filename(args.output) is not None:
+        raise ValueError(
+            "This output can't be compressed; give an output file name "
+            "that doesn't end with .gz, .bgz, or .zst")
+
+def run_subcommand(args):
+    check_output_name(args)
+    if args.stats or (args.stats_file is not None):
+        args.run_stats = RunStats()
+    else:
+        args.run_stats = None
+    if args.profile is not None:
+        profiler = SamplingProfiler(args.profile_interval)
+        profiler.start()
+    args.input_file = open_input(args.input, args.run_stats)
+    args.output_file = open_output(args.output, args.run_stats)
+    try:
+        args.func(args)
+    finally:
+        if args.output is None:
+            args.output_file.flush()
+        else:
+            args.output_file.close()
+        if args.profile is not None:
+            profiler.stop()
+            profiler.save(args.profile)
+    if args.run_stats is not None:
+        args.run_stats.finish()
+        if args.stats:
+            args.run_stats.write_summary(sys.stderr)
+        if args.stats_file is not None:
+            args.run_stats.save(args.stats_file)
 
 def okfasta_main(argv=None):
     # Ignore SIG_PIPE and don't throw exceptions on it
     # newbebweb.blogspot.com/2012/02/python-head-ioerror-errno-32-broken.html
     signal.signal(signal.SIGPIPE, signal.SIG_DFL)
 
-    main_parser = argparse.ArgumentParser()
+    main_parser = argparse.ArgumentParser(parents=[stats_parser])
     subparsers = main_parser.add_subparsers(
         title="Subcommands", required=True)
 
@@ -157,7 +552,32 @@ def okfasta_main(argv=None):
         help=(
             "File containing sequence ID, start position, and stop "
             "position for each region to extract."))
-    extract_parser.set_defaults(func=extract_subcommand)
+    extract_parser.add_argument(
+        "--region-format", choices=sorted(REGION_PARSERS), default="regions",
+        help=(
+            "Format of the region file. Regions on the minus strand in "
+            "BED or GFF files are reverse complemented. "
+            "(default: %(default)s)"))
+    extract_parser.add_argument(
+        "--report-unmatched", action="store_true",
+        help=(
+            "Report sequence IDs in the region file that were not found "
+            "in the FASTA file"))
+    extract_parser.add_argument(
+        "--indexed", action="store_true",
+        help=(
+            "Use the FASTA index (.fai file) to read only the regions "
+            "requested. The index is created if it does not exist."))
+    extract_parser.set_defaults(
+        func=extract_subcommand, stage=extract_stage, report=extract_report)
+
+    fetch_parser = subparsers.add_parser(
+        "fetch", parents=[fasta_io_parser],
+        help='Fetch sequences by ID using the FASTA index')
+    fetch_parser.add_argument(
+        "idsfile",
+        help="File containing sequence IDs, one per line")
+    fetch_parser.set_defaults(func=fetch_subcommand)
 
     filterids_parser = subparsers.add_parser(
         "filterids", parents=[fasta_io_parser],
@@ -168,25 +588,101 @@ def okfasta_main(argv=None):
     filterids_parser.add_argument(
         "--remove-ids", action="store_true",
         help="Remove, rather than keep, IDs in list")
-    filterids_parser.set_defaults(func=filterids_subcommand)
+    duplicates_group = filterids_parser.add_mutually_exclusive_group()
+    duplicates_group.add_argument(
+        "--first-only", action="store_true",
+        help=(
+            "Keep only the first record for each ID, and stop reading "
+            "once each ID has been found"))
+    duplicates_group.add_argument(
+        "--keep-duplicates", action="store_false", dest="first_only",
+        help="Keep every record with a listed ID (the default)")
+    filterids_parser.add_argument(
+        "--report-counts", action="store_true",
+        help="Report the number of IDs found and missing")
+    filterids_parser.set_defaults(
+        func=filterids_subcommand, stage=filterids_stage,
+        report=filterids_report)
+
+    index_parser = subparsers.add_parser(
+        "index", parents=[fasta_io_parser],
+        help='Write FASTA index (default: input file name + .fai)')
+    index_parser.set_defaults(func=index_subcommand)
+
+    chain_parser = subparsers.add_parser(
+        "chain", parents=[fasta_io_parser],
+        help=(
+            "Run several subcommands in one process, as in a shell "
+            "pipeline. Subcommands are separated by \"::\", for example: "
+            "okfasta chain filterids ids.txt :: revcomp"))
+    chain_parser.add_argument(
+        "stages", nargs=argparse.REMAINDER,
+        help=(
+            "Subcommands and their arguments. Only the last subcommand "
+            "may write something other than FASTA."))
+    chain_parser.set_defaults(func=chain_subcommand, stage_parser=main_parser)
+
+    pack_parser = subparsers.add_parser(
+        "pack", parents=[fasta_io_parser],
+        help=(
+            "Convert FASTA to a packed binary file, with two bits per "
+            "base. Packed files can be used as input to any subcommand, "
+            "and are read much faster than FASTA."))
+    pack_parser.set_defaults(func=pack_subcommand, compressed_output=False)
+
+    kmercount_parser = subparsers.add_parser(
+        "kmercount", parents=[fasta_io_parser],
+        help='Count k-mers and write counts in TSV format')
+    kmercount_parser.add_argument(
+        "--k", type=int, default=8,
+        help="K-mer size (default: %(default)s)")
+    kmercount_parser.add_argument(
+        "--canonical", action="store_true",
+        help=(
+            "Count each k-mer together with its reverse complement, "
+            "reported as whichever comes first in sorted order"))
+    kmercount_parser.add_argument(
+        "--max-kmers", type=int,
+        help=(
+            "Maximum number of distinct k-mers to hold in memory. When "
+            "this is exceeded, counts are written to temporary files "
+            "and merged at the end."))
+    kmercount_parser.set_defaults(func=kmercount_subcommand)
 
     kmers_parser = subparsers.add_parser(
-        "kmers", parents=[fasta_io_parser],
+        "kmers", parents=[fasta_io_parser, jobs_parser],
         help='Write k-mers in TSV format')
     kmers_parser.add_argument(
         "--k", type=int, default=8,
         help="K-mer size (default: %(default)s)")
-    kmers_parser.set_defaults(func=kmers_subcommand)
+    kmers_parser.set_defaults(
+        func=kmers_subcommand, stage=kmers_stage)
 
     length_parser = subparsers.add_parser(
-        "length", parents=[fasta_io_parser],
+        "length", parents=[fasta_io_parser, jobs_parser],
         help='Write sequence lengths in TSV format')
-    length_parser.set_defaults(func=length_subcommand)
+    length_parser.add_argument(
+        "--summary", action="store_true",
+        help=(
+            "Write the number of sequences, total length, min, max, N50, "
+            "N90, and a histogram of lengths, instead of one line per "
+            "sequence"))
+    length_parser.add_argument(
+        "--bin-size", type=positive_int, default=1000,
+        help="Bin size for the length histogram (default: %(default)s)")
+    length_parser.set_defaults(
+        func=length_subcommand, stage=length_stage)
 
     normalize_parser = subparsers.add_parser(
         "normalize", parents=[fasta_io_parser],
         help='Rewrite FASTA file in standard format')
-    normalize_parser.set_defaults(func=normalize_subcommand)
+    normalize_parser.add_argument(
+        "--line-width", type=int,
+        help=(
+            "Wrap sequences to lines of this width (default: one line "
+            "per sequence)"))
+    normalize_parser.set_defaults(
+        func=normalize_subcommand, stage=normalize_stage)
 
     randomseqs_parser = subparsers.add_parser(
         "randomseqs", parents=[fasta_io_parser],
@@ -194,10 +690,24 @@ def okfasta_main(argv=None):
     randomseqs_parser.add_argument(
         "--n", type=int, default=100,
         help="Number of sequences (default: %(default)s)")
-    randomseqs_parser.set_defaults(func=randomseqs_subcommand)
+    randomseqs_parser.add_argument(
+        "--proportion", type=float,
+        help=(
+            "Select each sequence with this probability, instead of a "
+            "fixed number of sequences"))
+    randomseqs_parser.add_argument(
+        "--seed", type=int,
+        help="Seed for the random number generator, for reproducible output")
+    randomseqs_parser.add_argument(
+        "--indexed", action="store_true",
+        help=(
+            "Use the FASTA index (.fai file) to read only the selected "
+            "sequences. The index is created if it does not exist."))
+    randomseqs_parser.set_defaults(
+        func=randomseqs_subcommand, stage=randomseqs_stage)
 
     replacechars_subparser = subparsers.add_parser(
-        "replacechars", parents=[fasta_io_parser],
+        "replacechars", parents=[fasta_io_parser, jobs_parser],
         help="Replace characters in the sequences")
     replacechars_subparser.add_argument(
         "--replace", type=str, nargs=2, action="append",
@@ -205,7 +715,8 @@ def okfasta_main(argv=None):
     replacechars_subparser.add_argument(
         "--remove", type=str, action="append",
         help="Characters to remove")
-    replacechars_subparser.set_defaults(func=replacechars_subcommand)
+    replacechars_subparser.set_defaults(
+        func=replacechars_subcommand, stage=replacechars_stage)
 
     replaceids_subparser = subparsers.add_parser(
         "replaceids", parents=[fasta_io_parser],
@@ -215,56 +726,112 @@ def okfasta_main(argv=None):
         help=(
             "File containing existing sequence ID and replacement "
             "sequence ID, one pair per line, separated by whitespace. "
-            "Existing sequence IDs not in the file are left as they are."))
-    replaceids_subparser.set_defaults(func=replaceids_subcommand)
+            "Existing sequence IDs not in the file are left as they are. "
+            "A map saved by the idmap subcommand may be given instead."))
+    replaceids_subparser.set_defaults(
+        func=replaceids_subcommand, stage=replaceids_stage)
+
+    idmap_parser = subparsers.add_parser(
+        "idmap", parents=[fasta_io_parser],
+        help=(
+            "Save a file of replacement IDs or descriptions (the input) as "
+            "a compact binary map, for use with replaceids or replacedesc"))
+    idmap_parser.add_argument(
+        "--descriptions", action="store_true",
+        help="Read the file as descriptions, in the format for replacedesc")
+    idmap_parser.set_defaults(func=idmap_subcommand, compressed_output=False)
 
     replacedesc_parser = subparsers.add_parser(
         "replacedesc", parents=[fasta_io_parser],
         help='Replace description lines')
     replacedesc_parser.add_argument(
         "descfile",
-        help="File containing new descriptions")
+        help=(
+            "File containing new descriptions. A map saved by the idmap "
+            "subcommand may be given instead."))
     replacedesc_parser.add_argument(
         "--remove-old", action="store_true",
         help="Remove old descriptions",
     )
-    replacedesc_parser.set_defaults(func=replacedesc_subcommand)
+    replacedesc_parser.set_defaults(
+        func=replacedesc_subcommand, stage=replacedesc_stage)
 
     revcomp_parser = subparsers.add_parser(
-        "revcomp", parents=[fasta_io_parser],
+        "revcomp", parents=[fasta_io_parser, jobs_parser],
         help='Reverse complement sequences')
-    revcomp_parser.set_defaults(func=revcomp_subcommand)
+    revcomp_parser.add_argument(
+        "--lenient", action="store_true",
+        help=(
+            "Leave unknown symbols in place, instead of stopping with an "
+            "error"))
+    revcomp_parser.add_argument(
+        "--indexed", action="store_true",
+        help=(
+            "Use the FASTA index (.fai file) to read each sequence from "
+            "the end, so that long sequences are not held in memory. The "
+            "index is created if it does not exist."))
+    revcomp_parser.set_defaults(
+        func=revcomp_subcommand, stage=revcomp_stage)
 
     searchdesc_parser = subparsers.add_parser(
-        "searchdesc", parents=[fasta_io_parser],
+        "searchdesc", parents=[fasta_io_parser, jobs_parser],
         help='Find sequences where description matches pattern')
     searchdesc_parser.add_argument(
-        "regex",
+        "regex", nargs="?",
         help="Regular expression for searching descriptions")
-    searchdesc_parser.set_defaults(func=searchdesc_subcommand)
+    searchdesc_parser.add_argument(
+        "--patterns-file",
+        help=(
+            "File containing patterns, one per line. Descriptions that "
+            "match any pattern are selected."))
+    searchdesc_parser.add_argument(
+        "--fixed-strings", action="store_true",
+        help="Match patterns as plain text, not regular expressions")
+    searchdesc_parser.add_argument(
+        "--ignore-case", action="store_true",
+        help="Ignore case when matching")
+    searchdesc_parser.set_defaults(
+        func=searchdesc_subcommand, stage=searchdesc_stage)
 
     searchseq_parser = subparsers.add_parser(
-        "searchseq", parents=[fasta_io_parser],
-        help='Find sequences that match a query sequence exactly')
+        "searchseq", parents=[fasta_io_parser, jobs_parser],
+        help='Find sequences that contain a query sequence')
+    searchseq_parser.add_argument(
+        "query", nargs="?",
+        help="Query sequence, which may contain ambiguous bases")
     searchseq_parser.add_argument(
-        "query",
-        help="Query sequence")
+        "--queries-file",
+        help=(
+            "File containing query sequences, one per line. Sequences "
+            "matching any query are written."))
     searchseq_parser.add_argument(
         "--search-revcomp", action="store_true",
         help="Search for the query and its reverse complement",
     )
-    searchseq_parser.set_defaults(func=searchseq_subcommand)
+    searchseq_parser.add_argument(
+        "--max-mismatches", type=int, default=0,
+        help=(
+            "Maximum number of mismatched bases in a match. Ambiguous "
+            "bases in the query match any of their bases "
+            "(default: %(default)s)"))
+    searchseq_parser.add_argument(
+        "--positions", action="store_true",
+        help=(
+            "Write the position of each match in TSV format, rather than "
+            "the matching sequences. Columns are sequence ID, query, "
+            "strand, start, end, number of mismatches, and matched "
+            "sequence."))
+    searchseq_parser.set_defaults(
+        func=searchseq_subcommand, stage=searchseq_stage)
 
     args = main_parser.parse_args(argv)
-    args.input_file = open_input(args.input)
-    args.output_file = open_output(args.output)
-    args.func(args)
+    run_subcommand(args)
 
 
 def msa_ok_main(argv=None):
     signal.signal(signal.SIGPIPE, signal.SIG_DFL)
 
-    main_parser = argparse.ArgumentParser()
+    main_parser = argparse.ArgumentParser(parents=[stats_parser])
     subparsers = main_parser.add_subparsers(
         title="Subcommands", required=True)
 
@@ -279,11 +846,23 @@ def msa_ok_main(argv=None):
         "--remove-columns", action="store_true",
         help="Remove, rather than keep, columns in list",
     )
+    selectcol_parser.add_argument(
+        "--stream", action="store_true",
+        help=(
+            "Write each sequence as it is read, rather than loading the "
+            "alignment. Sequences may not be longer than the first one."),
+    )
     selectcol_parser.set_defaults(func=selectcol_subcommand)
 
     colstats_parser = subparsers.add_parser(
         "colstats", parents=[fasta_io_parser],
         help='Compute summary statistics')
+    colstats_parser.add_argument(
+        "--backend", choices=list(MSA_BACKENDS), default="stream",
+        help=(
+            "Alignment representation: counts accumulated as rows are "
+            "read, a block of bytes that is sliced by column, or one "
+            "string per column (default: %(default)s)"))
     colstats_parser.set_defaults(func=colstats_subcommand)
 
     mismatches_parser = subparsers.add_parser(
@@ -295,10 +874,13 @@ def msa_ok_main(argv=None):
     mismatches_parser.add_argument(
         "--percent", action="store_true",
         help="Report percentage mismatch rather than number of mismatches")
+    mismatches_parser.add_argument(
+        "--format", choices=["pairs", "matrix", "phylip"], default="pairs",
+        help=(
+            "Write one line per pair of sequences, a square matrix in TSV "
+            "format, or a PHYLIP distance matrix (default: %(default)s)"))
     mismatches_parser.set_defaults(func=mismatches_subcommand)
 
     args = main_parser.parse_args(argv)
-    args.input_file = open_input(args.input)
-    args.output_file = open_output(args.output)
-    args.func(args)
+    run_subcommand(args)
 
@@ -0,0 +1,350 @@
+import bisect
+import gzip
+import io
+import mmap
+import os.path
+import queue
+import struct
+import threading
+import zlib
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+COMPRESSION_EXTENSIONS = {
+    ".gz": "gzip",
+    ".bgz": "bgzf",
+    ".bgzf": "bgzf",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+}
+
+# Size of data passed between the main thread and the codec thread
+THREAD_BLOCK_SIZE = 1 << 20
+THREAD_QUEUE_SIZE = 8
+
+# Maximum amount of uncompressed data in one BGZF block, as in htslib
+BGZF_BLOCK_SIZE = 0xff00
+BGZF_HEADER = struct.Struct("<4BI2BH2BHH")
+BGZF_EOF = bytes.fromhex(
+    "1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+def detect_compression(data):
+    if data.startswith(GZIP_MAGIC):
+        if is_bgzf_header(data):
+            return "bgzf"
+        return "gzip"
+    if data.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+def is_bgzf_header(data):
+    # BGZF blocks are gzip members with a "BC" extra subfield
+    return (
+        len(data) >= 16 and (data[3] & 4) and
+        data[12:14] == b"BC" and data[14:16] == b"\x02\x00")
+
+def compression_from_filename(fp):
+    _, ext = os.path.splitext(fp)
+    return COMPRESSION_EXTENSIONS.get(ext.lower())
+
+def zstd_module():
+    try:
+        from compression import zstd
+        return zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        raise ImportError(
+            "Reading or writing zstd files requires Python 3.14 or the "
+            "zstandard package") from None
+
+def decompressed_reader(f):
+    if not hasattr(f, "peek"):
+        f = io.BufferedReader(f)
+    compression = detect_compression(f.peek(18)[:18])
+    if compression is None:
+        return f
+    if compression == "zstd":
+        zstd = zstd_module()
+        if hasattr(zstd, "ZstdFile"):
+            reader = zstd.ZstdFile(f)
+        else:
+            reader = zstd.ZstdDecompressor().stream_reader(
+                f, read_across_frames=True)
+    else:
+        # BGZF files are valid multi-member gzip files
+        reader = gzip.GzipFile(fileobj=f)
+    return ThreadedReader(reader)
+
+def compressed_writer(f, compression, index_fp=None):
+    if compression is None:
+        return f
+    if compression == "gzip":
+        writer = gzip.GzipFile(fileobj=f, mode="wb")
+    elif compression == "bgzf":
+        writer = BgzfWriter(f, index_fp=index_fp)
+    elif compression == "zstd":
+        zstd = zstd_module()
+        if hasattr(zstd, "ZstdFile"):
+            writer = zstd.ZstdFile(f, "w")
+        else:
+            writer = zstd.ZstdCompressor().stream_writer(f)
+    else:
+        raise ValueError("Unknown compression: {0}".format(compression))
+    return ThreadedWriter(writer, f)
+
+class ThreadedReader(io.BufferedIOBase):
+    # Reads from the source on a background thread, so that
+    # decompression overlaps with parsing.
+    def __init__(self, source, block_size=THREAD_BLOCK_SIZE):
+        self.source = source
+        self.block_size = block_size
+        self.blocks = queue.Queue(THREAD_QUEUE_SIZE)
+        self.buf = b""
+        self.eof = False
+        self.thread = threading.Thread(target=self._read_blocks, daemon=True)
+        self.thread.start()
+
+    def _read_blocks(self):
+        try:
+            while True:
+                block = self.source.read(self.block_size)
+                self.blocks.put(block)
+                if not block:
+                    break
+        except Exception as e:
+            self.blocks.put(e)
+
+    def _next_block(self):
+        block = self.blocks.get()
+        if isinstance(block, Exception):
+            self.eof = True
+            raise block
+        if not block:
+            self.eof = True
+        return block
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            pieces = [self.buf]
+            while not self.eof:
+                pieces.append(self._next_block())
+            self.buf = b""
+            return b"".join(pieces)
+        if (not self.buf) and (size > 0) and (not self.eof):
+            self.buf = self._next_block()
+        data = self.buf[:size]
+        self.buf = self.buf[size:]
+        return data
+
+    def read1(self, size=-1):
+        return self.read(size)
+
+    def close(self):
+        self.source.close()
+        super().close()
+
+class ThreadedWriter(io.BufferedIOBase):
+    # Passes data to the sink on a background thread, so that
+    # compression overlaps with formatting the output.
+    def __init__(self, sink, raw=None, block_size=THREAD_BLOCK_SIZE):
+        self.sink = sink
+        self.raw = raw
+        self.block_size = block_size
+        self.buf = bytearray()
+        self.blocks = queue.Queue(THREAD_QUEUE_SIZE)
+        self.error = None
+        self.thread = threading.Thread(target=self._write_blocks, daemon=True)
+        self.thread.start()
+
+    def _write_blocks(self):
+        while True:
+            block = self.blocks.get()
+            if block is None:
+                break
+            if self.error is None:
+                try:
+                    self.sink.write(block)
+                except Exception as e:
+                    self.error = e
+
+    def _check_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._check_error()
+        self.buf += data
+        if len(self.buf) >= self.block_size:
+            self.blocks.put(bytes(self.buf))
+            self.buf.clear()
+        return len(data)
+
+    def flush(self):
+        if self.buf:
+            self.blocks.put(bytes(self.buf))
+            self.buf.clear()
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.blocks.put(None)
+        self.thread.join()
+        super().close()
+        self.sink.close()
+        if self.raw is not None:
+            self.raw.close()
+        self._check_error()
+
+class BgzfWriter(io.BufferedIOBase):
+    def __init__(self, raw, index_fp=None, compresslevel=6):
+        self.raw = raw
+        self.index_fp = index_fp
+        self.compresslevel = compresslevel
+        self.buf = bytearray()
+        self.compressed_offset = 0
+        self.uncompressed_offset = 0
+        # Start of each block after the first, as in a .gzi file
+        self.block_offsets = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buf += data
+        while len(self.buf) >= BGZF_BLOCK_SIZE:
+            self._write_block(bytes(self.buf[:BGZF_BLOCK_SIZE]))
+            del self.buf[:BGZF_BLOCK_SIZE]
+        return len(data)
+
+    def _write_block(self, data):
+        if self.compressed_offset > 0:
+            self.block_offsets.append(
+                (self.compressed_offset, self.uncompressed_offset))
+        c = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15)
+        cdata = c.compress(data) + c.flush()
+        block_size = BGZF_HEADER.size + len(cdata) + 8
+        header = BGZF_HEADER.pack(
+            31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, block_size - 1)
+        trailer = struct.pack("<II", zlib.crc32(data), len(data))
+        self.raw.write(header + cdata + trailer)
+        self.compressed_offset += block_size
+        self.uncompressed_offset += len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        if self.buf:
+            self._write_block(bytes(self.buf))
+            self.buf.clear()
+        self.raw.write(BGZF_EOF)
+        self.raw.flush()
+        if self.index_fp is not None:
+            with open(self.index_fp, "wb") as f:
+                write_gzi(f, self.block_offsets)
+        super().close()
+
+def gzi_path(fp):
+    return fp + ".gzi"
+
+def write_gzi(f, block_offsets):
+    f.write(struct.pack("<Q", len(block_offsets)))
+    for compressed_offset, uncompressed_offset in block_offsets:
+        f.write(struct.pack("<QQ", compressed_offset, uncompressed_offset))
+
+def parse_gzi(f):
+    data = f.read()
+    (n,) = struct.unpack_from("<Q", data)
+    for i in range(n):
+        yield struct.unpack_from("<QQ", data, 8 + 16 * i)
+
+def scan_bgzf_blocks(data):
+    compressed_offset = 0
+    uncompressed_offset = 0
+    while compressed_offset < len(data):
+        header = BGZF_HEADER.unpack_from(data, compressed_offset)
+        block_size = header[-1] + 1
+        block_end = compressed_offset + block_size
+        (isize,) = struct.unpack_from("<I", data, block_end - 4)
+        if (compressed_offset > 0) and (isize > 0):
+            yield compressed_offset, uncompressed_offset
+        compressed_offset = block_end
+        uncompressed_offset += isize
+
+class BgzfData:
+    # Random access to the uncompressed contents of a BGZF file, with
+    # the same slicing and rfind() methods that we use on an mmap.
+    def __init__(self, fp):
+        with open(fp, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        index_fp = gzi_path(fp)
+        if os.path.exists(index_fp):
+            with open(index_fp, "rb") as f:
+                block_offsets = list(parse_gzi(f))
+        else:
+            block_offsets = list(scan_bgzf_blocks(self.data))
+        self.compressed_offsets = [0] + [c for c, u in block_offsets]
+        self.uncompressed_offsets = [0] + [u for c, u in block_offsets]
+        self.cached_block = (None, b"")
+
+    def _block(self, i):
+        if self.cached_block[0] != i:
+            start = self.compressed_offsets[i]
+            header = BGZF_HEADER.unpack_from(self.data, start)
+            end = start + header[-1] + 1
+            cdata = self.data[(start + BGZF_HEADER.size):(end - 8)]
+            self.cached_block = (i, zlib.decompress(cdata, -15))
+        return self.cached_block[1]
+
+    def read(self, start, stop):
+        if stop <= start:
+            return b""
+        i = bisect.bisect_right(self.uncompressed_offsets, start) - 1
+        pieces = []
+        while i < len(self.uncompressed_offsets):
+            block_start = self.uncompressed_offsets[i]
+            if block_start >= stop:
+                break
+            block = self._block(i)
+            pieces.append(block[max(start - block_start, 0):(stop - block_start)])
+            i += 1
+        return b"".join(pieces)
+
+    def __getitem__(self, s):
+        return self.read(s.start, s.stop)
+
+    def rfind(self, sub, start, end):
+        window = BGZF_BLOCK_SIZE
+        while end > start:
+            window_start = max(start, end - window)
+            # Overlap windows so that matches are not split between them
+            data = self.read(window_start, end)
+            idx = data.rfind(sub)
+            if idx >= 0:
+                return window_start + idx
+            end = window_start + len(sub) - 1
+            if window_start == start:
+                break
+        return -1
+
+def open_random_access(fp):
+    with open(fp, "rb") as f:
+        header = f.read(18)
+    if detect_compression(header) == "bgzf":
+        return BgzfData(fp)
+    if detect_compression(header) is not None:
+        raise ValueError(
+            "Random access requires an uncompressed or BGZF file: " + fp)
+    with open(fp, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
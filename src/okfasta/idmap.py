@@ -0,0 +1,142 @@
+import array
+import bisect
+import itertools
+import mmap
+import struct
+import zlib
+
+from .arrays import read_array, write_array
+
+IDMAP_MAGIC = b"OKIDMAP1"
+IDMAP_HEADER = struct.Struct("<8sQ")
+
+class IdMap:
+    # Mapping from str keys to str values, held as two arenas of UTF-8
+    # bytes with an array of offsets into each. Entries are sorted by
+    # the CRC-32 of the key, so a lookup is one bisect over an array of
+    # integers followed by a comparison of the key bytes. The same
+    # layout is written to disk, and a saved map can be used through an
+    # mmap without reading it into memory.
+    def __init__(self, hashes, key_offsets, keys, value_offsets, values):
+        self.hashes = hashes
+        self.key_offsets = key_offsets
+        self.keys = keys
+        self.value_offsets = value_offsets
+        self.values = values
+        # Where the entries for each value of the top bits of the hash
+        # begin, to narrow each bisect to a few entries
+        bits = min(16, len(hashes).bit_length())
+        self.shift = 32 - bits
+        self.buckets = array.array("Q", [
+            bisect.bisect_left(hashes, b << self.shift)
+            for b in range((1 << bits) + 1)])
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def get(self, key, default=None):
+        k = key.encode()
+        h = zlib.crc32(k)
+        hashes = self.hashes
+        key_offsets = self.key_offsets
+        b = h >> self.shift
+        n = self.buckets[b + 1]
+        i = bisect.bisect_left(hashes, h, self.buckets[b], n)
+        while (i < n) and (hashes[i] == h):
+            if self.keys[key_offsets[i]:key_offsets[i + 1]] == k:
+                start = self.value_offsets[i]
+                end = self.value_offsets[i + 1]
+                return str(self.values[start:end], "utf-8")
+            i += 1
+        return default
+
+    def items(self):
+        for i in range(len(self)):
+            key = self.keys[self.key_offsets[i]:self.key_offsets[i + 1]]
+            value = self.values[self.value_offsets[i]:self.value_offsets[i + 1]]
+            yield str(key, "utf-8"), str(value, "utf-8")
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        # The input is collected into arenas first, so that only the
+        # sort order is held as a list of Python objects.
+        keys = bytearray()
+        values = bytearray()
+        key_offsets = array.array("Q", [0])
+        value_offsets = array.array("Q", [0])
+        hashes = array.array("I")
+        for key, value in pairs:
+            k = key.encode()
+            keys += k
+            key_offsets.append(len(keys))
+            values += value.encode()
+            value_offsets.append(len(values))
+            hashes.append(zlib.crc32(k))
+
+        def key_at(i):
+            return keys[key_offsets[i]:key_offsets[i + 1]]
+
+        order = sorted(range(len(hashes)), key=hashes.__getitem__)
+        sorted_hashes = array.array("I")
+        sorted_keys = bytearray()
+        sorted_key_offsets = array.array("Q", [0])
+        sorted_values = bytearray()
+        sorted_value_offsets = array.array("Q", [0])
+        for h, group in itertools.groupby(order, key=hashes.__getitem__):
+            group = list(group)
+            if len(group) > 1:
+                # As with dict(), the last value given for a key is kept
+                last = {bytes(key_at(i)): i for i in group}
+                group = sorted(last.values())
+            for i in group:
+                sorted_hashes.append(h)
+                sorted_keys += key_at(i)
+                sorted_key_offsets.append(len(sorted_keys))
+                sorted_values += values[value_offsets[i]:value_offsets[i + 1]]
+                sorted_value_offsets.append(len(sorted_values))
+        return cls(
+            sorted_hashes, sorted_key_offsets, sorted_keys,
+            sorted_value_offsets, sorted_values)
+
+    def save(self, f):
+        n = len(self)
+        f.write(IDMAP_HEADER.pack(IDMAP_MAGIC, n))
+        write_array(f, self.hashes)
+        if n % 2:
+            # Keep the offset arrays aligned to 8 bytes
+            f.write(b"\0" * 4)
+        write_array(f, self.key_offsets)
+        write_array(f, self.value_offsets)
+        f.write(self.keys)
+        f.write(self.values)
+
+    @classmethod
+    def load(cls, data):
+        magic, n = IDMAP_HEADER.unpack_from(data)
+        if magic != IDMAP_MAGIC:
+            raise ValueError("Not an ID map file")
+        view = memoryview(data)
+        start = IDMAP_HEADER.size
+        hashes, start = read_array(view, "I", start, n)
+        start += 4 * (n % 2)
+        key_offsets, start = read_array(view, "Q", start, n + 1)
+        value_offsets, start = read_array(view, "Q", start, n + 1)
+        keys_end = start + key_offsets[n]
+        keys = view[start:keys_end]
+        values = view[keys_end:(keys_end + value_offsets[n])]
+        return cls(hashes, key_offsets, keys, value_offsets, values)
+
+def is_id_map(fp):
+    with open(fp, "rb") as f:
+        return f.read(len(IDMAP_MAGIC)) == IDMAP_MAGIC
+
+def load_id_map(fp, parse_pairs):
+    # A saved map is memory-mapped. A text file is parsed with
+    # parse_pairs() into a dict, which is faster to build and to look
+    # up, but takes several times the memory.
+    if is_id_map(fp):
+        with open(fp, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return IdMap.load(data)
+    with open(fp, "r") as f:
+        return dict(parse_pairs(f))
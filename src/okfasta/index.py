@@ -0,0 +1,174 @@
+import collections
+import os.path
+
+from .compression import decompressed_reader, open_random_access
+from .io import read_fasta_chunks, split_records, write_lines
+from .pack import is_packed_path, open_packed
+from .seqs import (
+    group_regions, is_rna, reverse_complement, reverse_complement_bytes,
+    )
+
+# Number of bases read at a time when streaming a sequence
+SEQ_BLOCK_SIZE = 1 << 20
+
+FastaIndexEntry = collections.namedtuple(
+    "FastaIndexEntry", ["name", "length", "offset", "linebases", "linewidth"])
+
+def build_fasta_index(f):
+    # The chunks cover the whole file, so we can track the byte offset
+    # of each chunk by adding up their lengths.
+    chunk_offset = 0
+    for chunk in read_fasta_chunks(f):
+        if not chunk.startswith(b">"):
+            raise ValueError("FASTA file must start with a description line")
+        for start, nl, end in split_records(chunk):
+            header = chunk[(start + 1):nl].decode()
+            toks = header.split(maxsplit=1)
+            name = toks[0] if toks else ""
+            body = chunk[(nl + 1):end]
+            offset = chunk_offset + nl + 1
+            yield index_record(name, body, offset)
+        chunk_offset += len(chunk)
+
+def index_record(name, body, offset):
+    if (b" " in body) or (b"\t" in body):
+        raise ValueError(
+            "Cannot index sequence {0}: whitespace in sequence".format(name))
+    content = body.rstrip(b"\r\n")
+    newline_len = 2 if body[len(content):].startswith(b"\r\n") else 1
+    num_newlines = content.count(b"\n")
+    if num_newlines == 0:
+        if b"\r" in content:
+            raise ValueError(
+                "Cannot index sequence {0}: mixed line endings".format(name))
+        linebases = len(content)
+        return FastaIndexEntry(
+            name, linebases, offset, linebases, linebases + newline_len)
+    linewidth = content.find(b"\n") + 1
+    newline_len = 2 if content[linewidth - 2] == ord("\r") else 1
+    linebases = linewidth - newline_len
+    newlines = content[(linewidth - 1)::linewidth]
+    last_line_len = len(content) - num_newlines * linewidth
+    if (
+        (newlines != b"\n" * num_newlines) or
+        (last_line_len < 1) or (last_line_len > linebases)
+    ):
+        raise ValueError(
+            "Cannot index sequence {0}: lines have different "
+            "lengths".format(name))
+    if content.count(b"\r") != num_newlines * (newline_len - 1):
+        raise ValueError(
+            "Cannot index sequence {0}: mixed line endings".format(name))
+    length = num_newlines * linebases + last_line_len
+    return FastaIndexEntry(name, length, offset, linebases, linewidth)
+
+def write_fasta_index(f, entries):
+    write_lines(f, ("{0}\t{1}\t{2}\t{3}\t{4}\n".format(*e) for e in entries))
+
+def parse_fasta_index(f):
+    for line in f:
+        line = line.rstrip("\r\n")
+        if line == "":
+            continue
+        toks = line.split("\t")
+        yield FastaIndexEntry(toks[0], *(int(tok) for tok in toks[1:5]))
+
+def fasta_index_path(fasta_fp):
+    return fasta_fp + ".fai"
+
+def load_fasta_index(fasta_fp):
+    index_fp = fasta_index_path(fasta_fp)
+    if os.path.exists(index_fp):
+        with open(index_fp) as f:
+            return list(parse_fasta_index(f))
+    with decompressed_reader(open(fasta_fp, "rb")) as f:
+        entries = list(build_fasta_index(f))
+    with open(index_fp, "w") as f:
+        write_fasta_index(f, entries)
+    return entries
+
+class IndexedFasta:
+    def __init__(self, fp, entries=None):
+        if entries is None:
+            entries = load_fasta_index(fp)
+        self.entries = entries
+        self.entries_by_name = {}
+        for entry in entries:
+            self.entries_by_name.setdefault(entry.name, entry)
+        self.data = open_random_access(fp)
+
+    def __contains__(self, name):
+        return name in self.entries_by_name
+
+    def get_desc(self, entry):
+        # The description line ends just before the first base
+        line_end = entry.offset - 1
+        line_start = self.data.rfind(b"\n", 0, line_end) + 1
+        line = self.data[line_start:line_end].decode()
+        return line.strip()[1:]
+
+    def get_seq(self, entry, start_idx=None, end_idx=None):
+        return self.get_seq_bytes(entry, start_idx, end_idx).decode()
+
+    def get_seq_bytes(self, entry, start_idx=None, end_idx=None):
+        # Slicing works just as it would on the sequence string
+        start, stop, _ = slice(start_idx, end_idx).indices(entry.length)
+        if stop <= start:
+            return b""
+        start_byte = self.byte_offset(entry, start)
+        stop_byte = self.byte_offset(entry, stop - 1) + 1
+        return self.data[start_byte:stop_byte].translate(None, b"\r\n")
+
+    def byte_offset(self, entry, idx):
+        line_num, line_pos = divmod(idx, entry.linebases)
+        return entry.offset + line_num * entry.linewidth + line_pos
+
+    def fetch(self, name):
+        entry = self.entries_by_name[name]
+        return self.get_desc(entry), self.get_seq(entry)
+
+def open_indexed_fasta(fp):
+    # Packed files are indexed already
+    if is_packed_path(fp):
+        return open_packed(fp)
+    return IndexedFasta(fp)
+
+def fetch_seqs(indexed_fasta, seq_ids):
+    for seq_id in seq_ids:
+        if seq_id in indexed_fasta:
+            yield indexed_fasta.fetch(seq_id)
+
+def extract_indexed_regions(regions, indexed_fasta, unmatched=None):
+    # Regions are read in file order, so that reads from the file are
+    # mostly sequential.
+    regions_table = group_regions(regions)
+    for entry in indexed_fasta.entries:
+        seq_regions = regions_table.get(entry.name)
+        if seq_regions is None:
+            continue
+        for start_pos, end_pos, strand in seq_regions:
+            extract_id = "{0}__{1}_{2}".format(entry.name, start_pos, end_pos)
+            start_idx = start_pos - 1
+            end_idx = end_pos
+            extract_seq = indexed_fasta.get_seq(entry, start_idx, end_idx)
+            if strand == "-":
+                extract_id += "_rc"
+                extract_seq = reverse_complement(extract_seq)
+            yield extract_id, extract_seq
+    if unmatched is not None:
+        for seq_id, seq_regions in regions_table.items():
+            if seq_id not in indexed_fasta:
+                unmatched.extend((seq_id,) + r for r in seq_regions)
+
+def reverse_complement_blocks(
+        indexed_fasta, entry, strict=True, block_size=SEQ_BLOCK_SIZE):
+    # Yields the reverse complement of a sequence in pieces, starting
+    # from the end, so that the whole sequence is never held in memory.
+    # The sequence is read twice: once to check if it is RNA.
+    block_starts = range(0, entry.length, block_size)
+    rna = any(
+        is_rna(indexed_fasta.get_seq_bytes(entry, x, x + block_size))
+        for x in block_starts)
+    for x in reversed(block_starts):
+        block = indexed_fasta.get_seq_bytes(entry, x, x + block_size)
+        yield reverse_complement_bytes(block, strict, rna).decode()
@@ -1,6 +1,52 @@
-from io import StringIO
+import itertools
+from io import BufferedIOBase, RawIOBase, StringIO
 
-def parse_fasta(f):
+from .pack import is_packed_file, load_packed
+
+# Size of the blocks read from binary input streams
+BLOCK_SIZE = 1 << 20
+
+# Output is joined into pieces of about this many characters, and each
+# piece is written with one call
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Whitespace removed from the sequence lines of a record
+SEQ_WHITESPACE = b" \r\n"
+
+# If any of these are found in a chunk of records, we fall back to
+# the line-by-line parser, which handles them exactly as it always has.
+SLOW_PATH_BYTES = (
+    b"\x0b", b"\x0c", b"\x1c", b"\x1d", b"\x1e", b"\x1f", b" >",
+)
+
+def parse_fasta(f, block_size=BLOCK_SIZE):
+    if not is_binary_file(f):
+        yield from parse_fasta_lines(f)
+        return
+    if is_packed_file(f):
+        yield from load_packed(f)
+        return
+    for chunk in read_fasta_chunks(f, block_size):
+        if not is_simple_chunk(chunk):
+            yield from parse_fasta_lines(chunk_lines(chunk))
+            continue
+        text = chunk.decode()
+        check_tabs = "\t" in text
+        remove_cr = "\r" in text
+        for start, nl, end in split_records(text):
+            seq = text[(nl + 1):end]
+            if (check_tabs and "\t" in seq) or not seq.isascii():
+                yield from parse_fasta_lines(chunk_lines(text[start:end]))
+                continue
+            seq = seq.replace("\n", "")
+            # Whitespace is not meaningful
+            if " " in seq:
+                seq = seq.replace(" ", "")
+            if remove_cr:
+                seq = seq.replace("\r", "")
+            yield text[(start + 1):nl].rstrip(), seq
+
+def parse_fasta_lines(f):
     f = iter(f)
     line = next(f)
     line = line.strip()
@@ -19,10 +65,205 @@ def parse_fasta(f):
             seq.write(line)
     yield desc, seq.getvalue()
 
+def parse_fasta_raw(f, block_size=BLOCK_SIZE):
+    # Yields the description and the undecoded sequence lines of each
+    # record, so that callers can skip records without building the
+    # sequence. Use decode_seq() to get the sequence.
+    if not is_binary_file(f):
+        for desc, seq in parse_fasta_lines(f):
+            yield desc, seq.encode()
+        return
+    if is_packed_file(f):
+        yield from load_packed(f).raw_records()
+        return
+    for chunk in read_fasta_chunks(f, block_size):
+        if not is_simple_chunk(chunk):
+            for desc, seq in parse_fasta_lines(chunk_lines(chunk)):
+                yield desc, seq.encode()
+            continue
+        check_tabs = b"\t" in chunk
+        for start, nl, end in split_records(chunk):
+            body = chunk[(nl + 1):end]
+            if (check_tabs and b"\t" in body) or not body.isascii():
+                lines = chunk_lines(chunk[start:end])
+                for desc, seq in parse_fasta_lines(lines):
+                    yield desc, seq.encode()
+                continue
+            yield chunk[(start + 1):nl].decode().rstrip(), body
+
+def parse_fasta_lengths(f, block_size=BLOCK_SIZE):
+    # Yields the description and sequence length of each record. The
+    # length is found by counting newlines in the chunk, without
+    # building the sequence.
+    if not is_binary_file(f):
+        for desc, seq in parse_fasta_lines(f):
+            yield desc, len(seq)
+        return
+    if is_packed_file(f):
+        # Lengths are stored in the file
+        yield from load_packed(f).lengths()
+        return
+    for chunk in read_fasta_chunks(f, block_size):
+        if not is_simple_chunk(chunk):
+            for desc, seq in parse_fasta_lines(chunk_lines(chunk)):
+                yield desc, len(seq)
+            continue
+        text = chunk.decode()
+        check_tabs = "\t" in text
+        check_ascii = not text.isascii()
+        whitespace = [x for x in (" ", "\r") if x in text]
+        for start, nl, end in split_records(text):
+            body_start = min(nl + 1, end)
+            if (
+                (check_tabs and text.find("\t", body_start, end) >= 0) or
+                (check_ascii and not text[body_start:end].isascii())
+            ):
+                lines = chunk_lines(text[start:end])
+                for desc, seq in parse_fasta_lines(lines):
+                    yield desc, len(seq)
+                continue
+            length = end - body_start - text.count("\n", body_start, end)
+            for x in whitespace:
+                # Finding a character is much faster than counting it
+                if text.find(x, body_start, end) >= 0:
+                    length -= text.count(x, body_start, end)
+            yield text[(start + 1):nl].rstrip(), length
+
+def decode_seq(body):
+    return body.translate(None, SEQ_WHITESPACE).decode()
+
+def decode_seqs(raw_seqs):
+    for desc, body in raw_seqs:
+        yield desc, decode_seq(body)
+
+def read_fasta_chunks(f, block_size=BLOCK_SIZE):
+    # Yields chunks of the input that contain only whole records. Each
+    # chunk is split just before a ">" that starts a line.
+    pending = []
+    while True:
+        block = f.read(block_size)
+        if not block:
+            break
+        if pending and pending[-1].endswith(b"\n") and block.startswith(b">"):
+            yield b"".join(pending)
+            pending = []
+        idx = block.rfind(b"\n>")
+        if idx < 0:
+            pending.append(block)
+            continue
+        pending.append(block[:(idx + 1)])
+        yield b"".join(pending)
+        pending = [block[(idx + 1):]]
+    if pending:
+        yield b"".join(pending)
+
+def split_records(chunk):
+    # Yields the start of each record, the end of its description
+    # line, and the end of the record. Works for both str and bytes.
+    if isinstance(chunk, bytes):
+        boundary, newline = b"\n>", b"\n"
+    else:
+        boundary, newline = "\n>", "\n"
+    chunk_len = len(chunk)
+    start = 0
+    while start < chunk_len:
+        end = chunk.find(boundary, start)
+        if end < 0:
+            end = chunk_len
+        else:
+            end += 1
+        nl = chunk.find(newline, start, end)
+        if nl < 0:
+            nl = end
+        yield start, nl, end
+        start = end
+
+def is_simple_chunk(chunk):
+    if not chunk.startswith(b">"):
+        return False
+    for x in SLOW_PATH_BYTES:
+        if x in chunk:
+            return False
+    if b"\r" in chunk:
+        # Only Windows line endings are handled on the fast path
+        if chunk.count(b"\r") != chunk.count(b"\r\n"):
+            return False
+    return True
+
+def chunk_lines(chunk):
+    if isinstance(chunk, bytes):
+        chunk = chunk.decode()
+    return StringIO(chunk, newline=None)
+
+def is_binary_file(f):
+    return hasattr(f, "read") and isinstance(f.read(0), bytes)
 
-def write_fasta(f, seqs):
-    for desc, seq in seqs:
-        f.write(">{0}\n{1}\n".format(desc, seq))
+def is_binary_output(f):
+    # Anything that we can't tell is binary gets text. Wrappers, such as
+    # those from tempfile, pass on the mode of the file they wrap.
+    if isinstance(f, (RawIOBase, BufferedIOBase)):
+        return True
+    mode = getattr(f, "mode", "")
+    return isinstance(mode, str) and ("b" in mode)
+
+def write_lines(f, lines, buffer_size=OUTPUT_BUFFER_SIZE):
+    # Binary files get UTF-8 bytes, so that no text layer is needed
+    encode = is_binary_output(f)
+    batch = []
+    batch_len = 0
+    for line in lines:
+        batch.append(line)
+        batch_len += len(line)
+        if batch_len >= buffer_size:
+            data = "".join(batch)
+            f.write(data.encode() if encode else data)
+            batch = []
+            batch_len = 0
+    if batch:
+        data = "".join(batch)
+        f.write(data.encode() if encode else data)
+
+def write_fasta(f, seqs, line_width=None):
+    if line_width:
+        lines = (
+            ">" + desc + "\n" + wrap_seq(seq, line_width) + "\n"
+            for desc, seq in seqs)
+    else:
+        lines = (">" + desc + "\n" + seq + "\n" for desc, seq in seqs)
+    write_lines(f, lines)
+
+def wrap_seq(seq, line_width):
+    return "\n".join(
+        seq[i:(i + line_width)] for i in range(0, len(seq), line_width))
+
+def write_tsv(f, rows):
+    write_lines(f, tsv_lines(rows))
+
+def tsv_lines(rows):
+    # One %-format for the whole row is about twice as fast as calling
+    # str() on each value and joining them
+    num_fields = None
+    for row in rows:
+        if len(row) != num_fields:
+            num_fields = len(row)
+            linefmt = "\t".join(["%s"] * num_fields) + "\n"
+        yield linefmt % tuple(row)
+
+def write_matrix(f, row_names, rows, valfmt="{0}"):
+    header = "\t".join([""] + row_names) + "\n"
+    lines = (
+        "\t".join([row_name] + [valfmt.format(val) for val in row]) + "\n"
+        for row_name, row in zip(row_names, rows))
+    write_lines(f, itertools.chain([header], lines))
+
+def write_phylip(f, row_names, rows, valfmt="{0}"):
+    # Relaxed PHYLIP format: names are separated from the values by a
+    # space, rather than padded to 10 characters
+    header = "{0}\n".format(len(rows))
+    lines = (
+        " ".join([row_name] + [valfmt.format(val) for val in row]) + "\n"
+        for row_name, row in zip(row_names, rows))
+    write_lines(f, itertools.chain([header], lines))
 
 def parse_column_idxs(f):
     for line in f:
@@ -44,6 +285,41 @@ def parse_regions(f):
         end_pos = int(toks[2])
         yield seq_id, start_pos, end_pos
 
+def parse_bed(f):
+    # BED positions start from zero and the end is not included. We
+    # convert them to the one-based, inclusive positions used elsewhere.
+    for line in f:
+        line = line.rstrip("\r\n")
+        if is_header_line(line, ("track", "browser")):
+            continue
+        toks = line.split("\t")
+        seq_id = toks[0].strip()
+        start_pos = int(toks[1]) + 1
+        end_pos = int(toks[2])
+        strand = toks[5].strip() if len(toks) > 5 else "+"
+        yield seq_id, start_pos, end_pos, strand
+
+def parse_gff(f):
+    for line in f:
+        line = line.rstrip("\r\n")
+        if line.startswith("##FASTA"):
+            # Sequences may follow the features in GFF3 files
+            break
+        if is_header_line(line):
+            continue
+        toks = line.split("\t")
+        seq_id = toks[0]
+        start_pos = int(toks[3])
+        end_pos = int(toks[4])
+        strand = toks[6]
+        yield seq_id, start_pos, end_pos, strand
+
+def is_header_line(line, keywords=()):
+    line = line.strip()
+    if line.startswith("#") or (line == ""):
+        return True
+    return line.split(maxsplit=1)[0] in keywords
+
 def parse_seq_ids(f):
     for line in f:
         line = line.strip()
@@ -52,6 +328,15 @@ def parse_seq_ids(f):
         seq_id = line.split()[0]
         yield seq_id
 
+def parse_patterns(f):
+    # Whitespace and "#" may be part of a pattern, so only empty lines
+    # are skipped.
+    for line in f:
+        line = line.rstrip("\r\n")
+        if line == "":
+            continue
+        yield line
+
 def parse_new_ids(f):
     for line in f:
         line = line.strip()
@@ -0,0 +1,153 @@
+import array
+import collections
+import heapq
+import itertools
+import os.path
+import re
+import tempfile
+
+# Each base is written as a base-4 digit, and anything else as "x"
+BASE_DIGITS = bytes(
+    b"0123"[b"ACGT".index(x)] if x in b"ACGT" else ord("x")
+    for x in bytes(range(256)).upper())
+COMPLEMENT_DIGITS = bytes.maketrans(b"0123", b"3210")
+
+# K-mer codes are decoded six bases (12 bits) at a time
+CHUNK_BASES = ["".join(x) for x in itertools.product("ACGT", repeat=6)]
+
+# Up to this k, counts are kept in an array indexed by k-mer code
+ARRAY_MAX_K = 11
+
+# Greatest number of spilled runs of counts that are merged at once
+MERGE_WIDTH = 64
+
+# K-mers are taken from windows of this many bases at a time, so that
+# memory use does not grow with the length of the sequence
+KMER_WINDOW = 1 << 16
+
+def kmer_codes(seq, k, canonical=False, window=KMER_WINDOW):
+    return itertools.chain.from_iterable(
+        kmer_code_blocks(seq, k, canonical, window))
+
+def kmer_code_blocks(seq, k, canonical=False, window=KMER_WINDOW):
+    # K-mers are encoded with two bits per base. K-mers containing
+    # anything other than A, C, G, or T are skipped. The codes are
+    # yielded in blocks, one for each window of the sequence.
+    digits = seq.encode("ascii", "replace").translate(BASE_DIGITS)
+    for segment in base_segments(digits, k):
+        num_kmers = len(segment) - k + 1
+        for start in range(0, num_kmers, window):
+            block = segment[start:(start + window + k - 1)]
+            block_kmers = len(block) - k + 1
+            kmers = [block[i:(i + k)] for i in range(block_kmers)]
+            codes = map(int, kmers, itertools.repeat(4))
+            if canonical:
+                rc = block.translate(COMPLEMENT_DIGITS)[::-1]
+                rc_kmers = [rc[i:(i + k)] for i in range(block_kmers)]
+                rc_codes = map(int, reversed(rc_kmers), itertools.repeat(4))
+                codes = map(min, codes, rc_codes)
+            yield codes
+
+def base_segments(digits, k):
+    segment_regex = SEGMENT_REGEXES.get(k)
+    if segment_regex is None:
+        segment_regex = re.compile(b"[0-3]{%d,}" % k)
+        SEGMENT_REGEXES[k] = segment_regex
+    for m in segment_regex.finditer(digits):
+        yield m.group()
+
+SEGMENT_REGEXES = {}
+
+def kmer_decoder(k):
+    num_chunks = (k + 5) // 6
+    shifts = [12 * i for i in reversed(range(num_chunks))]
+    pad = num_chunks * 6 - k
+    def decode(code):
+        return "".join([CHUNK_BASES[(code >> s) & 4095] for s in shifts])[pad:]
+    return decode
+
+def decode_kmer(code, k):
+    return kmer_decoder(k)(code)
+
+def count_kmers(seqs, k=8, canonical=False, max_kmers=None):
+    # Yields each k-mer and its count, in sorted order. If max_kmers is
+    # given, counts are written to disk whenever more than max_kmers
+    # distinct k-mers are held in memory, and merged at the end. Up to
+    # KMER_WINDOW more k-mers may be held before the counts are checked.
+    decode = kmer_decoder(k)
+    if (max_kmers is None) and (k <= ARRAY_MAX_K):
+        counts = count_kmers_array(seqs, k, canonical)
+        for code in itertools.compress(range(len(counts)), counts):
+            yield decode(code), counts[code]
+        return
+    with tempfile.TemporaryDirectory() as spill_dir:
+        runs = []
+        counts = collections.Counter()
+        for desc, seq in seqs:
+            # Counts are checked after each window, so a long sequence
+            # can be spilled before it has all been counted
+            for codes in kmer_code_blocks(seq, k, canonical):
+                counts.update(codes)
+                if (max_kmers is not None) and (len(counts) > max_kmers):
+                    runs.append(spill_counts(counts, spill_dir, len(runs)))
+                    counts = collections.Counter()
+        if not runs:
+            for code in sorted(counts):
+                yield decode(code), counts[code]
+            return
+        runs.append(spill_counts(counts, spill_dir, len(runs)))
+        # Runs are merged in rounds, to keep the number of open files
+        # under MERGE_WIDTH
+        merge_round = 0
+        while len(runs) > MERGE_WIDTH:
+            merge_round += 1
+            runs = [
+                merge_runs(
+                    runs[i:(i + MERGE_WIDTH)], spill_dir,
+                    "merge{0}_{1}.tsv".format(merge_round, i))
+                for i in range(0, len(runs), MERGE_WIDTH)]
+        run_files = [open(fp) for fp in runs]
+        try:
+            for code, count in merged_counts(run_files):
+                yield decode(code), count
+        finally:
+            for f in run_files:
+                f.close()
+
+def count_kmers_array(seqs, k, canonical=False):
+    counts = array.array("L", bytes(array.array("L").itemsize * 4 ** k))
+    for desc, seq in seqs:
+        for code in kmer_codes(seq, k, canonical):
+            counts[code] += 1
+    return counts
+
+def spill_counts(counts, spill_dir, run_num):
+    fp = os.path.join(spill_dir, "run{0}.tsv".format(run_num))
+    with open(fp, "w") as f:
+        for code in sorted(counts):
+            f.write("{0}\t{1}\n".format(code, counts[code]))
+    return fp
+
+def merged_counts(run_files):
+    merged = heapq.merge(*(read_counts(f) for f in run_files))
+    for code, group in itertools.groupby(merged, key=lambda x: x[0]):
+        yield code, sum(count for _, count in group)
+
+def merge_runs(runs, spill_dir, filename):
+    fp = os.path.join(spill_dir, filename)
+    run_files = [open(run_fp) for run_fp in runs]
+    try:
+        with open(fp, "w") as f:
+            for code, count in merged_counts(run_files):
+                f.write("{0}\t{1}\n".format(code, count))
+    finally:
+        for run_file in run_files:
+            run_file.close()
+    for run_fp in runs:
+        os.remove(run_fp)
+    return fp
+
+def read_counts(f):
+    for line in f:
+        code, count = line.split("\t")
+        yield int(code), int(count)
@@ -1,6 +1,7 @@
 import collections
 import math
 import itertools
+import operator
 
 from .seqs import get_seq_id
 
@@ -16,10 +17,8 @@ class MSA:
             assert len(col) == len_descs
 
     def filter_by_index(self, idxs, remove=False):
-        idxs = set(idxs)
-        if remove:
-            idxs = [idx for idx in range1(len(self.cols)) if idx not in idxs]
-        self.cols = [col for idx, col in enumerate1(self.cols) if idx in idxs]
+        positions = column_positions(idxs, len(self.cols), remove)
+        self.cols = [self.cols[pos] for pos in positions]
         return self
 
     column_stats_header = [
@@ -31,31 +30,9 @@ class MSA:
 
     def column_stats(self):
         for col_position, col in enumerate1(self.cols):
-            len_col = len(col)
-            ngaps = col.count("-")
-            nvals = len_col - ngaps
-            if nvals == 0:
-                yield {
-                    "column_position": col_position,
-                    "number_of_values": 0,
-                    "gaps_proportion": 1.0,
-                    "entropy": 0.0,
-                    "consensus_value": "-",
-                    "consensus_proportion": 1.0
-                }
-                continue
             ctr = collections.Counter(col)
             del ctr["-"]
-            cts = ctr.values()
-            consensus_val, consensus_cts = ctr.most_common(1)[0]
-            yield {
-                "column_position": col_position,
-                "number_of_values": nvals,
-                "gaps_proportion": ngaps / len_col,
-                "entropy": shannon(cts),
-                "consensus_value": consensus_val,
-                "consensus_proportion": consensus_cts / nvals,
-            }
+            yield column_stats(col_position, ctr, len(col))
 
     @property
     def seqs(self):
@@ -71,6 +48,223 @@ class MSA:
         ]
         return cls(descs, cols)
 
+GAP = ord("-")
+
+# Number of bytes from each batch of rows that ColumnCounter holds in memory
+COUNTER_BATCH_SIZE = 1 << 25
+
+class ByteMSA:
+    # Alignment stored as one row-major block of bytes. Each column can
+    # be taken with a single strided slice, and its symbols counted with
+    # bytes.count(), so no Python code runs per character.
+    def __init__(self, descs, data, width):
+        self.descs = descs
+        self.data = data
+        self.width = width
+        assert len(data) == len(descs) * width
+
+    column_stats_header = MSA.column_stats_header
+
+    column_stats_fmt = MSA.column_stats_fmt
+
+    def column(self, idx):
+        return self.data[idx::self.width]
+
+    def filter_by_index(self, idxs, remove=False):
+        # Each column is copied into place with one strided slice
+        # assignment, so rows are never split into characters.
+        positions = column_positions(idxs, self.width, remove)
+        width = len(positions)
+        data = bytearray(len(self.descs) * width)
+        for new_pos, pos in enumerate(positions):
+            data[new_pos::width] = self.data[pos::self.width]
+        self.data = bytes(data)
+        self.width = width
+        return self
+
+    def column_counts(self):
+        alphabet = b""
+        for idx in range(self.width):
+            col = self.column(idx)
+            new_symbols = col.translate(None, alphabet)
+            if new_symbols:
+                alphabet += bytes(sorted(set(new_symbols)))
+            yield count_symbols(col, alphabet)
+
+    def column_stats(self):
+        len_col = len(self.descs)
+        for col_position, counts in enumerate1(self.column_counts()):
+            yield column_stats(col_position, counts, len_col)
+
+    @property
+    def seqs(self):
+        for n, desc in enumerate(self.descs):
+            row = self.data[(n * self.width):((n + 1) * self.width)]
+            yield desc, row.decode("ascii")
+
+    @classmethod
+    def from_seqs(cls, seqs):
+        # Each symbol must be one byte, so alignments with other symbols
+        # are stored one string per column instead
+        seqs = list(seqs)
+        if not all(seq.isascii() for desc, seq in seqs):
+            return MSA.from_seqs(seqs)
+        descs, seqvals = list(zip(*seqs))
+        width = max(len(seqval) for seqval in seqvals)
+        data = b"".join(
+            seqval.encode("ascii").ljust(width, b"-") for seqval in seqvals)
+        return cls(descs, data, width)
+
+class ColumnCounter:
+    # Accumulates the symbol counts for each column as rows are added.
+    # Rows are counted in batches, so only one batch of the alignment is
+    # held in memory at a time. Rows shorter than the alignment are
+    # treated as if they were padded with gaps, as in MSA.from_seqs().
+    def __init__(self, batch_size=COUNTER_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.batch = []
+        self.batch_len = 0
+        self.nrows = 0
+        self.alphabet = b""
+        self.counts = []
+
+    column_stats_header = MSA.column_stats_header
+
+    column_stats_fmt = MSA.column_stats_fmt
+
+    def add(self, seq):
+        self.batch.append(seq)
+        self.batch_len += len(seq)
+        if self.batch_len >= self.batch_size:
+            self._count_batch()
+
+    def add_seqs(self, seqs):
+        for desc, seq in seqs:
+            self.add(seq)
+        return self
+
+    def _count_batch(self):
+        if not self.batch:
+            return
+        width = max(len(row) for row in self.batch)
+        while len(self.counts) < width:
+            self.counts.append({})
+        if all(row.isascii() for row in self.batch):
+            self._count_ascii_batch(width)
+        else:
+            # Symbols may be more than one byte, so the columns are
+            # counted as strings
+            cols = itertools.zip_longest(*self.batch, fillvalue="-")
+            for col_counts, col in zip(self.counts, cols):
+                ctr = collections.Counter(col)
+                del ctr["-"]
+                for x, ct in ctr.items():
+                    col_counts[x] = col_counts.get(x, 0) + ct
+        self.nrows += len(self.batch)
+        self.batch = []
+        self.batch_len = 0
+
+    def _count_ascii_batch(self, width):
+        data = b"".join(
+            row.encode("ascii").ljust(width, b"-") for row in self.batch)
+        for idx in range(width):
+            col = data[idx::width]
+            new_symbols = col.translate(None, self.alphabet)
+            if new_symbols:
+                self.alphabet += bytes(sorted(set(new_symbols)))
+            # Dicts keep their order, so symbols first seen in this batch
+            # go after those that were seen before.
+            col_counts = self.counts[idx]
+            for x, ct in count_symbols(col, self.alphabet).items():
+                col_counts[x] = col_counts.get(x, 0) + ct
+
+    def column_stats(self):
+        self._count_batch()
+        for col_position, counts in enumerate1(self.counts):
+            yield column_stats(col_position, counts, self.nrows)
+
+    @classmethod
+    def from_seqs(cls, seqs):
+        return cls().add_seqs(seqs)
+
+def column_positions(idxs, width, remove=False):
+    # Converts column numbers, starting from 1, to the positions of the
+    # columns to keep, in order. Numbers outside the alignment are
+    # ignored.
+    idxs = set(idxs)
+    return [pos for pos in range(width) if ((pos + 1) in idxs) != remove]
+
+def select_columns(seqs, idxs, remove=False):
+    msa = ByteMSA.from_seqs(seqs)
+    return msa.filter_by_index(idxs, remove=remove).seqs
+
+def stream_select_columns(seqs, idxs, remove=False):
+    # Yields each record with the selected columns as soon as it is
+    # read. The first row sets the width of the alignment. Shorter rows
+    # are padded with gaps, as in from_seqs(), but longer rows would
+    # change the width after we've started writing, so they are an
+    # error.
+    idxs = set(idxs)
+    gather = None
+    for desc, seq in seqs:
+        if gather is None:
+            width = len(seq)
+            runs = column_runs(column_positions(idxs, width, remove))
+            # The empty slice makes sure that we always get a tuple
+            gather = operator.itemgetter(*runs, slice(0, 0))
+        if len(seq) < width:
+            seq = seq.ljust(width, "-")
+        elif len(seq) > width:
+            raise ValueError(
+                "Sequence {0} is longer than the first sequence ({1} > {2}); "
+                "run without streaming to pad all sequences to the same "
+                "length".format(get_seq_id(desc), len(seq), width))
+        yield desc, "".join(gather(seq))
+
+def column_runs(positions):
+    # Merges consecutive positions into slices
+    runs = []
+    for pos in positions:
+        if runs and (runs[-1][1] == pos):
+            runs[-1][1] = pos + 1
+        else:
+            runs.append([pos, pos + 1])
+    return [slice(start, stop) for start, stop in runs]
+
+def count_symbols(col, alphabet):
+    # Returns the number of each symbol other than a gap, in the order
+    # that symbols first appear in the column. This is the order used
+    # by collections.Counter, so results are identical.
+    cts = [(col.find(x), x, col.count(x)) for x in alphabet if x != GAP]
+    cts = [(pos, x, ct) for pos, x, ct in cts if ct > 0]
+    cts.sort()
+    return {chr(x): ct for pos, x, ct in cts}
+
+def column_stats(col_position, cts, len_col):
+    # Counts of each symbol, not including gaps
+    nvals = sum(cts.values())
+    ngaps = len_col - nvals
+    if nvals == 0:
+        return {
+            "column_position": col_position,
+            "number_of_values": 0,
+            "gaps_proportion": 1.0,
+            "entropy": 0.0,
+            "consensus_value": "-",
+            "consensus_proportion": 1.0
+        }
+    # Ties go to the value that appears first in the column
+    consensus_val = max(cts, key=cts.get)
+    consensus_cts = cts[consensus_val]
+    return {
+        "column_position": col_position,
+        "number_of_values": nvals,
+        "gaps_proportion": ngaps / len_col,
+        "entropy": shannon(cts.values()),
+        "consensus_value": consensus_val,
+        "consensus_proportion": consensus_cts / nvals,
+    }
+
 def shannon(cts):
     cts = [c for c in cts if c > 0]
     # If we use the formula when h=0, python will return -0.0
@@ -81,10 +275,6 @@ def shannon(cts):
     h = -sum(p * math.log(p) for p in props)
     return h
 
-def range1(stop):
-    for n in range(stop):
-        yield (n + 1)
-
 def enumerate1(xs):
     for n, x in enumerate(xs):
         yield (n + 1), x
@@ -108,7 +298,65 @@ def mismatches(seq1, seq2, include_gaps=False, percent=False):
         return mm
 
 def pairwise_mismatches(seqs, include_gaps=False, percent=False):
-    seqs = ((get_seq_id(desc), seq) for (desc, seq) in seqs)
+    seqs = [(get_seq_id(desc), seq) for (desc, seq) in seqs]
+    if all(seq.isascii() for seq_id, seq in seqs):
+        seqs = [(seq_id, Bitsets(seq)) for seq_id, seq in seqs]
+        mismatches_func = bitset_mismatches
+    else:
+        mismatches_func = mismatches
     for (id1, seq1), (id2, seq2) in itertools.combinations(seqs, 2):
-        mm = mismatches(seq1, seq2, include_gaps=include_gaps, percent=percent)
+        mm = mismatches_func(
+            seq1, seq2, include_gaps=include_gaps, percent=percent)
         yield(id1, id2, mm)
+
+def mismatch_matrix(seqs, include_gaps=False, percent=False):
+    seqs = list(seqs)
+    seq_ids = [get_seq_id(desc) for desc, seq in seqs]
+    diagonal = 0.0 if percent else 0
+    rows = [[diagonal] * len(seqs) for seq in seqs]
+    vals = pairwise_mismatches(seqs, include_gaps=include_gaps, percent=percent)
+    pairs = itertools.combinations(range(len(seqs)), 2)
+    for (i, j), (id1, id2, mm) in zip(pairs, vals):
+        rows[i][j] = mm
+        rows[j][i] = mm
+    return seq_ids, rows
+
+# Translation tables that map one byte value to "1" and all others to "0"
+BITSET_TABLES = [
+    b"0" * x + b"1" + b"0" * (255 - x) for x in range(256)
+]
+
+class Bitsets:
+    # For each symbol in an aligned sequence, an integer with bit i set
+    # where the symbol is found at position i. Python's integers let us
+    # compare whole sequences with & and int.bit_count().
+    def __init__(self, seq):
+        data = seq.encode("ascii")
+        # Reverse, so that position 0 ends up in the lowest bit
+        reversed_data = data[::-1]
+        self.length = len(data)
+        self.symbols = {
+            x: int(reversed_data.translate(BITSET_TABLES[x]), 2)
+            for x in set(data)
+        }
+        all_positions = (1 << self.length) - 1
+        self.non_gaps = all_positions ^ self.symbols.get(GAP, 0)
+
+def bitset_mismatches(bits1, bits2, include_gaps=False, percent=False):
+    # Only positions in both sequences are compared, as with zip()
+    matches = 0
+    for x, positions in bits1.symbols.items():
+        if (x == GAP) and (not include_gaps):
+            continue
+        other_positions = bits2.symbols.get(x)
+        if other_positions is not None:
+            matches += (positions & other_positions).bit_count()
+    if include_gaps:
+        tot = min(bits1.length, bits2.length)
+    else:
+        tot = (bits1.non_gaps & bits2.non_gaps).bit_count()
+    mm = tot - matches
+    if percent:
+        return 100 * mm / tot
+    else:
+        return mm
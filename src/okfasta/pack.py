@@ -0,0 +1,312 @@
+import array
+import bisect
+import collections
+import functools
+import mmap
+import re
+import shutil
+import struct
+import tempfile
+
+from .arrays import read_array, write_array
+
+PACK_MAGIC = b"OKPACK1\n"
+
+# Found at the end of a packed file: the number of records, exception
+# runs, and lowercase runs, and the position of the tables
+PACK_TRAILER = struct.Struct("<4Q8s")
+
+# Arrays of 64-bit integers in the tables, in the order written
+PACK_ARRAYS = [
+    "payload_offsets", "desc_offsets", "seq_lengths",
+    "exception_index", "exception_starts", "exception_lengths",
+    "mask_index", "mask_starts", "mask_lengths",
+]
+
+# Each base is stored in two bits, with four bases to a byte. Other
+# symbols are stored as A, then replaced from the exception runs.
+PACK_CODES = bytes(
+    b"0123"[b"ACGT".index(x)] if x in b"ACGT" else ord("0")
+    for x in range(256))
+
+# Hex digits of the packed bytes give two bases each: the first from
+# the high two bits, and the second from the low two bits
+HEX_DIGITS = b"0123456789abcdef"
+HIGH_BASES = bytes.maketrans(HEX_DIGITS, b"AAAACCCCGGGGTTTT")
+LOW_BASES = bytes.maketrans(HEX_DIGITS, b"ACGTACGTACGTACGT")
+
+EXCEPTION_RUN = re.compile(rb"([^ACGT])\1*")
+LOWERCASE_RUN = re.compile(rb"[a-z]+")
+
+# Size of the blocks of bases, and the greatest number of records,
+# unpacked at once when reading all records
+PACK_BLOCK_SIZE = 1 << 20
+PACK_BLOCK_RECORDS = 1 << 15
+
+PackEntry = collections.namedtuple("PackEntry", ["name", "length", "index"])
+
+def pack_array_sizes(n, m, k):
+    # Number of items in each of PACK_ARRAYS, given the number of
+    # records, exception runs, and lowercase runs
+    return [n + 1, n + 1, n, n + 1, m, m, n + 1, k, k]
+
+def pack_seq(seq):
+    # Returns the packed bases, the runs of symbols other than A, C, G,
+    # or T, and the runs of lowercase letters.
+    data = seq.encode()
+    if not data.isascii():
+        raise ValueError("Only ASCII sequences can be packed")
+    upper = data.upper()
+    exceptions = []
+    if upper.translate(None, b"ACGT"):
+        for m in EXCEPTION_RUN.finditer(upper):
+            exceptions.append((m.start(), m.end() - m.start(), upper[m.start()]))
+    masks = []
+    if upper != data:
+        for m in LOWERCASE_RUN.finditer(data):
+            masks.append((m.start(), m.end() - m.start()))
+    return pack_bases(upper), exceptions, masks
+
+def pack_bases(data):
+    if not data:
+        return b""
+    digits = data.translate(PACK_CODES)
+    digits += b"0" * (-len(digits) % 4)
+    # Conversion from a power-of-two base takes linear time
+    return int(digits, 4).to_bytes(len(digits) // 4, "big")
+
+def unpack_bases(payload):
+    digits = payload.hex().encode()
+    bases = bytearray(2 * len(digits))
+    bases[0::2] = digits.translate(HIGH_BASES)
+    bases[1::2] = digits.translate(LOW_BASES)
+    return bases
+
+def write_pack(f, seqs):
+    # The packed bases of each record are written as they are read,
+    # followed by the descriptions, one per line, and the tables that
+    # locate each record. The descriptions are held in a temporary file
+    # until the bases are written, so the output does not need to be
+    # seekable.
+    pos = f.write(PACK_MAGIC)
+    desc_pos = 0
+    tables = {name: array.array("Q") for name in PACK_ARRAYS}
+    tables["payload_offsets"].append(pos)
+    tables["desc_offsets"].append(desc_pos)
+    tables["exception_index"].append(0)
+    tables["mask_index"].append(0)
+    exception_symbols = bytearray()
+    with tempfile.TemporaryFile() as desc_file:
+        for desc, seq in seqs:
+            try:
+                payload, exceptions, masks = pack_seq(seq)
+            except ValueError as e:
+                raise ValueError(
+                    "Cannot pack {0}: {1}".format(desc, e)) from None
+            pos += f.write(payload)
+            tables["payload_offsets"].append(pos)
+            desc_pos += desc_file.write(desc.encode() + b"\n")
+            tables["desc_offsets"].append(desc_pos)
+            tables["seq_lengths"].append(len(seq))
+            for start, length, symbol in exceptions:
+                tables["exception_starts"].append(start)
+                tables["exception_lengths"].append(length)
+                exception_symbols.append(symbol)
+            tables["exception_index"].append(len(exception_symbols))
+            for start, length in masks:
+                tables["mask_starts"].append(start)
+                tables["mask_lengths"].append(length)
+            tables["mask_index"].append(len(tables["mask_starts"]))
+        desc_file.seek(0)
+        shutil.copyfileobj(desc_file, f)
+    pos += desc_pos
+    # Keep the tables aligned to 8 bytes
+    pos += f.write(b"\0" * (-pos % 8))
+    for name in PACK_ARRAYS:
+        write_array(f, tables[name])
+    f.write(exception_symbols)
+    f.write(PACK_TRAILER.pack(
+        len(tables["seq_lengths"]), len(exception_symbols),
+        len(tables["mask_starts"]), pos, PACK_MAGIC))
+
+class PackedFasta:
+    # Records of a file written by write_pack(). Sequences are unpacked
+    # from the file as they are needed, so the file can be used through
+    # an mmap. For indexed access, this class has the same methods as
+    # IndexedFasta.
+    def __init__(self, data):
+        if len(data) < len(PACK_MAGIC) + PACK_TRAILER.size:
+            raise ValueError("Not a packed FASTA file")
+        n, m, k, start, magic = PACK_TRAILER.unpack_from(
+            data, len(data) - PACK_TRAILER.size)
+        if (magic != PACK_MAGIC) or (data[:len(PACK_MAGIC)] != PACK_MAGIC):
+            raise ValueError("Not a packed FASTA file")
+        self.data = data
+        view = memoryview(data)
+        for name, size in zip(PACK_ARRAYS, pack_array_sizes(n, m, k)):
+            a, start = read_array(view, "Q", start, size)
+            setattr(self, name, a)
+        self.exception_symbols = bytes(view[start:(start + m)])
+
+    def __len__(self):
+        return len(self.seq_lengths)
+
+    def __iter__(self):
+        return self.records(decode=True)
+
+    def raw_records(self):
+        return self.records(decode=False)
+
+    def records(self, decode=True):
+        for descs, i, j in self.desc_blocks():
+            block_start = self.payload_offsets[i]
+            block = unpack_bases(
+                self.data[block_start:self.payload_offsets[j]])
+            seqs = block.decode() if decode else bytes(block)
+            has_runs = (
+                (self.exception_index[i] != self.exception_index[j]) or
+                (self.mask_index[i] != self.mask_index[j]))
+            records = zip(
+                range(i, j), descs, self.payload_offsets[i:j].tolist(),
+                self.seq_lengths[i:j].tolist())
+            for k, desc, payload_start, length in records:
+                start = 4 * (payload_start - block_start)
+                if has_runs and self.has_runs(k):
+                    seq = block[start:(start + length)]
+                    self.apply_runs(seq, k, 0, length)
+                    yield desc, seq.decode() if decode else bytes(seq)
+                else:
+                    yield desc, seqs[start:(start + length)]
+
+    def lengths(self):
+        for descs, i, j in self.desc_blocks():
+            yield from zip(descs, self.seq_lengths[i:j].tolist())
+
+    def desc_blocks(self):
+        # Yields the descriptions of records i to j, for blocks of
+        # records with about PACK_BLOCK_SIZE bytes of packed bases
+        n = len(self)
+        descs_start = self.payload_offsets[n]
+        i = 0
+        while i < n:
+            j = bisect.bisect_right(
+                self.payload_offsets, self.payload_offsets[i] + PACK_BLOCK_SIZE,
+                i + 1, n)
+            j = min(j, i + PACK_BLOCK_RECORDS)
+            start = descs_start + self.desc_offsets[i]
+            end = descs_start + self.desc_offsets[j]
+            descs = str(self.data[start:(end - 1)], "utf-8").split("\n")
+            yield descs, i, j
+            i = j
+
+    def has_runs(self, i):
+        return (
+            (self.exception_index[i] != self.exception_index[i + 1]) or
+            (self.mask_index[i] != self.mask_index[i + 1]))
+
+    def record_desc(self, i):
+        start = self.payload_offsets[len(self)] + self.desc_offsets[i]
+        end = self.payload_offsets[len(self)] + self.desc_offsets[i + 1]
+        return str(self.data[start:(end - 1)], "utf-8")
+
+    def bases(self, i, start=0, stop=None):
+        if stop is None:
+            stop = self.seq_lengths[i]
+        offset = self.payload_offsets[i]
+        first_byte = start // 4
+        last_byte = (stop + 3) // 4
+        bases = unpack_bases(
+            self.data[(offset + first_byte):(offset + last_byte)])
+        skip = start - 4 * first_byte
+        if skip or (len(bases) > stop - start):
+            bases = bases[skip:(skip + stop - start)]
+        self.apply_runs(bases, i, start, stop)
+        return bytes(bases)
+
+    def apply_runs(self, bases, i, start, stop):
+        # Restores the exception and lowercase runs of record i in the
+        # bases from position start to stop
+        runs = overlapping_runs(
+            self.exception_starts, self.exception_lengths,
+            self.exception_index[i], self.exception_index[i + 1],
+            start, stop)
+        for j, run_start, run_end in runs:
+            symbol = self.exception_symbols[j:(j + 1)]
+            bases[(run_start - start):(run_end - start)] = (
+                symbol * (run_end - run_start))
+        runs = overlapping_runs(
+            self.mask_starts, self.mask_lengths,
+            self.mask_index[i], self.mask_index[i + 1], start, stop)
+        for j, run_start, run_end in runs:
+            run = slice(run_start - start, run_end - start)
+            bases[run] = bases[run].lower()
+
+    @functools.cached_property
+    def entries(self):
+        entries = []
+        for i in range(len(self)):
+            toks = self.record_desc(i).split(maxsplit=1)
+            name = toks[0] if toks else ""
+            entries.append(PackEntry(name, self.seq_lengths[i], i))
+        return entries
+
+    @functools.cached_property
+    def entries_by_name(self):
+        entries_by_name = {}
+        for entry in self.entries:
+            entries_by_name.setdefault(entry.name, entry)
+        return entries_by_name
+
+    def __contains__(self, name):
+        return name in self.entries_by_name
+
+    def get_desc(self, entry):
+        return self.record_desc(entry.index)
+
+    def get_seq(self, entry, start_idx=None, end_idx=None):
+        return self.get_seq_bytes(entry, start_idx, end_idx).decode()
+
+    def get_seq_bytes(self, entry, start_idx=None, end_idx=None):
+        start, stop, _ = slice(start_idx, end_idx).indices(entry.length)
+        if stop <= start:
+            return b""
+        return self.bases(entry.index, start, stop)
+
+    def fetch(self, name):
+        entry = self.entries_by_name[name]
+        return self.get_desc(entry), self.get_seq(entry)
+
+def overlapping_runs(starts, lengths, lo, hi, start, stop):
+    # Yields the index of each run in starts[lo:hi] that overlaps the
+    # positions from start to stop, with the overlapping positions.
+    if lo == hi:
+        return
+    j = max(bisect.bisect_right(starts, start, lo, hi) - 1, lo)
+    while (j < hi) and (starts[j] < stop):
+        run_start = max(starts[j], start)
+        run_end = min(starts[j] + lengths[j], stop)
+        if run_start < run_end:
+            yield j, run_start, run_end
+        j += 1
+
+def is_packed_file(f):
+    # Only uncompressed files can be packed files, and those have a
+    # peek() method after decompressed_reader()
+    return hasattr(f, "peek") and f.peek(8)[:8] == PACK_MAGIC
+
+def is_packed_path(fp):
+    with open(fp, "rb") as f:
+        return f.read(len(PACK_MAGIC)) == PACK_MAGIC
+
+def load_packed(f):
+    # Files are used through an mmap where possible. Pipes can't be
+    # mapped, so they are read into memory.
+    try:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        data = f.read()
+    return PackedFasta(data)
+
+def open_packed(fp):
+    with open(fp, "rb") as f:
+        return load_packed(f)
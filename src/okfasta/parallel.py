@@ -0,0 +1,28 @@
+import collections
+import concurrent.futures
+import io
+
+from .io import parse_fasta
+
+def map_chunks(func, chunks, jobs, max_pending=None):
+    # Results are yielded in the same order as the chunks. We keep at
+    # most max_pending chunks in flight, so that memory use does not
+    # grow when the input is read faster than it can be processed.
+    if max_pending is None:
+        max_pending = 2 * jobs
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        pending = collections.deque()
+        for chunk in chunks:
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+            pending.append(executor.submit(func, chunk))
+        while pending:
+            yield pending.popleft().result()
+
+def process_fasta_chunk(stage, write_output, chunk, parser=parse_fasta):
+    # Stages that work on undecoded records can use another parser,
+    # such as parse_fasta_raw.
+    seqs = parser(io.BytesIO(chunk))
+    output = io.BytesIO()
+    write_output(output, stage(seqs))
+    return output.getvalue()
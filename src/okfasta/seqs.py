@@ -1,31 +1,115 @@
 import collections
 import itertools
+import math
+import operator
 import random
 import re
 
-def randomize_seqs(seqs, n):
-    seqs = list(seqs)
-    if n > len(seqs):
-        n = len(seqs)
-    return random.sample(seqs, n)
+from .io import SEQ_WHITESPACE, decode_seq
+
+def randomize_seqs(seqs, n, seed=None):
+    return reservoir_sample(seqs, n, random.Random(seed))
+
+def sample_seqs(seqs, proportion, seed=None):
+    return proportion_sample(seqs, proportion, random.Random(seed))
+
+def reservoir_sample(items, n, rng):
+    # Algorithm L (Li, 1994). Only n items are held in memory, and the
+    # number of items to skip before the next replacement is drawn
+    # directly, so we don't need a random number for each item. Items
+    # are returned in their original order.
+    items = enumerate(items)
+    reservoir = list(itertools.islice(items, n))
+    if len(reservoir) < n or n <= 0:
+        return [item for _, item in reservoir]
+    w = math.exp(math.log(random_open_unit(rng)) / n)
+    while True:
+        skip = geometric_skip(rng, w)
+        item = next(itertools.islice(items, skip, None), None)
+        if item is None:
+            break
+        reservoir[rng.randrange(n)] = item
+        w *= math.exp(math.log(random_open_unit(rng)) / n)
+    reservoir.sort(key=operator.itemgetter(0))
+    return [item for _, item in reservoir]
+
+def proportion_sample(items, proportion, rng):
+    # Each item is selected with the given probability. The gaps
+    # between selected items are drawn directly, as in Algorithm L.
+    items = iter(items)
+    if proportion <= 0:
+        return
+    while True:
+        skip = geometric_skip(rng, proportion)
+        item = next(itertools.islice(items, skip, None), None)
+        if item is None:
+            break
+        yield item
+
+def geometric_skip(rng, p):
+    # Number of failures before the first success, for trials that
+    # succeed with probability p
+    if p >= 1:
+        return 0
+    return int(math.log(random_open_unit(rng)) / math.log1p(-p))
+
+def random_open_unit(rng):
+    # Random number in (0, 1), so that we can take the log
+    while True:
+        x = rng.random()
+        if x > 0:
+            return x
 
 def replace_chars(seqs, replacements):
+    steps = compile_replacements(replacements)
     for desc, seq in seqs:
-        for x, y in replacements:
-            seq = seq.replace(x, y)
+        for step in steps:
+            seq = step(seq)
         yield desc, seq
 
+def compile_replacements(replacements):
+    # Returns a list of functions that give the same result as calling
+    # seq.replace(x, y) for each replacement in order. Consecutive
+    # single-character replacements are merged into one translation
+    # table, so the sequence is copied once for all of them.
+    # Multi-character replacements use str.replace, which was faster
+    # than a combined regex in our benchmarks.
+    groups = []
+    for x, y in replacements:
+        if len(x) != 1:
+            groups.append((x, y))
+        elif groups and isinstance(groups[-1], dict):
+            table = groups[-1]
+            for k in table:
+                table[k] = table[k].replace(x, y)
+            table.setdefault(x, y)
+        else:
+            groups.append({x: y})
+    steps = []
+    for group in groups:
+        if isinstance(group, dict) and len(group) > 1:
+            steps.append(operator.methodcaller(
+                "translate", str.maketrans(group)))
+        elif isinstance(group, dict):
+            steps.append(operator.methodcaller("replace", *group.popitem()))
+        else:
+            steps.append(operator.methodcaller("replace", *group))
+    return steps
+
+SEQ_ID_END = re.compile("\\s")
+
 def replace_seq_ids(seqs, new_seqids):
+    # The sequence ID ends at the first whitespace character, which is
+    # kept with the rest of the description.
+    find_end = SEQ_ID_END.search
     for desc, seq in seqs:
-        toks = re.split("(\\s)", desc, maxsplit=1)
-        old_seq_id = toks[0]
-        new_seq_id = new_seqids.get(old_seq_id)
+        m = find_end(desc)
+        end = len(desc) if m is None else m.start()
+        new_seq_id = new_seqids.get(desc[:end])
         if new_seq_id is None:
             yield (desc, seq)
         else:
-            rest = toks[1:]
-            new_desc = new_seq_id + ''.join(rest)
-            yield (new_desc, seq)
+            yield (new_seq_id + desc[end:], seq)
 
 def replace_desc(seqs, new_descs, remove_old=False):
     for old_desc, seq in seqs:
@@ -41,7 +125,7 @@ def replace_desc(seqs, new_descs, remove_old=False):
         yield desc, seq
 
 def get_seq_id(desc):
-    return desc.split()[0]
+    return desc.split(maxsplit=1)[0]
 
 def get_kmers(seqs, k=8):
     for desc, seq in seqs:
@@ -52,54 +136,352 @@ def get_kmers(seqs, k=8):
         for i in range(n_kmers):
             yield (seq_id, i + 1, seq[i:(i + k)])
 
-def extract_regions(regions, seqs):
-    regions_table = collections.defaultdict(list)
-    for seq_id, start_pos, end_pos in regions:
-        regions_table[seq_id].append((start_pos, end_pos))
-
+def extract_regions(regions, seqs, unmatched=None):
+    # Sequences can be strings, or undecoded bytes from parse_fasta_raw.
+    # For bytes, records without regions are skipped without decoding,
+    # and only the extracted regions are copied out of the record. If a
+    # list is given for unmatched, regions for sequence IDs that were
+    # not found are added to it.
+    regions_table = group_regions(regions)
+    seen_ids = set()
     for desc, seq in seqs:
         seq_id = get_seq_id(desc)
-        for start_pos, end_pos in regions_table[seq_id]:
-            extract_id = "{0}__{1}_{2}".format(seq_id, start_pos, end_pos)
-            start_idx = start_pos - 1
-            end_idx = end_pos
-            extract_seq = seq[start_idx:end_idx]
-            yield extract_id, extract_seq
-
-def filter_seq_ids(seqs, seq_ids, remove=False):
+        seq_regions = regions_table.get(seq_id)
+        if seq_regions is None:
+            continue
+        seen_ids.add(seq_id)
+        if isinstance(seq, bytes):
+            seq = seq.translate(None, SEQ_WHITESPACE)
+            seq = memoryview(seq) if seq.isascii() else seq.decode()
+        yield from extract_seq_regions(seq_id, seq, seq_regions)
+    if unmatched is not None:
+        for seq_id, seq_regions in regions_table.items():
+            if seq_id not in seen_ids:
+                unmatched.extend((seq_id,) + r for r in seq_regions)
+
+def group_regions(regions):
+    # Regions are grouped by sequence ID and sorted by position. The
+    # strand is "+" unless given.
+    regions_table = collections.defaultdict(list)
+    for seq_id, start_pos, end_pos, *strand in regions:
+        strand = strand[0] if strand else "+"
+        regions_table[seq_id].append((start_pos, end_pos, strand))
+    for seq_regions in regions_table.values():
+        seq_regions.sort()
+    return dict(regions_table)
+
+def extract_seq_regions(seq_id, seq, seq_regions):
+    is_buffer = isinstance(seq, memoryview)
+    id_prefix = seq_id + "__"
+    for start_pos, end_pos, strand in seq_regions:
+        extract_id = "{0}{1}_{2}".format(id_prefix, start_pos, end_pos)
+        start_idx = start_pos - 1
+        end_idx = end_pos
+        extract_seq = seq[start_idx:end_idx]
+        if is_buffer:
+            extract_seq = str(extract_seq, "ascii")
+        if strand == "-":
+            extract_id += "_rc"
+            extract_seq = reverse_complement(extract_seq)
+        yield extract_id, extract_seq
+
+def filter_seq_ids(seqs, seq_ids, remove=False, stop_early=False, found=None):
+    # If stop_early is True, only the first record for each ID is kept,
+    # and we stop reading as soon as every ID has been kept. If a set
+    # is given for found, the IDs that were seen are added.
+    seq_ids = set(seq_ids)
+    if found is None:
+        found = set()
     for desc, seq in seqs:
         seq_id = get_seq_id(desc)
-        if remove:
-            if seq_id not in seq_ids:
-                yield desc, seq
-        else:
-            if seq_id in seq_ids:
+        if seq_id in seq_ids:
+            if stop_early and (seq_id in found) and not remove:
+                continue
+            found.add(seq_id)
+            if not remove:
                 yield desc, seq
+                if stop_early and len(found) == len(seq_ids):
+                    return
+        elif remove:
+            yield desc, seq
 
 def get_seq_lengths(seqs):
     for desc, seq in seqs:
         seq_id = get_seq_id(desc)
         yield seq_id, len(seq)
 
+def seq_id_lengths(desc_lengths):
+    # For lengths from parse_fasta_lengths
+    for desc, length in desc_lengths:
+        yield get_seq_id(desc), length
+
+def count_lengths(desc_lengths):
+    return collections.Counter(length for desc, length in desc_lengths)
+
+def length_summary(length_counts, fractions=(0.5, 0.9)):
+    # Nx is the length L such that sequences of length L or longer
+    # contain x% of the total. Each length is stored once, with its
+    # count, so we don't need to keep every sequence length.
+    total = sum(length * n for length, n in length_counts.items())
+    lengths = sorted(length_counts, reverse=True)
+    rows = [
+        ("count", sum(length_counts.values())),
+        ("total", total),
+        ("min", lengths[-1] if lengths else 0),
+        ("max", lengths[0] if lengths else 0),
+    ]
+    for fraction in fractions:
+        cumulative = 0
+        nx = 0
+        for length in lengths:
+            cumulative += length * length_counts[length]
+            if cumulative >= fraction * total:
+                nx = length
+                break
+        rows.append(("N{0:g}".format(fraction * 100), nx))
+    return rows
+
+def length_histogram(length_counts, bin_size):
+    bin_counts = collections.Counter()
+    for length, n in length_counts.items():
+        bin_counts[length // bin_size] += n
+    for b in sorted(bin_counts):
+        bin_start = b * bin_size
+        bin_end = bin_start + bin_size - 1
+        yield "{0}-{1}".format(bin_start, bin_end), bin_counts[b]
+
 def search_desc(seqs, regex_str):
+    # The regex can be a string, or anything with a search() method,
+    # such as a compiled pattern. Undecoded records from
+    # parse_fasta_raw are decoded only if they match.
+    if isinstance(regex_str, str):
+        regex = re.compile(regex_str)
+    else:
+        regex = regex_str
     for desc, seq in seqs:
-        if re.search(regex_str, desc):
+        if regex.search(desc):
+            if isinstance(seq, bytes):
+                seq = decode_seq(seq)
             yield desc, seq
 
-def search_seqs(seqs, query, search_revcomp=False):
-    queryset = deambiguate(query)
+# Group references, which point to the wrong group once patterns are
+# combined. Escaped backslashes can match here too, which only means
+# that the patterns are searched one at a time.
+GROUP_REFERENCE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+def compile_desc_patterns(patterns, fixed_strings=False, ignore_case=False):
+    # Patterns are combined into one regex, so each description is
+    # searched once. Fixed strings are merged into a trie.
+    flags = re.IGNORECASE if ignore_case else 0
+    if fixed_strings:
+        trie = build_trie(patterns, re.escape)
+        return re.compile(trie_regex(trie), flags)
+    regexes = [re.compile(p, flags) for p in patterns]
+    if len(regexes) == 1:
+        return regexes[0]
+    # Inline flags, such as (?i), apply to the whole regex, and must
+    # come at its start, so patterns that set them can't be combined
+    default_flags = re.compile("", flags).flags
+    if any(
+            (regex.flags != default_flags) or GROUP_REFERENCE.search(p)
+            for p, regex in zip(patterns, regexes)):
+        return PatternList(regexes)
+    regex_str = "|".join("(?:{0})".format(p) for p in patterns)
+    try:
+        return re.compile(regex_str, flags)
+    except re.error:
+        # For example, a group name used in more than one pattern
+        return PatternList(regexes)
+
+class PatternList:
+    # Searches with each pattern in turn, for patterns that can't be
+    # combined into one regex
+    def __init__(self, regexes):
+        self.regexes = regexes
+
+    def search(self, text):
+        for regex in self.regexes:
+            m = regex.search(text)
+            if m:
+                return m
+        return None
+
+def search_seqs(seqs, query, search_revcomp=False, max_mismatches=0):
+    # The query can be one sequence or a list of sequences
+    if isinstance(query, str):
+        query = [query]
+    if max_mismatches > 0:
+        if search_revcomp:
+            query = list(query) + [reverse_complement(q) for q in query]
+        for desc, seq in seqs:
+            for q in query:
+                if any(find_matches(seq, q, max_mismatches)):
+                    yield desc, seq
+                    break
+        return
+    regex = compile_queries(query, search_revcomp=search_revcomp)
+    for desc, seq in seqs:
+        if regex.search(seq):
+            yield desc, seq
+
+def search_seq_positions(seqs, queries, search_revcomp=False, max_mismatches=0):
+    strands = [("+", q, q) for q in queries]
     if search_revcomp:
-        queryset = queryset + [reverse_complement(q) for q in queryset]
+        strands += [("-", q, reverse_complement(q)) for q in queries]
     for desc, seq in seqs:
-        for qseq in queryset:
-            if qseq in seq:
-                yield desc, seq
-                continue
+        seq_id = get_seq_id(desc)
+        for strand, query, qseq in strands:
+            for start_idx, mm in find_matches(seq, qseq, max_mismatches):
+                end_idx = start_idx + len(qseq)
+                yield (
+                    seq_id, query, strand, start_idx + 1, end_idx, mm,
+                    seq[start_idx:end_idx])
 
-def reverse_complement(seq):
-    rc = [COMPLEMENT_BASES[x] for x in seq]
-    rc.reverse()
-    return ''.join(rc)
+def find_matches(seq, query, max_mismatches=0):
+    # Bit-parallel matching over the whole sequence. For each position j
+    # in the query, we make an integer with bit i set if seq[i + j]
+    # matches query[j]. These are added together in bit-sliced
+    # counters, so that bit i of counters[n] is bit n of the number of
+    # matching bases for a match starting at position i. The work is
+    # linear in the length of the sequence and done on machine words.
+    qlen = len(query)
+    num_starts = len(seq) - qlen + 1
+    if (qlen == 0) or (num_starts < 1):
+        return
+    data = seq.encode("ascii", "replace")[::-1]
+    starts = (1 << num_starts) - 1
+    base_matches = {}
+    counters = []
+    for j, x in enumerate(query):
+        if x not in base_matches:
+            base_matches[x] = int(data.translate(match_table(x)), 2)
+        carry = (base_matches[x] >> j) & starts
+        for n, counter in enumerate(counters):
+            counters[n] = counter ^ carry
+            carry = counter & carry
+            if not carry:
+                break
+        if carry:
+            counters.append(carry)
+    hits = at_least(counters, qlen - max_mismatches) & starts
+    if not hits:
+        return
+    # The hits and counters are written out once as strings of bits,
+    # with the bit for position i at index i, and scanned for hits.
+    # Taking bits from the integers one at a time would mean a pass over
+    # the whole sequence for each hit.
+    hit_bits = bit_string(hits, num_starts)
+    counter_bits = [bit_string(counter, num_starts) for counter in counters]
+    start_idx = hit_bits.find("1")
+    while start_idx >= 0:
+        num_matches = sum(
+            1 << n for n, bits in enumerate(counter_bits)
+            if bits[start_idx] == "1")
+        yield start_idx, qlen - num_matches
+        start_idx = hit_bits.find("1", start_idx + 1)
+
+def bit_string(x, width):
+    return format(x, "0{0}b".format(width))[::-1]
+
+def at_least(counters, threshold):
+    # Bits set where the bit-sliced number in counters is greater than
+    # or equal to threshold.
+    if threshold <= 0:
+        return -1
+    if threshold >> len(counters):
+        return 0
+    greater = 0
+    equal = -1
+    for n in reversed(range(len(counters))):
+        counter = counters[n]
+        if (threshold >> n) & 1:
+            equal &= counter
+        else:
+            greater |= equal & counter
+            equal &= ~counter
+    return greater | equal
+
+def match_table(base):
+    # Translation table that maps the bases matching an ambiguous base
+    # to "1" and everything else to "0"
+    table = MATCH_TABLES.get(base)
+    if table is None:
+        table = bytearray(b"0" * 256)
+        for x in AMBIGUOUS_BASES[base]:
+            table[ord(x)] = ord("1")
+        table = MATCH_TABLES[base] = bytes(table)
+    return table
+
+MATCH_TABLES = {}
+
+def compile_queries(queries, search_revcomp=False):
+    # Ambiguous bases become character classes, so we don't need to
+    # list every sequence that matches the query. Queries are merged
+    # into a trie, so that the regex engine follows shared prefixes
+    # only once.
+    if search_revcomp:
+        queries = list(queries) + [reverse_complement(q) for q in queries]
+    trie = build_trie(queries, query_token)
+    return re.compile(trie_regex(trie))
+
+def build_trie(words, token):
+    # Each character is converted to a regex token. An empty key marks
+    # the end of a word.
+    trie = {}
+    for word in words:
+        node = trie
+        for x in word:
+            node = node.setdefault(token(x), {})
+        node[""] = {}
+    return trie
+
+def query_token(base):
+    choices = AMBIGUOUS_BASES[base]
+    if len(choices) == 1:
+        return choices
+    return "[" + choices + "]"
+
+def trie_regex(node):
+    # If a word ends here, we have a match and don't need to look any
+    # further.
+    if "" in node:
+        return ""
+    branches = [token + trie_regex(child) for token, child in node.items()]
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+def reverse_complement_seqs(seqs, strict=True):
+    for desc, seq in seqs:
+        yield desc, reverse_complement(seq, strict)
+
+def reverse_complement(seq, strict=True):
+    # Case is preserved, and A is complemented to U if the sequence
+    # contains U. Unknown symbols raise an error, or are left as they
+    # are if strict is False.
+    if seq.isascii():
+        return reverse_complement_bytes(seq.encode(), strict).decode()
+    if strict:
+        unknown = [x for x in seq if ord(x) not in COMPLEMENT_MAPS[False]]
+        raise ValueError(
+            "Cannot reverse complement symbol: {0!r}".format(unknown[0]))
+    return seq.translate(COMPLEMENT_MAPS[is_rna(seq)])[::-1]
+
+def reverse_complement_bytes(data, strict=True, rna=None):
+    if rna is None:
+        rna = is_rna(data)
+    if strict:
+        unknown = data.translate(None, COMPLEMENT_SYMBOLS)
+        if unknown:
+            raise ValueError(
+                "Cannot reverse complement symbol: {0!r}".format(
+                    chr(unknown[0])))
+    return data.translate(COMPLEMENT_TABLES[rna])[::-1]
+
+def is_rna(seq):
+    if isinstance(seq, str):
+        return ("U" in seq) or ("u" in seq)
+    return (b"U" in seq) or (b"u" in seq)
 
 def deambiguate(seq):
     nt_choices = [AMBIGUOUS_BASES[x] for x in seq]
@@ -140,3 +522,29 @@ COMPLEMENT_BASES = {
     "D": "H",
     "N": "N",
 }
+
+def complement_pairs(rna=False):
+    complements = dict(COMPLEMENT_BASES)
+    complements["U"] = "A"
+    if rna:
+        complements["A"] = "U"
+    for x in SELF_COMPLEMENT_SYMBOLS:
+        complements[x] = x
+    for x, y in list(complements.items()):
+        complements[x.lower()] = y.lower()
+    return complements
+
+# Gaps and unknown residues are their own complement
+SELF_COMPLEMENT_SYMBOLS = "-.X"
+
+# Translation tables for DNA (False) and RNA (True)
+COMPLEMENT_TABLES = {
+    rna: bytes.maketrans(
+        "".join(complement_pairs(rna)).encode(),
+        "".join(complement_pairs(rna).values()).encode())
+    for rna in (False, True)
+}
+COMPLEMENT_MAPS = {
+    rna: str.maketrans(complement_pairs(rna)) for rna in (False, True)
+}
+COMPLEMENT_SYMBOLS = "".join(complement_pairs()).encode()
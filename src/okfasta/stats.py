@@ -0,0 +1,237 @@
+import collections
+import functools
+import io
+import json
+import os.path
+import signal
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+# Stages timed by RunStats.timed_stages(). Time outside these stages,
+# such as reading ID or region files, is reported as other_seconds.
+STAGES = ["parse", "transform", "write"]
+
+class RunStats:
+    # Counts records, bytes, and the time spent in each stage of a
+    # subcommand. Nothing here is used unless --stats is given.
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.inclusive_seconds = dict.fromkeys(STAGES, 0.0)
+        self.transform_items_seconds = 0.0
+        self.records_in = None
+        self.records_out = None
+        self.input = None
+        self.output = None
+
+    def count_input(self, f):
+        self.input = CountingReader(f)
+        return self.input
+
+    def count_output(self, f):
+        self.output = CountingWriter(f)
+        return self.output
+
+    def timed_stages(self, parser, stage, write_output):
+        # Returns the parser, stage, and output function, wrapped to
+        # count the time spent in each. The times measured include the
+        # stages nested within, which are subtracted in finish(): the
+        # stage pulls records from the parser, and the output function
+        # pulls records from the stage.
+        times = self.inclusive_seconds
+
+        @functools.wraps(parser)
+        def timed_parser(f, *args, **kwargs):
+            self.records_in = 0
+            return self.timed_items(parser(f, *args, **kwargs), "parse")
+
+        @functools.wraps(stage)
+        def timed_stage(seqs):
+            self.records_out = 0
+            t0 = time.perf_counter()
+            items = stage(seqs)
+            times["transform"] += time.perf_counter() - t0
+            return self.timed_items(items, "transform")
+
+        @functools.wraps(write_output)
+        def timed_write(f, items, *args, **kwargs):
+            t0 = time.perf_counter()
+            result = write_output(f, items, *args, **kwargs)
+            times["write"] += time.perf_counter() - t0
+            return result
+
+        return timed_parser, timed_stage, timed_write
+
+    def timed_items(self, items, stage):
+        # Only the time spent getting each item is counted, not the
+        # time the caller spends before asking for the next one.
+        clock = time.perf_counter
+        elapsed = 0.0
+        n = 0
+        try:
+            t0 = clock()
+            for item in items:
+                elapsed += clock() - t0
+                n += 1
+                yield item
+                t0 = clock()
+            elapsed += clock() - t0
+        finally:
+            self.inclusive_seconds[stage] += elapsed
+            if stage == "parse":
+                self.records_in = n
+            else:
+                self.transform_items_seconds = elapsed
+                self.records_out = n
+
+    def finish(self):
+        wall = time.perf_counter() - self.start
+        times = self.inclusive_seconds
+        self.seconds = {
+            "parse": times["parse"],
+            "transform": times["transform"] - times["parse"],
+            "write": times["write"] - self.transform_items_seconds,
+        }
+        self.seconds["other"] = wall - sum(self.seconds.values())
+        self.seconds["total"] = wall
+
+    def summary(self):
+        summary = {
+            "records_in": self.records_in,
+            "records_out": self.records_out,
+            "input_bytes": self.input.n if self.input else None,
+            "output_bytes": self.output.n if self.output else None,
+        }
+        for stage, seconds in self.seconds.items():
+            summary[stage + "_seconds"] = round(seconds, 6)
+        wall = self.seconds["total"]
+        if (self.records_in is not None) and wall:
+            summary["records_per_s"] = round(self.records_in / wall, 1)
+        if (summary["input_bytes"] is not None) and wall:
+            summary["input_mb_per_s"] = round(
+                summary["input_bytes"] / wall / 1e6, 3)
+        summary["max_rss_mb"] = max_rss_mb()
+        summary["children_max_rss_mb"] = max_rss_mb(children=True)
+        return summary
+
+    def write_summary(self, f):
+        for key, val in self.summary().items():
+            if val is not None:
+                f.write("{0}\t{1}\n".format(key, val))
+
+    def save(self, fp):
+        with open(fp, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+            f.write("\n")
+
+def max_rss_mb(children=False):
+    # Peak resident memory of this process, or of the largest worker
+    # process for --jobs
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    max_rss = resource.getrusage(who).ru_maxrss
+    if not max_rss:
+        return None
+    # Reported in bytes on macOS, and in kilobytes elsewhere
+    if sys.platform == "darwin":
+        max_rss /= 1024
+    return round(max_rss / 1024, 1)
+
+class CountingReader(io.RawIOBase):
+    # Counts the bytes read from a binary file. The count is taken
+    # before decompression, so it is the size of the input as stored.
+    # Memory-mapped input, such as packed files, is not counted.
+    def __init__(self, f):
+        self.f = f
+        self.n = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self.f.readinto(b)
+        if n:
+            self.n += n
+        return n
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        super().close()
+        self.f.close()
+
+class CountingWriter:
+    # Counts the bytes written to a file. The count is taken after
+    # compression, so it is the size of the output as stored.
+    def __init__(self, f):
+        self.f = f
+        self.n = 0
+
+    def write(self, data):
+        self.n += len(data)
+        return self.f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)
+
+class SamplingProfiler:
+    # Records the stack of the main thread at each tick of a timer that
+    # counts CPU time. The stacks are written in the folded format read
+    # by flame graph tools: one line per stack, outermost call first,
+    # followed by the number of ticks.
+    def __init__(self, interval=0.001):
+        if not hasattr(signal, "setitimer"):
+            raise ValueError("Profiling is not supported on this platform")
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.previous_handler = None
+        self.last_sample = None
+
+    def sample(self, signum, frame):
+        # Signal handlers run between bytecodes, so ticks during a long
+        # call into C code arrive as one signal. Each stack is counted
+        # for the CPU time since the last sample.
+        now = time.process_time()
+        ticks = max(1, round((now - self.last_sample) / self.interval))
+        self.last_sample = now
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        self.stacks[tuple(stack)] += ticks
+
+    def start(self):
+        self.last_sample = time.process_time()
+        self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self.previous_handler)
+
+    def folded_stacks(self):
+        names = {}
+        for stack, n in self.stacks.most_common():
+            frames = []
+            for code in reversed(stack):
+                if code not in names:
+                    names[code] = frame_name(code)
+                frames.append(names[code])
+            yield "{0} {1}\n".format(";".join(frames), n)
+
+    def save(self, fp):
+        with open(fp, "w") as f:
+            f.writelines(self.folded_stacks())
+
+def frame_name(code):
+    module, _ = os.path.splitext(os.path.basename(code.co_filename))
+    name = getattr(code, "co_qualname", code.co_name)
+    return "{0}:{1}".format(module, name)
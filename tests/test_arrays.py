@@ -0,0 +1,19 @@
+import array
+import io
+
+from okfasta.arrays import *
+
+def test_write_read_array():
+    f = io.BytesIO()
+    f.write(b"xyzw")
+    write_array(f, array.array("I", [1, 2, 3]))
+    write_array(f, array.array("Q", [4, 1 << 40]))
+    view = memoryview(f.getvalue())
+    a, start = read_array(view, "I", 4, 3)
+    assert list(a) == [1, 2, 3]
+    assert start == 16
+    a, start = read_array(view, "Q", start, 2)
+    assert list(a) == [4, 1 << 40]
+    assert start == len(view)
+    # Stored little-endian, whatever the byte order of this machine
+    assert view[4:8].tobytes() == b"\x01\x00\x00\x00"
@@ -1,6 +1,10 @@
+import gzip
+import json
 import os.path
 import tempfile
 
+import pytest
+
 from okfasta.command import (
     okfasta_main, msa_ok_main,
 )
@@ -80,6 +84,12 @@ def test_selectcol_subcommand():
     output = run_msa_ok(["selectcol", column_file.name], small_aligned_fasta)
     assert list(parse_fasta(output)) == [('a|b 42', '-CA'), ('c|2.1 d', 'GCG')]
 
+def test_selectcol_subcommand_stream():
+    column_file = tempfile_containing("1\n6\n8\n")
+    output = run_msa_ok(
+        ["selectcol", column_file.name, "--stream"], small_aligned_fasta)
+    assert list(parse_fasta(output)) == [('a|b 42', '-CA'), ('c|2.1 d', 'GCG')]
+
 def test_mismatches_subcommand():
     output = run_msa_ok(["mismatches"], mismatch_aligned_fasta)
     assert output == ["a\tc-3\t2\n", "a\tEd\t5\n", "c-3\tEd\t7\n"]
@@ -150,11 +160,58 @@ def test_randomseqs_subcommand_largen():
     output_seqs = parse_fasta_list(output)
     assert list(sorted(output_seqs)) == input_seqs
 
+def test_randomseqs_subcommand_seed():
+    args = ["randomseqs", "--n", "4", "--seed", "7"]
+    output = run_okfasta(args, tall_fasta)
+    input_seqs = parse_fasta_list(tall_fasta.splitlines())
+    output_seqs = parse_fasta_list(output)
+    assert len(output_seqs) == 4
+    assert output_seqs == sorted(output_seqs, key=input_seqs.index)
+    assert run_okfasta(args, tall_fasta) == output
+
+def test_randomseqs_subcommand_proportion():
+    output = run_okfasta(["randomseqs", "--proportion", "1"], tall_fasta)
+    assert parse_fasta_list(output) == parse_fasta_list(tall_fasta.splitlines())
+    output = run_okfasta(["randomseqs", "--proportion", "0"], tall_fasta)
+    assert output == []
+
+def test_randomseqs_subcommand_indexed():
+    input_file = tempfile_containing(tall_fasta)
+    output_file = tempfile_containing("")
+    okfasta_main([
+        "randomseqs", "--n", "3", "--seed", "1", "--indexed",
+        "--input", input_file.name, "--output", output_file.name])
+    os.remove(input_file.name + ".fai")
+    input_seqs = parse_fasta_list(tall_fasta.splitlines())
+    output_seqs = parse_fasta_list(output_file)
+    assert len(output_seqs) == 3
+    assert output_seqs == sorted(output_seqs, key=input_seqs.index)
+
 def test_filterids_subcommand():
     ids_file = tempfile_containing("c|2.1")
     output = run_okfasta(["filterids", ids_file.name], small_fasta)
     assert parse_fasta_list(output) == [("c|2.1 d", "GCAGCCGGT")]
 
+def test_filterids_subcommand_duplicates():
+    ids_file = tempfile_containing("a|b\n")
+    output = run_okfasta(
+        ["filterids", ids_file.name], small_fasta + small_fasta)
+    assert parse_fasta_list(output) == [("a|b 42", "GCAGACGATAC")] * 2
+    output = run_okfasta(
+        ["filterids", ids_file.name, "--keep-duplicates"],
+        small_fasta + small_fasta)
+    assert parse_fasta_list(output) == [("a|b 42", "GCAGACGATAC")] * 2
+    output = run_okfasta(
+        ["filterids", ids_file.name, "--first-only"],
+        small_fasta + small_fasta)
+    assert parse_fasta_list(output) == [("a|b 42", "GCAGACGATAC")]
+
+def test_normalize_subcommand_line_width():
+    output = run_okfasta(["normalize", "--line-width", "5"], small_fasta)
+    assert output == [
+        ">a|b 42\n", "GCAGA\n", "CGATA\n", "C\n",
+        ">c|2.1 d\n", "GCAGC\n", "CGGT\n"]
+
 def test_extract_subcommand():
     region_file = tempfile_containing(
         "a|b\t3\t7\n"
@@ -169,6 +226,21 @@ def test_searchdesc_subcommand():
     output = run_okfasta(["searchdesc", "^a"], small_fasta)
     assert parse_fasta_list(output) == [("a|b 42", "GCAGACGATAC")]
 
+def test_searchdesc_subcommand_patterns_file():
+    patterns_file = tempfile_containing("A|B\nnotfound\n")
+    output = run_okfasta([
+        "searchdesc", "--patterns-file", patterns_file.name,
+        "--fixed-strings", "--ignore-case"], small_fasta)
+    assert parse_fasta_list(output) == [("a|b 42", "GCAGACGATAC")]
+
+def test_searchdesc_subcommand_inline_flags():
+    output = run_okfasta(["searchdesc", "(?i)A\\|B"], small_fasta)
+    assert parse_fasta_list(output) == [("a|b 42", "GCAGACGATAC")]
+
+def test_searchdesc_subcommand_jobs():
+    output = run_okfasta(["searchdesc", "d$", "--jobs", "2"], small_fasta)
+    assert parse_fasta_list(output) == [("c|2.1 d", "GCAGCCGGT")]
+
 def test_seqrchseq_subcommand():
     output = run_okfasta(["searchseq", "AGACGAT"], small_fasta)
     assert parse_fasta_list(output) == [("a|b 42", "GCAGACGATAC")]
@@ -194,3 +266,281 @@ def test_kmers_subcommand():
         "c|2.1\t1\tGCAGCCGG\n",
         "c|2.1\t2\tCAGCCGGT\n",
     ]
+
+def test_index_subcommand():
+    output = run_okfasta(["index"], small_fasta)
+    assert output == ["a|b\t11\t8\t11\t12\n", "c|2.1\t9\t29\t9\t10\n"]
+
+def test_fetch_subcommand():
+    input_file = tempfile_containing(small_fasta)
+    ids_file = tempfile_containing("c|2.1\nnotfound\na|b\n")
+    output_file = tempfile_containing("")
+    okfasta_main([
+        "fetch", ids_file.name,
+        "--input", input_file.name, "--output", output_file.name])
+    os.remove(input_file.name + ".fai")
+    assert parse_fasta_list(output_file) == [
+        ("c|2.1 d", "GCAGCCGGT"), ("a|b 42", "GCAGACGATAC"),
+    ]
+
+def test_extract_bed_subcommand():
+    region_file = tempfile_containing("a|b\t2\t7\nc|2.1\t0\t3\tr\t0\t-\n")
+    output = run_okfasta(
+        ["extract", region_file.name, "--region-format", "bed"], small_fasta)
+    assert parse_fasta_list(output) == [
+        ("a|b__3_7", "AGACG"),
+        ("c|2.1__1_3_rc", "TGC"),
+    ]
+
+def test_extract_indexed_subcommand():
+    input_file = tempfile_containing(small_fasta)
+    region_file = tempfile_containing("a|b\t3\t7\nc|2.1\t1\t2\n")
+    output_file = tempfile_containing("")
+    okfasta_main([
+        "extract", region_file.name, "--indexed",
+        "--input", input_file.name, "--output", output_file.name])
+    assert os.path.exists(input_file.name + ".fai")
+    os.remove(input_file.name + ".fai")
+    assert parse_fasta_list(output_file) == [
+        ("a|b__3_7", "AGACG"),
+        ("c|2.1__1_2", "GC"),
+    ]
+
+def test_revcomp_indexed_subcommand():
+    input_file = tempfile_containing(small_fasta)
+    output_file = tempfile_containing("")
+    okfasta_main([
+        "revcomp", "--indexed",
+        "--input", input_file.name, "--output", output_file.name])
+    os.remove(input_file.name + ".fai")
+    assert parse_fasta_list(output_file) == [
+        ("a|b 42", "GTATCGTCTGC"),
+        ("c|2.1 d", "ACCGGCTGC"),
+    ]
+
+def test_revcomp_lenient_subcommand():
+    output = run_okfasta(["revcomp", "--lenient"], ">a\nACZT\n")
+    assert parse_fasta_list(output) == [("a", "AZGT")]
+
+def test_compressed_input_and_output():
+    with tempfile.TemporaryDirectory() as d:
+        input_fp = os.path.join(d, "input.fasta.gz")
+        output_fp = os.path.join(d, "output.fasta.bgz")
+        with gzip.open(input_fp, "wt") as f:
+            f.write(small_fasta)
+        okfasta_main(["revcomp", "--input", input_fp, "--output", output_fp])
+        assert os.path.exists(output_fp + ".gzi")
+        with gzip.open(output_fp, "rt") as f:
+            assert parse_fasta_list(f) == [
+                ("a|b 42", "GTATCGTCTGC"),
+                ("c|2.1 d", "ACCGGCTGC"),
+            ]
+
+def test_fetch_subcommand_bgzf():
+    with tempfile.TemporaryDirectory() as d:
+        input_fp = os.path.join(d, "input.fasta")
+        bgzf_fp = os.path.join(d, "input.fasta.bgz")
+        output_fp = os.path.join(d, "output.fasta")
+        ids_fp = os.path.join(d, "ids.txt")
+        with open(input_fp, "w") as f:
+            f.write(small_fasta)
+        with open(ids_fp, "w") as f:
+            f.write("c|2.1\n")
+        okfasta_main(["normalize", "--input", input_fp, "--output", bgzf_fp])
+        okfasta_main([
+            "fetch", ids_fp, "--input", bgzf_fp, "--output", output_fp])
+        with open(output_fp) as f:
+            assert parse_fasta_list(f) == [("c|2.1 d", "GCAGCCGGT")]
+
+def test_revcomp_subcommand_jobs():
+    output = run_okfasta(["revcomp", "--jobs", "2"], small_fasta)
+    assert parse_fasta_list(output) == [
+        ("a|b 42", "GTATCGTCTGC"),
+        ("c|2.1 d", "ACCGGCTGC"),
+    ]
+
+def test_length_subcommand_summary():
+    output = run_okfasta(["length", "--summary", "--bin-size", "5"], small_fasta)
+    assert output == [
+        "count\t2\n", "total\t20\n", "min\t9\n", "max\t11\n",
+        "N50\t11\n", "N90\t9\n", "5-9\t1\n", "10-14\t1\n"]
+
+def test_length_subcommand_bin_size():
+    for bin_size in ["0", "-5", "x"]:
+        with pytest.raises(SystemExit):
+            run_okfasta(
+                ["length", "--summary", "--bin-size", bin_size], small_fasta)
+
+def test_length_subcommand_jobs():
+    output = run_okfasta(["length", "--threads", "2"], small_fasta)
+    assert output == ["a|b\t11\n", "c|2.1\t9\n"]
+
+def test_colstats_backends():
+    output_bytes = run_msa_ok(["colstats", "--backend", "bytes"], small_aligned_fasta)
+    output_columns = run_msa_ok(["colstats", "--backend", "columns"], small_aligned_fasta)
+    assert output_bytes == output_columns
+
+def test_mismatches_subcommand_matrix():
+    output = run_msa_ok(["mismatches", "--format", "matrix"], mismatch_aligned_fasta)
+    assert output == [
+        "\ta\tc-3\tEd\n", "a\t0\t2\t5\n", "c-3\t2\t0\t7\n", "Ed\t5\t7\t0\n"]
+
+def test_mismatches_subcommand_phylip():
+    output = run_msa_ok(
+        ["mismatches", "--format", "phylip", "--percent"], mismatch_aligned_fasta)
+    assert output == [
+        "3\n", "a 0.00 20.00 45.45\n", "c-3 20.00 0.00 70.00\n",
+        "Ed 45.45 70.00 0.00\n"]
+
+def test_colstats_stream():
+    output_stream = run_msa_ok(["colstats", "--backend", "stream"], small_aligned_fasta)
+    output_columns = run_msa_ok(["colstats", "--backend", "columns"], small_aligned_fasta)
+    assert output_stream == output_columns
+
+def test_colstats_non_ascii():
+    output_stream = run_msa_ok(["colstats"], ">a\nAÉ-\n>b\nA-C\n")
+    output_columns = run_msa_ok(
+        ["colstats", "--backend", "columns"], ">a\nAÉ-\n>b\nA-C\n")
+    assert output_stream == output_columns
+    assert output_stream[2] == "2\t1\t0.50\t0.0000\tÉ\t1.00\n"
+
+def test_searchseq_subcommand_queries_file():
+    queries_file = tempfile_containing("CCGG\n# comment\nTTTT\n")
+    output = run_okfasta(
+        ["searchseq", "--queries-file", queries_file.name], small_fasta)
+    assert parse_fasta_list(output) == [("c|2.1 d", "GCAGCCGGT")]
+
+def test_searchseq_subcommand_positions():
+    output = run_okfasta(
+        ["searchseq", "GACGTT", "--max-mismatches", "2", "--positions"],
+        small_fasta)
+    assert output == [
+        "a|b\tGACGTT\t+\t4\t9\t1\tGACGAT\n",
+        "c|2.1\tGACGTT\t+\t4\t9\t2\tGCCGGT\n",
+    ]
+
+def test_kmercount_subcommand():
+    output = run_okfasta(["kmercount", "--k", "7"], small_fasta)
+    assert output == [
+        "ACGATAC\t1\n", "AGACGAT\t1\n", "AGCCGGT\t1\n", "CAGACGA\t1\n",
+        "CAGCCGG\t1\n", "GACGATA\t1\n", "GCAGACG\t1\n", "GCAGCCG\t1\n",
+    ]
+
+def test_replaceids_subcommand_idmap():
+    newids_file = tempfile_containing("c|2.1\tc-2\naaa ggg\n")
+    idmap_file = tempfile_containing("")
+    okfasta_main([
+        "idmap", "--input", newids_file.name, "--output", idmap_file.name])
+    output = run_okfasta(["replaceids", idmap_file.name], small_fasta)
+    output_seq_ids = [seq_id for seq_id, seq in parse_fasta_list(output)]
+    assert output_seq_ids == ["a|b 42", "c-2 d"]
+
+def test_zstd_output_missing_module(monkeypatch):
+    def no_zstd_module():
+        raise ImportError("no zstd")
+
+    monkeypatch.setattr("okfasta.command.zstd_module", no_zstd_module)
+    monkeypatch.setattr("okfasta.compression.zstd_module", no_zstd_module)
+    input_file = tempfile_containing(small_fasta)
+    with tempfile.TemporaryDirectory() as d:
+        output_fp = os.path.join(d, "seqs.fa.zst")
+        with open(output_fp, "w") as f:
+            f.write("existing")
+        with pytest.raises(ImportError):
+            okfasta_main([
+                "normalize", "--input", input_file.name,
+                "--output", output_fp])
+        # The existing file was not truncated
+        with open(output_fp) as f:
+            assert f.read() == "existing"
+
+def test_idmap_subcommand_compressed_output():
+    newids_file = tempfile_containing("c|2.1\tc-2\n")
+    with tempfile.TemporaryDirectory() as d:
+        with pytest.raises(ValueError):
+            okfasta_main([
+                "idmap", "--input", newids_file.name,
+                "--output", os.path.join(d, "ids.idmap.gz")])
+        assert os.listdir(d) == []
+
+def test_pack_subcommand():
+    packed_file = tempfile_containing("")
+    input_file = tempfile_containing(small_fasta)
+    okfasta_main([
+        "pack", "--input", input_file.name, "--output", packed_file.name])
+    output_file = tempfile_containing("")
+    okfasta_main([
+        "length", "--input", packed_file.name, "--output", output_file.name])
+    assert output_file.readlines() == ["a|b\t11\n", "c|2.1\t9\n"]
+
+def test_pack_subcommand_compressed_output():
+    input_file = tempfile_containing(small_fasta)
+    with tempfile.TemporaryDirectory() as d:
+        for filename in ["seqs.pack.gz", "seqs.pack.bgz"]:
+            output_fp = os.path.join(d, filename)
+            with pytest.raises(ValueError):
+                okfasta_main([
+                    "pack", "--input", input_file.name,
+                    "--output", output_fp])
+        # The error comes before any output file is made
+        assert os.listdir(d) == []
+
+def run_okfasta_chain(stages, input_data):
+    # Stages take the rest of the arguments, so --input and --output
+    # come first
+    input_file = tempfile_containing(input_data)
+    output_file = tempfile_containing("")
+    okfasta_main([
+        "chain", "--input", input_file.name, "--output", output_file.name,
+        ] + stages)
+    return output_file.readlines()
+
+def test_chain_subcommand():
+    ids_file = tempfile_containing("c|2.1\n")
+    output = run_okfasta_chain([
+        "filterids", ids_file.name, "--remove-ids", "::",
+        "revcomp", "::", "replacechars", "--remove", "T", "::", "length",
+        ], small_fasta)
+    assert output == ["a|b\t7\n"]
+
+def test_chain_subcommand_matches_pipeline():
+    stages = [["replacechars", "--replace", "G", " "], ["revcomp"]]
+    output = small_fasta
+    for stage in stages:
+        output = "".join(run_okfasta(list(stage), output))
+    chain_output = run_okfasta_chain(stages[0] + ["::"] + stages[1], small_fasta)
+    assert "".join(chain_output) == output
+
+def test_chain_subcommand_tsv_not_last():
+    with pytest.raises(ValueError):
+        run_okfasta_chain(["length", "::", "revcomp"], small_fasta)
+
+def test_stats_file():
+    stats_file = tempfile_containing("")
+    output = run_okfasta(
+        ["--stats-file", stats_file.name, "revcomp"], small_fasta)
+    assert len(output) == 4
+    stats = json.load(stats_file)
+    assert stats["records_in"] == 2
+    assert stats["records_out"] == 2
+    assert stats["input_bytes"] == len(small_fasta)
+    assert stats["output_bytes"] == len("".join(output))
+    for stage in ["parse", "transform", "write", "other"]:
+        assert stats[stage + "_seconds"] >= 0
+
+def test_stats_file_msa_ok():
+    stats_file = tempfile_containing("")
+    output = run_msa_ok(
+        ["--stats-file", stats_file.name, "colstats"], small_aligned_fasta)
+    stats = json.load(stats_file)
+    assert stats["records_in"] == 2
+    assert stats["records_out"] == len(output)
+
+def test_profile():
+    profile_file = tempfile_containing("")
+    output = run_okfasta(
+        ["--profile", profile_file.name, "normalize"], small_fasta)
+    assert len(output) == 4
+    for line in profile_file:
+        stack, n = line.rsplit(" ", 1)
+        assert int(n) > 0
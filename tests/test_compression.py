@@ -0,0 +1,80 @@
+import gzip
+import io
+import os.path
+import tempfile
+
+from okfasta.compression import *
+
+def test_detect_compression():
+    assert detect_compression(gzip.compress(b"abc")) == "gzip"
+    assert detect_compression(bgzf_compress(b"abc")) == "bgzf"
+    assert detect_compression(b"\x28\xb5\x2f\xfd\x04") == "zstd"
+    assert detect_compression(b">abc") is None
+    assert detect_compression(b"") is None
+
+def test_compression_from_filename():
+    assert compression_from_filename("a/b.fasta.gz") == "gzip"
+    assert compression_from_filename("b.fa.BGZ") == "bgzf"
+    assert compression_from_filename("b.fa.zst") == "zstd"
+    assert compression_from_filename("b.fa") is None
+
+def bgzf_compress(data, index_fp=None):
+    f = io.BytesIO()
+    writer = BgzfWriter(f, index_fp=index_fp)
+    writer.write(data)
+    writer.close()
+    return f.getvalue()
+
+def test_bgzf_writer():
+    data = bytes(range(256)) * 1000
+    compressed = bgzf_compress(data)
+    assert gzip.decompress(compressed) == data
+    assert compressed.endswith(BGZF_EOF)
+
+def test_bgzf_writer_index():
+    data = b"ACGT" * 50000
+    with tempfile.TemporaryDirectory() as d:
+        index_fp = os.path.join(d, "a.gzi")
+        compressed = bgzf_compress(data, index_fp)
+        with open(index_fp, "rb") as f:
+            block_offsets = list(parse_gzi(f))
+    assert block_offsets == list(scan_bgzf_blocks(compressed))
+    assert [u for c, u in block_offsets] == [65280, 130560, 195840]
+
+def test_bgzf_data():
+    data = bytes(range(256)) * 1000
+    with tempfile.TemporaryDirectory() as d:
+        fp = os.path.join(d, "a.bgz")
+        with open(fp, "wb") as f:
+            f.write(bgzf_compress(data))
+        bgzf_data = BgzfData(fp)
+        assert bgzf_data[100:200000] == data[100:200000]
+        assert bgzf_data[65270:65290] == data[65270:65290]
+        assert bgzf_data.rfind(b"\x05", 0, 200000) == data.rfind(b"\x05", 0, 200000)
+        assert bgzf_data.rfind(b"\xff\x00", 0, 65281) == 65279
+        assert bgzf_data.rfind(b"\xff\x00", 10, 100) == -1
+
+def test_decompressed_reader():
+    data = b">a\nACGT\n" * 1000
+    for compressed in [gzip.compress(data), bgzf_compress(data), data]:
+        f = decompressed_reader(io.BytesIO(compressed))
+        assert f.read(0) == b""
+        assert f.read(3) == b">a\n"
+        assert f.read() == data[3:]
+
+def test_threaded_reader():
+    f = ThreadedReader(io.BytesIO(b"abcdefg"), block_size=3)
+    assert f.read(2) == b"ab"
+    assert f.read(5) == b"c"
+    assert f.read(5) == b"def"
+    assert f.read(5) == b"g"
+    assert f.read(5) == b""
+
+def test_compressed_writer():
+    raw = io.BytesIO()
+    raw.close = lambda: None
+    f = compressed_writer(raw, "gzip")
+    f.write(b"abc")
+    f.write(b"def")
+    f.close()
+    assert gzip.decompress(raw.getvalue()) == b"abcdef"
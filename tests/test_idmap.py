@@ -0,0 +1,42 @@
+import io
+import os.path
+import tempfile
+
+from okfasta.idmap import *
+
+def test_idmap_get():
+    pairs = [("a", "x"), ("b|1", "yy"), ("", "empty"), ("a", "z"), ("é", "ü")]
+    idmap = IdMap.from_pairs(pairs)
+    assert len(idmap) == 4
+    assert dict(idmap.items()) == dict(pairs)
+    for key, value in dict(pairs).items():
+        assert idmap.get(key) == value
+    assert idmap.get("c") is None
+    assert idmap.get("b", "d") == "d"
+
+def test_idmap_save_load():
+    for n in [0, 1, 2, 101]:
+        pairs = [("seq{0}".format(i), "new{0}".format(i)) for i in range(n)]
+        f = io.BytesIO()
+        IdMap.from_pairs(pairs).save(f)
+        idmap = IdMap.load(f.getvalue())
+        assert sorted(idmap.items()) == sorted(pairs)
+        assert idmap.get("seq0") == (None if n == 0 else "new0")
+
+def test_load_id_map():
+    with tempfile.TemporaryDirectory() as d:
+        text_fp = os.path.join(d, "ids.txt")
+        with open(text_fp, "w") as f:
+            f.write("a 1\nb 2\n")
+        assert load_id_map(text_fp, parse_pairs) == {"a": "1", "b": "2"}
+        idmap = IdMap.from_pairs([("a", "1"), ("b", "2")])
+        map_fp = os.path.join(d, "ids.idmap")
+        with open(map_fp, "wb") as f:
+            idmap.save(f)
+        assert is_id_map(map_fp) and not is_id_map(text_fp)
+        idmap = load_id_map(map_fp, parse_pairs)
+        assert isinstance(idmap.keys, memoryview)
+        assert idmap.get("a") == "1"
+
+def parse_pairs(f):
+    return (line.split() for line in f)
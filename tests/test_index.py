@@ -0,0 +1,95 @@
+import io
+import tempfile
+
+from okfasta.index import *
+from okfasta.io import parse_fasta
+
+wrapped_fasta = b"""\
+>a x y
+ACGTA
+CGTAC
+GT
+>b
+AACCG
+GT
+>empty
+>c  z
+TTTTT
+"""
+
+def indexed_fasta_containing(contents):
+    f = tempfile.NamedTemporaryFile(mode="w+b")
+    f.write(contents)
+    f.flush()
+    entries = list(build_fasta_index(io.BytesIO(contents)))
+    return f, IndexedFasta(f.name, entries)
+
+def test_build_fasta_index():
+    entries = list(build_fasta_index(io.BytesIO(wrapped_fasta)))
+    assert entries == [
+        ("a", 12, 7, 5, 6),
+        ("b", 7, 25, 5, 6),
+        ("empty", 0, 41, 0, 1),
+        ("c", 5, 47, 5, 6),
+    ]
+
+def test_build_fasta_index_crlf():
+    f = io.BytesIO(b">a\r\nACG\r\nTT\r\n>b\r\nG\r\n")
+    assert list(build_fasta_index(f)) == [
+        ("a", 5, 4, 3, 5),
+        ("b", 1, 17, 1, 3),
+    ]
+
+def test_build_fasta_index_ragged_lines():
+    f = io.BytesIO(b">a\nACG\nTTTT\nG\n")
+    try:
+        list(build_fasta_index(f))
+    except ValueError:
+        pass
+    else:
+        assert False, "Expected ValueError"
+
+def test_parse_fasta_index():
+    entries = list(build_fasta_index(io.BytesIO(wrapped_fasta)))
+    f = io.StringIO()
+    write_fasta_index(f, entries)
+    f.seek(0)
+    assert list(parse_fasta_index(f)) == entries
+
+def test_indexed_fasta_fetch():
+    f, indexed_fasta = indexed_fasta_containing(wrapped_fasta)
+    seqs = list(parse_fasta(io.BytesIO(wrapped_fasta)))
+    for (desc, seq), entry in zip(seqs, indexed_fasta.entries):
+        assert indexed_fasta.fetch(entry.name) == (desc, seq)
+
+def test_indexed_fasta_get_seq():
+    f, indexed_fasta = indexed_fasta_containing(wrapped_fasta)
+    entry = indexed_fasta.entries[0]
+    seq = "ACGTACGTACGT"
+    for start_idx in range(-2, 14):
+        for end_idx in range(-2, 14):
+            observed = indexed_fasta.get_seq(entry, start_idx, end_idx)
+            assert observed == seq[start_idx:end_idx]
+
+def test_extract_indexed_regions():
+    f, indexed_fasta = indexed_fasta_containing(wrapped_fasta)
+    regions = [("b", 4, 7), ("a", 5, 7), ("a", 1, 1), ("zz", 1, 2)]
+    assert list(extract_indexed_regions(regions, indexed_fasta)) == [
+        ("a__1_1", "A"), ("a__5_7", "ACG"), ("b__4_7", "CGGT"),
+    ]
+
+def test_extract_indexed_regions_strand():
+    f, indexed_fasta = indexed_fasta_containing(wrapped_fasta)
+    regions = [("a", 5, 7, "-"), ("zz", 1, 2, "+")]
+    unmatched = []
+    extracted = extract_indexed_regions(regions, indexed_fasta, unmatched)
+    assert list(extracted) == [("a__5_7_rc", "CGT")]
+    assert unmatched == [("zz", 1, 2, "+")]
+
+def test_reverse_complement_blocks():
+    f, indexed_fasta = indexed_fasta_containing(wrapped_fasta)
+    entry = indexed_fasta.entries_by_name["a"]
+    blocks = list(reverse_complement_blocks(indexed_fasta, entry, block_size=5))
+    assert blocks == ["AC", "GTACG", "TACGT"]
+    entry = indexed_fasta.entries_by_name["empty"]
+    assert list(reverse_complement_blocks(indexed_fasta, entry)) == []
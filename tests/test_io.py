@@ -1,3 +1,6 @@
+import io
+import tempfile
+
 from okfasta.io import *
 
 def test_parse_fasta():
@@ -16,6 +19,20 @@ def test_parse_regions_extra_fields():
     f = ["abc 5 7 whatever else"]
     assert list(parse_regions(f)) == [("abc", 5, 7)]
 
+def test_parse_bed():
+    f = [
+        "track name=genes\n", "chr1\t0\t5\n", "chr2\t9\t12\tg1\t0\t-\n",
+        "# comment\n"]
+    assert list(parse_bed(f)) == [("chr1", 1, 5, "+"), ("chr2", 10, 12, "-")]
+
+def test_parse_gff():
+    f = [
+        "##gff-version 3\n",
+        "chr1\tsrc\tgene\t3\t8\t.\t-\t.\tID=g1; Name=a b\n",
+        "chr1\tsrc\tCDS\t4\t6\t.\t+\t0\tID=c1\n",
+        "##FASTA\n", ">chr1\n"]
+    assert list(parse_gff(f)) == [("chr1", 3, 8, "-"), ("chr1", 4, 6, "+")]
+
 def test_parse_regions():
     f = ["seq1 2 5", "seq3 1 3", " ", "# comment", "seq1 4 7"]
     regions = [("seq1", 2, 5), ("seq3", 1, 3), ("seq1", 4, 7)]
@@ -35,3 +52,87 @@ def test_parse_new_descs():
     assert list(parse_new_descs(f)) == [
         ("mvm", "mvm\tldaisufy"), ("oief2|..", "oief2|.. dfu8")
     ]
+
+def test_parse_fasta_binary():
+    f = io.BytesIO(b">ab c\nGG VU\nLG\n>bu\tter\r\nCG\r\nTA\r\n")
+    seqs = parse_fasta(f)
+    assert list(seqs) == [("ab c", "GGVULG"), ("bu\tter", "CGTA")]
+
+def test_parse_fasta_binary_small_blocks():
+    data = b">a\nACGT\nAC\n\n>b x\n\nGGT\n>c\n>d\nT"
+    for block_size in range(1, len(data) + 1):
+        f = io.BytesIO(data)
+        assert list(parse_fasta(f, block_size)) == [
+            ("a", "ACGTAC"), ("b x", "GGT"), ("c", ""), ("d", "T")]
+
+def test_parse_fasta_binary_matches_lines():
+    data = (
+        ">a  \n AC GT \n\tTT\t \n  >b\nGG\n>c\rCC\rA\n"
+        ">d \x1cx\nCA\x0bT\n>e\nC\xc2\xa0A\n")
+    expected = list(parse_fasta_lines(io.StringIO(data, newline=None)))
+    observed = list(parse_fasta(io.BytesIO(data.encode())))
+    assert observed == expected
+
+def test_parse_fasta_raw():
+    f = io.BytesIO(b">a b\nAC\nGT\n")
+    desc, body = next(parse_fasta_raw(f))
+    assert desc == "a b"
+    assert decode_seq(body) == "ACGT"
+
+def test_parse_fasta_lengths_matches_parse_fasta():
+    data = (
+        ">a  \n AC GT \n\tTT\t \n  >b\nGG\n>c\rCC\rA\n"
+        ">d\tx\r\nCA T\r\n>e\nC\xc2\xa0A\n>f\nAC\tG\n>g").encode()
+    for block_size in [1, 7, len(data)]:
+        expected = [
+            (desc, len(seq))
+            for desc, seq in parse_fasta(io.BytesIO(data), block_size)]
+        observed = parse_fasta_lengths(io.BytesIO(data), block_size)
+        assert list(observed) == expected
+
+def test_write_fasta():
+    seqs = [("a b", "ACGTACG"), ("c", "")]
+    f = io.StringIO()
+    write_fasta(f, seqs)
+    assert f.getvalue() == ">a b\nACGTACG\n>c\n\n"
+    f = io.BytesIO()
+    write_fasta(f, seqs, line_width=3)
+    assert f.getvalue() == b">a b\nACG\nTAC\nG\n>c\n\n"
+
+def test_write_fasta_file_wrappers():
+    seqs = [("a b", "ACG")]
+    with tempfile.NamedTemporaryFile("w+t") as f:
+        write_fasta(f, seqs)
+        f.seek(0)
+        assert f.read() == ">a b\nACG\n"
+    with tempfile.NamedTemporaryFile("w+b") as f:
+        write_fasta(f, seqs)
+        f.seek(0)
+        assert f.read() == b">a b\nACG\n"
+
+    class ListWriter:
+        # Has no mode, so it gets text
+        def __init__(self):
+            self.data = []
+
+        def write(self, data):
+            self.data.append(data)
+
+    f = ListWriter()
+    write_fasta(f, seqs)
+    assert f.data == [">a b\nACG\n"]
+
+def test_write_lines_batches():
+    f = io.BytesIO()
+    write_lines(f, ["ab", "c", "def", "g"], buffer_size=3)
+    assert f.getvalue() == b"abcdefg"
+
+def test_write_matrix():
+    f = io.StringIO()
+    write_matrix(f, ["a", "b"], [[0, 1.5], [1.5, 0]], "{0:.2f}")
+    assert f.getvalue() == "\ta\tb\na\t0.00\t1.50\nb\t1.50\t0.00\n"
+
+def test_write_phylip():
+    f = io.StringIO()
+    write_phylip(f, ["a", "b"], [[0, 3], [3, 0]])
+    assert f.getvalue() == "2\na 0 3\nb 3 0\n"
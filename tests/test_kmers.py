@@ -0,0 +1,49 @@
+from okfasta.kmers import *
+
+def test_kmer_codes():
+    assert list(kmer_codes("ACGT", 2)) == [1, 6, 11]
+    assert list(kmer_codes("acNgtt", 2)) == [1, 11, 15]
+    assert list(kmer_codes("AC", 3)) == []
+
+def test_kmer_codes_canonical():
+    # AC/GT, CG/CG, GT/AC
+    assert list(kmer_codes("ACGT", 2, canonical=True)) == [1, 6, 1]
+
+def test_decode_kmer():
+    assert decode_kmer(0, 3) == "AAA"
+    assert decode_kmer(27, 3) == "CGT"
+    assert decode_kmer(27, 4) == "ACGT"
+
+def test_count_kmers():
+    seqs = [("a", "ACGTAC"), ("b", "GTNAC")]
+    expected = [("AC", 3), ("CG", 1), ("GT", 2), ("TA", 1)]
+    assert list(count_kmers(seqs, 2)) == expected
+    assert list(count_kmers(seqs, 2, max_kmers=1)) == expected
+    assert list(count_kmers(seqs, 2, canonical=True)) == [
+        ("AC", 5), ("CG", 1), ("TA", 1)]
+
+def test_count_kmers_large_k():
+    seqs = [("a", "ACGTACGTACGTAC"), ("b", "CGTACGTACGTACG")]
+    assert list(count_kmers(seqs, 13)) == [
+        ("ACGTACGTACGTA", 1), ("CGTACGTACGTAC", 2), ("GTACGTACGTACG", 1)]
+
+def test_kmer_codes_window():
+    seq = "ACGTTGCAAGNCTTAGGCATCGATCGGA"
+    for canonical in [False, True]:
+        expected = list(kmer_codes(seq, 3, canonical))
+        for window in [1, 2, 5, 100]:
+            observed = list(kmer_codes(seq, 3, canonical, window=window))
+            assert observed == expected
+
+def test_count_kmers_spill_within_sequence():
+    seq = "ACGTTGCAAGTCTTAGGCATCGATCGGA" * 5000
+    expected = list(count_kmers([("a", seq)], 9))
+    assert list(count_kmers([("a", seq)], 9, max_kmers=3)) == expected
+
+def test_count_kmers_merge_rounds():
+    # Each record is spilled to its own run, so the runs are merged in
+    # more than one round
+    seqs = [("s{0}".format(i), decode_kmer(i, 6)) for i in range(200)]
+    seqs.append(("t", "ACGTAC"))
+    expected = list(count_kmers(seqs, 6))
+    assert list(count_kmers(seqs, 6, max_kmers=0)) == expected
@@ -1,3 +1,4 @@
+import pytest
 from pytest import approx
 
 from okfasta.msa import *
@@ -94,3 +95,112 @@ def test_mismatches():
     assert mismatches("ABCD", "ABEE") == 2
     assert mismatches("ABCD", "AB-E") == 1
     assert mismatches("ABCD", "AB-E", include_gaps=True) == 2
+
+def test_byte_msa_from_seqs():
+    seqs = [("a", "ADGJ"), ("b", "BEH"), ("c", "CFIL")]
+    msa = ByteMSA.from_seqs(seqs)
+    assert msa.descs == ("a", "b", "c")
+    assert msa.width == 4
+    assert msa.column(1) == b"DEF"
+    assert msa.column(3) == b"J-L"
+    assert list(msa.seqs) == [("a", "ADGJ"), ("b", "BEH-"), ("c", "CFIL")]
+
+def test_byte_msa_filter_by_index():
+    seqs = [("a", "ADGJ"), ("b", "BEH"), ("c", "CFIL")]
+    msa = ByteMSA.from_seqs(seqs).filter_by_index([4, 2, 9, 2])
+    assert msa.width == 2
+    assert list(msa.seqs) == [("a", "DJ"), ("b", "E-"), ("c", "FL")]
+    msa = ByteMSA.from_seqs(seqs).filter_by_index([2, 4], remove=True)
+    assert list(msa.seqs) == [("a", "AG"), ("b", "BH"), ("c", "CI")]
+
+def test_select_columns():
+    seqs = [("a", "AD-J"), ("b", "BÉH")]
+    assert list(select_columns(seqs, [1, 2])) == [("a", "AD"), ("b", "BÉ")]
+    assert list(select_columns(seqs[:1], [1, 2])) == [("a", "AD")]
+
+def test_stream_select_columns():
+    seqs = [("a", "ADGJK"), ("b", "BEH"), ("c", "CFILM")]
+    for idxs in [[1, 2, 4], [5, 3, 9], [], [1, 2, 3, 4, 5]]:
+        for remove in [False, True]:
+            expected = list(select_columns(seqs, idxs, remove))
+            observed = list(stream_select_columns(seqs, idxs, remove))
+            assert observed == expected
+
+def test_stream_select_columns_longer_row():
+    seqs = [("a", "ADG"), ("b", "BEHK")]
+    with pytest.raises(ValueError):
+        list(stream_select_columns(seqs, [1]))
+
+def test_column_runs():
+    assert column_runs([0, 1, 2, 5, 7, 8]) == [
+        slice(0, 3), slice(5, 6), slice(7, 9)]
+
+def test_byte_msa_column_stats():
+    seqs = [
+        ("a", "ACG-T"), ("b", "TCG-A"), ("c", "T-GGA"), ("d", "AAG-C"),
+        ("e", "G"),
+    ]
+    observed = list(ByteMSA.from_seqs(seqs).column_stats())
+    expected = list(MSA.from_seqs(seqs).column_stats())
+    assert observed == expected
+    assert [s["consensus_value"] for s in observed] == ["A", "C", "G", "G", "A"]
+
+def test_byte_msa_non_ascii():
+    seqs = [("a", "AÉ-"), ("b", "A-C")]
+    msa = ByteMSA.from_seqs(seqs)
+    assert isinstance(msa, MSA)
+    assert list(msa.column_stats()) == list(MSA.from_seqs(seqs).column_stats())
+
+def test_count_symbols():
+    assert count_symbols(b"TTA-AC-", b"-ACGT") == {"T": 2, "A": 2, "C": 1}
+
+def test_bitset_mismatches():
+    pairs = [
+        ("ABCD", "ABEE"), ("ABCD", "AB-E"), ("A-C-", "--CA"),
+        ("ACGTAC", "ACG"), ("", "AC"), ("NN-", "N-N"),
+    ]
+    for seq1, seq2 in pairs:
+        for include_gaps in [False, True]:
+            expected = mismatches(seq1, seq2, include_gaps=include_gaps)
+            observed = bitset_mismatches(
+                Bitsets(seq1), Bitsets(seq2), include_gaps=include_gaps)
+            assert observed == expected
+
+def test_bitsets():
+    bits = Bitsets("AC-A")
+    assert bits.length == 4
+    assert bits.symbols == {ord("A"): 0b1001, ord("C"): 0b0010, GAP: 0b0100}
+    assert bits.non_gaps == 0b1011
+
+def test_mismatch_matrix():
+    seqs = [
+        ("a b", "GTCC"),
+        ("t|k", "G-CA"),
+        ("ryt", "AAAA"),
+    ]
+    assert mismatch_matrix(seqs) == (
+        ["a", "t|k", "ryt"],
+        [[0, 1, 4], [1, 0, 2], [4, 2, 0]],
+    )
+
+def test_column_counter():
+    seqs = [
+        ("a", "ACG-T"), ("b", "TCG-A"), ("c", "T-GGA"), ("d", "AAG-C"),
+        ("e", "G"), ("f", "-CGTTTA"), ("g", "CC"),
+    ]
+    expected = list(MSA.from_seqs(seqs).column_stats())
+    for batch_size in [1, 6, 12, 1000]:
+        counter = ColumnCounter(batch_size).add_seqs(seqs)
+        assert list(counter.column_stats()) == expected
+
+def test_column_counter_order():
+    # Tie between G and A is decided by the first row
+    counter = ColumnCounter(1).add_seqs([("a", "G"), ("b", "A")])
+    assert next(counter.column_stats())["consensus_value"] == "G"
+
+def test_column_counter_non_ascii():
+    seqs = [("a", "AÉ-"), ("b", "A-C"), ("c", "ÉÉ"), ("d", "CA")]
+    expected = list(MSA.from_seqs(seqs).column_stats())
+    for batch_size in [1, 3, 1000]:
+        counter = ColumnCounter(batch_size).add_seqs(seqs)
+        assert list(counter.column_stats()) == expected
@@ -0,0 +1,72 @@
+import io
+import os.path
+import random
+import tempfile
+
+import pytest
+
+from okfasta.index import open_indexed_fasta
+from okfasta.io import parse_fasta, parse_fasta_lengths, parse_fasta_raw
+from okfasta.pack import *
+
+seqs = [
+    ("a b", "ACGTACGTA"),
+    ("empty", ""),
+    ("c\td", "NNNNacgtnnRYKMacgT-.*"),
+    ("é", "ggggg"),
+    ("", "T"),
+]
+
+def pack_bytes(seqs):
+    f = io.BytesIO()
+    write_pack(f, seqs)
+    return f.getvalue()
+
+def test_pack_roundtrip():
+    assert list(PackedFasta(pack_bytes(seqs))) == seqs
+
+def test_pack_roundtrip_random():
+    rng = random.Random(0)
+    symbols = "ACGTACGTACGTNnacgtRY-"
+    random_seqs = [
+        ("s{0}".format(i), "".join(rng.choices(symbols, k=rng.randrange(50))))
+        for i in range(200)]
+    assert list(PackedFasta(pack_bytes(random_seqs))) == random_seqs
+
+def test_pack_size():
+    # Two bits per base, plus the tables
+    data = pack_bytes([("a", "ACGT" * 4000)])
+    assert len(data) < 4200
+
+def test_pack_non_ascii():
+    with pytest.raises(ValueError):
+        pack_bytes([("a", "ACé")])
+
+def test_packed_fasta_bad_data():
+    with pytest.raises(ValueError):
+        PackedFasta(b">a\nACGT\n" * 10)
+
+def test_packed_fasta_get_seq():
+    packed = PackedFasta(pack_bytes(seqs))
+    entry = packed.entries_by_name["c"]
+    seq = seqs[2][1]
+    for start in range(len(seq) + 1):
+        for end in range(start, len(seq) + 1):
+            assert packed.get_seq(entry, start, end) == seq[start:end]
+    assert packed.fetch("a") == seqs[0]
+    assert "" in packed and "b" not in packed
+
+def test_parse_packed_file():
+    with tempfile.TemporaryDirectory() as d:
+        fp = os.path.join(d, "a.okpack")
+        with open(fp, "wb") as f:
+            write_pack(f, seqs)
+        with open(fp, "rb") as f:
+            assert list(parse_fasta(f)) == seqs
+        with open(fp, "rb") as f:
+            assert list(parse_fasta_lengths(f)) == [
+                (desc, len(seq)) for desc, seq in seqs]
+        with open(fp, "rb") as f:
+            assert [desc for desc, body in parse_fasta_raw(f)] == [
+                desc for desc, seq in seqs]
+        assert open_indexed_fasta(fp).fetch("a") == seqs[0]
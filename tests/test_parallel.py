@@ -0,0 +1,31 @@
+import functools
+
+from okfasta.io import parse_fasta_raw, write_fasta, write_tsv
+from okfasta.parallel import *
+from okfasta.seqs import get_seq_lengths, reverse_complement_seqs, search_desc
+
+def test_map_chunks():
+    chunks = [b"a", b"bc", b"def", b"g"] * 10
+    results = map_chunks(bytes.upper, chunks, jobs=2, max_pending=3)
+    assert list(results) == [c.upper() for c in chunks]
+
+def test_process_fasta_chunk():
+    chunk = b">a b\nACG\nT\n>c\nGG\n"
+    assert process_fasta_chunk(reverse_complement_seqs, write_fasta, chunk) == (
+        b">a b\nACGT\n>c\nCC\n")
+    assert process_fasta_chunk(get_seq_lengths, write_tsv, chunk) == (
+        b"a\t4\nc\t2\n")
+
+def test_map_fasta_chunks():
+    chunks = [b">a\nAAC\n", b">b\nCG\n>c\nT\n"]
+    func = functools.partial(
+        process_fasta_chunk, reverse_complement_seqs, write_fasta)
+    assert list(map_chunks(func, chunks, jobs=2)) == [
+        b">a\nGTT\n", b">b\nCG\n>c\nA\n"]
+
+def test_process_fasta_chunk_raw():
+    chunk = b">a x\nAC\nGT\n>b\nTT\n"
+    stage = functools.partial(search_desc, regex_str="x")
+    output = process_fasta_chunk(
+        stage, write_fasta, chunk, parser=parse_fasta_raw)
+    assert output == b">a x\nACGT\n"
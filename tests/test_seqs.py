@@ -1,3 +1,5 @@
+import pytest
+
 from okfasta.seqs import *
 
 def test_replace_chars():
@@ -19,6 +21,27 @@ def test_remove_chars():
     expected = [("a", "GCAC"), ("b", "CGA")]
     assert list(observed) == expected
 
+def test_replace_chars_in_order():
+    seqs = [("a", "ACGTU")]
+    replacements = [("U", "T"), ("T", "AA"), ("A", "G"), ("GC", "N"), ("N", "")]
+    observed = replace_chars(seqs, replacements)
+    assert list(observed) == [("a", "GGGGG")]
+
+def test_randomize_seqs():
+    seqs = [("s{0}".format(i), "ACGT") for i in range(50)]
+    observed = randomize_seqs(seqs, 10, seed=3)
+    assert len(observed) == 10
+    assert observed == sorted(observed, key=seqs.index)
+    assert observed == randomize_seqs(seqs, 10, seed=3)
+    assert randomize_seqs(seqs[:5], 10) == seqs[:5]
+
+def test_sample_seqs():
+    seqs = [("s{0}".format(i), "ACGT") for i in range(50)]
+    assert list(sample_seqs(seqs, 1)) == seqs
+    assert list(sample_seqs(seqs, 0)) == []
+    observed = list(sample_seqs(seqs, 0.5, seed=3))
+    assert observed == list(sample_seqs(seqs, 0.5, seed=3))
+
 def test_get_seq_id():
     assert get_seq_id("AB.C|13260 DEF ghijk") == "AB.C|13260"
 
@@ -42,11 +65,53 @@ def test_extract_regions():
     seqs = [("seq1", "ACGACTA")]
     assert list(extract_regions(regions, seqs)) == [("seq1__2_5", "CGAC")]
 
+def test_extract_regions_sorted():
+    regions = [("seq1", 4, 7), ("seq2", 1, 2), ("seq1", 1, 3, "-")]
+    seqs = [("seq1 x", "ACGACTA"), ("seq3", "GGG")]
+    unmatched = []
+    assert list(extract_regions(regions, seqs, unmatched)) == [
+        ("seq1__1_3_rc", "CGT"), ("seq1__4_7", "ACTA")]
+    assert unmatched == [("seq2", 1, 2, "+")]
+
+def test_extract_regions_raw():
+    regions = [("seq1", 2, 5), ("seq1", 5, 6, "-")]
+    seqs = [("seq1", b"ACG\nACTA\n"), ("seq2", b"\xff")]
+    assert list(extract_regions(regions, seqs)) == [
+        ("seq1__2_5", "CGAC"), ("seq1__5_6_rc", "AG")]
+
 def test_search_desc():
     seqs = [("abcde", "GCTTG"), ("PTR1.1 genA", "CTCTCG")]
     assert list(search_desc(seqs, r"\wcd")) == [seqs[0]]
     assert list(search_desc(seqs, r"^[^b]+$")) == [seqs[1]]
 
+def test_compile_desc_patterns():
+    regex = compile_desc_patterns(["a.c", "abd"], fixed_strings=True)
+    assert regex.search("xa.c")
+    assert not regex.search("abc")
+    regex = compile_desc_patterns(["^a.c", "D$"], ignore_case=True)
+    assert regex.search("abc")
+    assert regex.search("xd")
+    assert not regex.search("xabc")
+
+def test_compile_desc_patterns_inline_flags():
+    regex = compile_desc_patterns(["(?i)abc"])
+    assert regex.search("xABC")
+    regex = compile_desc_patterns(["(?i)abc", "^d"])
+    assert regex.search("xABC")
+    assert regex.search("dx")
+    assert not regex.search("xD")
+
+def test_compile_desc_patterns_backreferences():
+    regex = compile_desc_patterns([r"(a)\1", r"(b)\1"])
+    assert regex.search("bb")
+    assert regex.search("aa")
+    assert not regex.search("ab")
+    regex = compile_desc_patterns([r"(?P<x>a)(?P=x)", r"(?P<x>b)"])
+    assert regex.search("aa")
+    assert regex.search("b")
+    seqs = [("aa", "A"), ("cd", "C")]
+    assert list(search_desc(seqs, regex)) == [("aa", "A")]
+
 def test_search_seqs():
     seqs = [("n", "CGTTAC"), ("m", "CTGGTGTCA")]
     assert list(search_seqs(seqs, "GTTA")) == [seqs[0]]
@@ -69,10 +134,49 @@ def test_remove_seq_ids():
     # Second sequence is missing
     assert list(filter_seq_ids(seqs, ids, remove=True)) == [seqs[0], seqs[2]]
 
+def test_filter_seq_ids_stop_early():
+    seqs = [("a", "TC"), ("b x", "GG"), ("c", "TT"), ("a", "CC")]
+    found = set()
+    observed = filter_seq_ids(seqs, {"b", "a", "z"}, found=found)
+    assert list(observed) == [("a", "TC"), ("b x", "GG"), ("a", "CC")]
+    assert found == {"a", "b"}
+    seqs = iter(seqs)
+    observed = filter_seq_ids(seqs, {"c"}, stop_early=True)
+    assert list(observed) == [("c", "TT")]
+    # Stopped before the last record
+    assert next(seqs) == ("a", "CC")
+
+def test_filter_seq_ids_stop_early_first_record():
+    # Each ID is kept once, whatever the order of the records
+    seqs = [("a x", "A"), ("a y", "C"), ("b", "G"), ("a z", "T")]
+    observed = filter_seq_ids(seqs, {"a", "b"}, stop_early=True)
+    assert list(observed) == [("a x", "A"), ("b", "G")]
+    seqs = [("a x", "A"), ("a y", "C"), ("c", "G")]
+    observed = filter_seq_ids(seqs, {"a", "b"}, stop_early=True)
+    assert list(observed) == [("a x", "A")]
+
 def test_get_seq_lengths():
     seqs = [("ab cde", "GCTCGCT"), ("f|g hij", "GCTCGAGTCA")]
     assert list(get_seq_lengths(seqs)) == [("ab", 7), ("f|g", 10)]
 
+def test_seq_id_lengths():
+    desc_lengths = [("ab cde", 7), ("f|g hij", 10)]
+    assert list(seq_id_lengths(desc_lengths)) == [("ab", 7), ("f|g", 10)]
+
+def test_length_summary():
+    desc_lengths = [("a", n) for n in [4, 2, 6, 3, 5]]
+    length_counts = count_lengths(desc_lengths)
+    assert length_summary(length_counts) == [
+        ("count", 5), ("total", 20), ("min", 2), ("max", 6),
+        ("N50", 5), ("N90", 3)]
+    assert list(length_histogram(length_counts, 4)) == [
+        ("0-3", 2), ("4-7", 3)]
+
+def test_length_summary_empty():
+    assert length_summary(count_lengths([])) == [
+        ("count", 0), ("total", 0), ("min", 0), ("max", 0),
+        ("N50", 0), ("N90", 0)]
+
 def test_replace_seq_ids():
     seqs = [("s1 fh ks", "AC"), ("s2\tjj", "CC"), ("s3 mgg", "TT")]
     new_ids = {"s1": "nhnh", "s2": "ppwww", "s14": "ldldl"}
@@ -87,3 +191,76 @@ def test_reverse_complement_n():
 
 def test_reverse_complement_ambiguous():
     assert reverse_complement("RNSG") == "CSNY"
+
+def test_reverse_complement_case():
+    assert reverse_complement("ACgtN-") == "-NacGT"
+
+def test_reverse_complement_rna():
+    assert reverse_complement("AUGc") == "gCAU"
+
+def test_reverse_complement_unknown():
+    with pytest.raises(ValueError):
+        reverse_complement("ACJT")
+    assert reverse_complement("ACJT", strict=False) == "AJGT"
+    assert reverse_complement("AÅ", strict=False) == "ÅT"
+
+def test_reverse_complement_bytes():
+    assert reverse_complement_bytes(b"ACGGTAT") == b"ATACCGT"
+    assert reverse_complement_bytes(b"ACGG", rna=True) == b"CCGU"
+
+def test_search_seqs_ambiguous():
+    seqs = [("n", "CGTTAC"), ("m", "CTGGTGTCA"), ("o", "CGTCAC")]
+    assert list(search_seqs(seqs, "GTYA")) == seqs
+    assert list(search_seqs(seqs, "GNNNTC")) == [seqs[1]]
+    assert list(search_seqs(seqs, "GNNNGT")) == []
+
+def test_search_seqs_multiple_queries():
+    seqs = [("n", "CGTTAC"), ("m", "CTGGTGTCA"), ("o", "CGTCAC")]
+    assert list(search_seqs(seqs, ["TCAC", "TTA"])) == [seqs[0], seqs[2]]
+    assert list(search_seqs(seqs, ["AAAA", "GTGA"], True)) == [seqs[2]]
+
+def test_search_seqs_yields_once():
+    seqs = [("n", "AAAA")]
+    assert list(search_seqs(seqs, ["AA", "A", "AAA"], True)) == seqs
+
+def test_compile_queries():
+    regex = compile_queries(["ACR", "ACGT", "AT"])
+    assert regex.pattern == "A(?:C(?:[AG]|GT)|T)"
+    regex = compile_queries(["ACG", "AC"])
+    assert regex.pattern == "AC"
+
+def test_find_matches():
+    assert list(find_matches("ACGTACGA", "ACG")) == [(0, 0), (4, 0)]
+    assert list(find_matches("ACGTACGA", "ACGT", 1)) == [(0, 0), (4, 1)]
+    assert list(find_matches("ACGTACGA", "NNG", 0)) == [(0, 0), (4, 0)]
+    assert list(find_matches("AC", "ACG", 3)) == []
+
+def test_find_matches_many_hits():
+    # Every position is a hit, which used to take time quadratic in the
+    # length of the sequence
+    n = 200000
+    matches = list(find_matches("A" * n, "AAAA", 1))
+    assert len(matches) == n - 3
+    assert matches[:2] == [(0, 0), (1, 0)]
+    seq = "ACGTTAGCAGATACCAGTAGGACATAGACCGT" * 50
+    expected = [
+        (i, sum(x != y for x, y in zip(seq[i:(i + 5)], "ACGTA")))
+        for i in range(len(seq) - 4)]
+    expected = [(i, mm) for i, mm in expected if mm <= 2]
+    assert list(find_matches(seq, "ACGTA", 2)) == expected
+
+def test_search_seqs_mismatches():
+    seqs = [("n", "CGTTAC"), ("m", "CTGGTGTCA"), ("o", "CGTCAC")]
+    assert list(search_seqs(seqs, "GTTT")) == []
+    assert list(search_seqs(seqs, "GTTT", max_mismatches=1)) == seqs[:2]
+    assert list(search_seqs(seqs, "AAAC", max_mismatches=1)) == []
+    assert list(search_seqs(seqs, "AAAC", True, max_mismatches=1)) == seqs[:2]
+
+def test_search_seq_positions():
+    seqs = [("n x", "CGTTACG"), ("m", "CTGGTGTCA")]
+    assert list(search_seq_positions(seqs, ["CGT"], True, 1)) == [
+        ("n", "CGT", "+", 1, 3, 0, "CGT"),
+        ("n", "CGT", "-", 5, 7, 0, "ACG"),
+        ("m", "CGT", "+", 3, 5, 1, "GGT"),
+        ("m", "CGT", "+", 5, 7, 1, "TGT"),
+    ]
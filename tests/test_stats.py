@@ -0,0 +1,75 @@
+import io
+import itertools
+import sys
+
+from okfasta.stats import *
+
+def parse_lines(f):
+    for line in f:
+        yield line.rstrip("\n")
+
+def upper_lines(lines):
+    for line in lines:
+        yield line.upper()
+
+def write_lines(f, lines):
+    for line in lines:
+        f.write(line + "\n")
+
+def test_timed_stages():
+    run_stats = RunStats()
+    parser, stage, write_output = run_stats.timed_stages(
+        parse_lines, upper_lines, write_lines)
+    assert parser.__name__ == "parse_lines"
+    output = io.StringIO()
+    write_output(output, stage(parser(io.StringIO("a\nb\nc\n"))))
+    assert output.getvalue() == "A\nB\nC\n"
+    run_stats.finish()
+    assert run_stats.records_in == 3
+    assert run_stats.records_out == 3
+    assert all(seconds >= 0 for seconds in run_stats.seconds.values())
+    summary = run_stats.summary()
+    assert summary["input_bytes"] is None
+    assert summary["records_in"] == 3
+
+def test_timed_stages_stop_early():
+    # Records that were never read from the parser are not counted
+    run_stats = RunStats()
+    parser, stage, write_output = run_stats.timed_stages(
+        parse_lines, lambda lines: itertools.islice(lines, 1), write_lines)
+    write_output(io.StringIO(), stage(parser(io.StringIO("a\nb\n"))))
+    assert (run_stats.records_in, run_stats.records_out) == (1, 1)
+
+def test_counting_reader_writer():
+    run_stats = RunStats()
+    f = io.BufferedReader(run_stats.count_input(io.BytesIO(b"abcdef")))
+    assert f.read(2) == b"ab"
+    assert f.read() == b"cdef"
+    assert run_stats.input.n == 6
+    sink = io.BytesIO()
+    f = run_stats.count_output(sink)
+    f.write(b"abc")
+    f.write(b"de")
+    assert run_stats.output.n == 5
+    assert f.getvalue() == b"abcde"
+
+def test_folded_stacks():
+    profiler = SamplingProfiler()
+
+    def inner():
+        profiler.start()
+        profiler.sample(None, sys._getframe())
+        profiler.stop()
+
+    def outer():
+        inner()
+
+    outer()
+    lines = list(profiler.folded_stacks())
+    assert len(lines) == 1
+    stack, n = lines[0].rsplit(" ", 1)
+    frames = stack.split(";")
+    assert frames[-2].startswith("test_stats:")
+    assert frames[-2].endswith("outer")
+    assert frames[-1].endswith("inner")
+    assert int(n) >= 1